@@ -15,9 +15,16 @@ LOGGER_NAME = "hibp-downloader"
 PWNEDPASSWORDS_API_URL = "https://api.pwnedpasswords.com"
 HTTP_TIMEOUT_DEFAULT = 30  # seconds
 HTTP_MAX_RETRIES_DEFAULT = 5
+OUTAGE_DEADLINE_DEFAULT = 900  # seconds of sustained upstream failure before a download is aborted
+RETRY_PASS_HTTP_TIMEOUT_FACTOR = 2  # the deferred retry pass over failed prefixes waits longer for each request
+RETRY_PASS_CONCURRENCY = 2  # and sends fewer requests at once, per process
+FAILED_PREFIXES_FILENAME = "failed-prefixes.txt"
 LOCAL_CACHE_TTL_DEFAULT = 12 * 3600
 MULTIPROCESSING_PROCESSES_DEFAULT = int(cpu_count() if cpu_count() else 4)  # type: ignore[arg-type]
 MULTIPROCESSING_PREFIXES_CHUNK_SIZE_DEFAULT = 8
+MULTIPROCESSING_PREFIXES_CHUNK_SIZE_MAX_DEFAULT = 64
+MULTIPROCESSING_RESULTS_BATCH_SIZE = 8  # prefix results summarised into each stats record a worker sends
+MULTIPROCESSING_WORKER_THREADS = 2  # per worker process, for hashing, verification and file writes
 APPROX_GZIP_BYTES_PER_HASH = 20.674  # manually computed based on data-review
 LOGGING_INFO_EVENT_MODULUS = 25
 
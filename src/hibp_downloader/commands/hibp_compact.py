@@ -0,0 +1,55 @@
+import os
+from typing import Annotated
+
+import typer
+
+from hibp_downloader import HELP_EPILOG_FOOTER, LOGGER_NAME, app_context
+from hibp_downloader.lib.datastore import PackDatastore
+from hibp_downloader.lib.logger import logger_get
+from hibp_downloader.models import HashType, StorageBackend
+
+logger = logger_get(name=LOGGER_NAME)
+
+command = typer.Typer(no_args_is_help=False, epilog=HELP_EPILOG_FOOTER)
+command_name = "compact"
+command_section = "Commands"
+
+
+@command.callback(invoke_without_command=True)
+def main(
+    hash_type: Annotated[
+        HashType,
+        typer.Option(
+            "--hash-type",
+            help="Hash type to compact in the --data-path",
+            case_sensitive=False,
+        ),
+    ] = HashType.sha1,
+):
+    """
+    Compact the pack files of a --storage pack data path, reclaiming the space of superseded data; [bold cyan]compact --help[/bold cyan] for more.
+    """
+
+    logger.debug(f"Starting command {app_context.command!r} from {os.path.basename(__file__)!r}")
+
+    if app_context.data_path and not os.path.isdir(app_context.data_path):
+        logger.error(f"Data path {app_context.data_path!r} does not exist, unable to continue")
+        raise typer.Exit(1)
+
+    if app_context.storage != StorageBackend.pack:
+        logger.error("The compact command applies to --storage pack only, unable to continue")
+        raise typer.Exit(1)
+
+    logger.info(f"data-path {app_context.data_path!r}")
+
+    datastore = PackDatastore(data_path=app_context.data_path, hash_type=hash_type.value)  # type: ignore[arg-type]
+    try:
+        stats = datastore.compact()
+    finally:
+        datastore.close()
+
+    logger.info(
+        f"Compacted {stats.prefix_count} prefixes from {stats.pack_count_before} pack files "
+        f"({round(stats.bytes_before / 1024 / 1024, 1)}MB) into {stats.pack_count_after} pack files "
+        f"({round(stats.bytes_after / 1024 / 1024, 1)}MB)"
+    )
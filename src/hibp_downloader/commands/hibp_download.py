@@ -1,12 +1,16 @@
 import asyncio
-import dataclasses
+import math
 import os
+import signal
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import replace
 from datetime import datetime
-from multiprocessing import Manager, Process, Queue
-from queue import Empty
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection, wait
 from pathlib import Path
-from typing import Any
-
 import httpx
 import typer
 from typing import Annotated
@@ -14,6 +18,7 @@ from typing import Annotated
 from hibp_downloader import (
     APPROX_GZIP_BYTES_PER_HASH,
     ENCODING_TYPE,
+    FAILED_PREFIXES_FILENAME,
     HELP_EPILOG_FOOTER,
     HTTP_MAX_RETRIES_DEFAULT,
     HTTP_TIMEOUT_DEFAULT,
@@ -21,28 +26,46 @@ from hibp_downloader import (
     LOGGER_NAME,
     LOGGING_INFO_EVENT_MODULUS,
     MULTIPROCESSING_PREFIXES_CHUNK_SIZE_DEFAULT,
+    MULTIPROCESSING_PREFIXES_CHUNK_SIZE_MAX_DEFAULT,
     MULTIPROCESSING_PROCESSES_DEFAULT,
+    MULTIPROCESSING_RESULTS_BATCH_SIZE,
+    MULTIPROCESSING_WORKER_THREADS,
+    OUTAGE_DEADLINE_DEFAULT,
     PWNEDPASSWORDS_API_URL,
+    RETRY_PASS_CONCURRENCY,
+    RETRY_PASS_HTTP_TIMEOUT_FACTOR,
     app_context,
 )
 from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.circuit_breaker import SharedCircuitBreaker
+from hibp_downloader.lib.concurrency import AdaptiveConcurrencyLimit, EventLoopLagMonitor, RetryBackoff
+from hibp_downloader.lib.datastore import datastore_open
 from hibp_downloader.lib.filedata import (
-    encoding_type_file_suffix,
-    load_metadata,
-    save_datafile,
-    save_metadatafile,
+    DatafileStream,
+    DatafileWriter,
+    datafile_content_checksum,
     verify_binary_encoding,
 )
-from hibp_downloader.lib.generators import hex_sequence, iterable_chunker
+from hibp_downloader.lib.generators import hex_sequence
 from hibp_downloader.lib.hashing import hashed_sha256
-from hibp_downloader.lib.http import httpx_async_client, httpx_binary_response
+from hibp_downloader.lib.http import httpx_async_client, httpx_binary_response, parse_http_date
 from hibp_downloader.lib.logger import logger_get
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.lib.rate_limit import SharedTokenBucket
+from hibp_downloader.lib.run_journal import RUN_JOURNAL_PREFIX_SPACE, RunJournal
+from hibp_downloader.lib.work_distributor import SharedWorkDistributor
 from hibp_downloader.models import (
+    DataFormat,
+    DownloadSchedule,
+    DurabilityMode,
     HashType,
     PrefixMetadata,
     PrefixMetadataDataSource,
+    PrefixWorkItem,
+    QueueItemStats,
     QueueItemStatsCompute,
     QueueRunningStats,
+    StorageBackend,
     WorkerArgs,
 )
 
@@ -53,9 +76,6 @@ command_name = "download"
 command_section = "Commands"
 
 
-QUEUE_WORKER_EXIT_SENTINEL = "__queue_exit_sentinel__"
-
-
 @command.callback(invoke_without_command=True)
 def main(
     hash_type: Annotated[
@@ -70,6 +90,45 @@ def main(
         str,
         typer.Option(help="Stop the downloader at a hash prefix; trimmed to the first 5 characters"),
     ] = "fffff",
+    prefixes_file: Annotated[
+        Path | None,
+        typer.Option(
+            help="Download only the hash prefixes listed in this file, one per line, eg the failed-prefixes file "
+            "written by an earlier download; --first-hash and --last-hash are ignored",
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    schedule: Annotated[
+        DownloadSchedule,
+        typer.Option(
+            help="Order in which prefixes are requested: 'sequential' in prefix order; 'stalest' with prefixes "
+            "never downloaded first and then those downloaded or checked unchanged longest ago, use with --max-runtime or --max-requests "
+            "so that each run refreshes the stalest part of the data; or 'largest' with the largest prefixes (by "
+            "size when last downloaded) first, so that worker processes finish together",
+            case_sensitive=False,
+        ),
+    ] = DownloadSchedule.sequential,
+    max_runtime: Annotated[
+        int,
+        typer.Option(
+            help="Run-time budget (seconds); no more prefixes are requested after this time and the download ends "
+            "once the in-flight requests have finished; 0 for no limit",
+            min=0,
+        ),
+    ] = 0,
+    max_requests: Annotated[
+        int,
+        typer.Option(help="Upper limit on the number of prefixes requested (excluding retries); 0 for no limit", min=0),
+    ] = 0,
+    resume: Annotated[
+        bool,
+        typer.Option(
+            "--resume",
+            help="Continue the previous download from where it was interrupted or stopped, with its --first-hash, "
+            "--last-hash and --prefixes-file; the prefixes it completed are not requested again, even with --force",
+        ),
+    ] = False,
     number_of_workers: Annotated[
         int,
         typer.Option(
@@ -79,9 +138,42 @@ def main(
     chunk_size: Annotated[
         int,
         typer.Option(
-            help="Number of hash-prefixes to consume (asynchronously) per iteration per process",
+            help="Number of hash-prefix requests each process starts with in-flight (asynchronously); adjusted "
+            "automatically between this value and --max-chunk-size based on request latency and errors",
+            min=1,
         ),
     ] = MULTIPROCESSING_PREFIXES_CHUNK_SIZE_DEFAULT,
+    max_chunk_size: Annotated[
+        int,
+        typer.Option(
+            help="Upper limit for the adaptive number of in-flight hash-prefix requests per process; "
+            "set equal to --chunk-size to use a fixed number",
+            min=1,
+        ),
+    ] = MULTIPROCESSING_PREFIXES_CHUNK_SIZE_MAX_DEFAULT,
+    max_requests_per_second: Annotated[
+        float,
+        typer.Option(
+            help="Upper limit on the API request rate (including retries) across all processes; 0 for no limit",
+            min=0,
+        ),
+    ] = 0,
+    max_requests_burst: Annotated[
+        int,
+        typer.Option(
+            help="Number of requests that may be sent at once above --max-requests-per-second after a quiet period; "
+            "default is one second of requests",
+            min=0,
+        ),
+    ] = 0,
+    max_bandwidth: Annotated[
+        float,
+        typer.Option(
+            help="Upper limit on API response data received (MB/s) across all processes; requests that return no "
+            "content, eg ETag matches, are not held back; 0 for no limit",
+            min=0,
+        ),
+    ] = 0,
     force: Annotated[
         bool, typer.Option("--force", help="Same as setting --local-cache-ttl=0 and --ignore-etag")
     ] = False,
@@ -103,6 +195,31 @@ def main(
         int,
         typer.Option(help="Maximum number of HTTP request retries on request failure"),
     ] = HTTP_MAX_RETRIES_DEFAULT,
+    outage_deadline: Annotated[
+        int,
+        typer.Option(
+            help="Seconds a sustained upstream outage may last, with requests from all processes paused, before "
+            "the download is aborted; 0 to wait indefinitely",
+            min=0,
+        ),
+    ] = OUTAGE_DEADLINE_DEFAULT,
+    durability: Annotated[
+        DurabilityMode,
+        typer.Option(
+            help="Crash-consistency of data files and their metadata: 'none' leaves writing them to disk to the "
+            "operating system; 'batched' commits them together in groups, synced once per group; 'strict' commits "
+            "and syncs each data file with its metadata before the next",
+            case_sensitive=False,
+        ),
+    ] = DurabilityMode.none,
+    retry_pass: Annotated[
+        bool,
+        typer.Option(
+            "--retry-pass/--no-retry-pass",
+            help="Request failed prefixes once more after all others, with a longer --http-timeout and fewer "
+            "requests in-flight",
+        ),
+    ] = True,
     http_proxy: Annotated[
         str,
         typer.Option(help="HTTP proxy"),
@@ -111,12 +228,21 @@ def main(
         str,
         typer.Option(help="Path to cert file to verify SSL connection"),
     ] = "",
+    api_url: Annotated[
+        str,
+        typer.Option(
+            help="Base URL of the pwnedpasswords API; eg a local mock server for offline testing and benchmarks",
+            envvar="HIBPDL_API_URL",
+            show_envvar=False,
+        ),
+    ] = PWNEDPASSWORDS_API_URL,
 ):
     """
     Download new pwned password hash data from HIBP and update the local --data-path data storage path; use [bold cyan]download --help[/bold cyan] for more.
     """
 
     logger.debug(f"Starting command {app_context.command!r} from {os.path.basename(__file__)!r}")
+    deadline = time.monotonic() + max_runtime if max_runtime else None
 
     if app_context.data_path and not os.path.isdir(app_context.data_path):
         logger.warning(f"Data path {app_context.data_path!r} does not exist, creating it now...")
@@ -129,18 +255,34 @@ def main(
     logger.info(f"data-path {app_context.data_path!r}")
     logger.info(f"metadata-path {app_context.metadata_path!r}")
 
+    if max_chunk_size < chunk_size:
+        raise typer.BadParameter("Must not be less than --chunk-size", param_hint="--max-chunk-size")
+
     if force:
         ignore_etag = True
         local_cache_ttl = 0
 
-    manager = Manager()
-    result_queue = manager.Queue()
-    summary_queue = manager.Queue()
-    results_queue_process = Process(target=results_queue_processor, args=(result_queue, summary_queue))
-    results_queue_process.daemon = True
-    results_queue_process.start()
+    # an append-only journal of the completed prefixes lets an interrupted download continue where it stopped
+    journal = RunJournal(metadata_path=app_context.metadata_path, hash_type=hash_type.value)  # type: ignore[arg-type]
+    journal_run = journal.resume() if resume else None
+    if journal_run:
+        first_hash, last_hash = journal_run["first_hash"], journal_run["last_hash"]
+        prefixes_file = Path(journal_run["prefixes_file"]) if journal_run["prefixes_file"] else None
+        logger.info(f"Resuming the interrupted download; {journal.completed_count} prefixes were completed")
+    else:
+        if resume:
+            logger.warning("No interrupted download to resume; starting a new download")
+        journal.start(
+            {"first_hash": first_hash, "last_hash": last_hash, "prefixes_file": str(prefixes_file or "") or None}
+        )
+
+    prefixes = None
+    if prefixes_file:
+        prefixes = prefixes_file_read(prefixes_file)
+        if not prefixes:
+            raise typer.BadParameter("No hash prefixes found in file", param_hint="--prefixes-file")
+        logger.info(f"Requesting {len(prefixes)} prefixes listed in {str(prefixes_file)!r}")
 
-    work_queue: Queue = Queue()
     worker_args = WorkerArgs(
         hash_type=hash_type,
         data_path=app_context.data_path,  # type: ignore[arg-type]
@@ -148,100 +290,538 @@ def main(
         encoding_type=ENCODING_TYPE,
         ignore_etag=ignore_etag,
         local_cache_ttl=local_cache_ttl,
+        durability=durability,
+        storage=app_context.storage,
+        storage_url=app_context.storage_url,
+        data_format=app_context.data_format,
         http_timeout=http_timeout,
         http_max_retries=http_max_retries,
         http_proxy=http_proxy,
         http_certificates=http_certificates,
         http_debug=False,
+        api_url=api_url.rstrip("/"),
     )
 
-    worker_processes = []
-
-    try:
-        worker_processes = start_worker_processes(
-            work_queue=work_queue, result_queue=result_queue, worker_count=number_of_workers, worker_args=worker_args
-        )
-        enqueue_worker_tasks(
-            first_hash, last_hash, worker_count=len(worker_processes), queue=work_queue, chunk_size=chunk_size
+    # scan the metadata store once so that prefixes within the local-cache TTL never reach the worker processes
+    with MetadataStore(metadata_path=app_context.metadata_path, hash_type=hash_type.value) as metadata_store:  # type: ignore[arg-type]
+        metadata_store.import_metafiles()
+        pending_metadata_resolve(metadata_store, worker_args)
+        work_items, local_cache_count = plan_worker_tasks(
+            metadata_store, worker_args, first_hash, last_hash, prefixes=prefixes, schedule=schedule
         )
+    if journal_run:
+        work_items = [work_item for work_item in work_items if not journal.completed(work_item.prefix)]
 
-        logger.info(f"Created {len(worker_processes)} worker processes to consume a queue of prefix-hash values.")
+    logger.info(
+        f"Found {local_cache_count} prefixes within the local-cache time-to-live; {len(work_items)} prefixes to request"
+    )
+    if max_requests and len(work_items) > max_requests:
+        logger.info(f"Requesting the first {max_requests} prefixes by --schedule {schedule.value}")
+        work_items = work_items[:max_requests]
+
+    rate_limit = SharedTokenBucket(max_requests_per_second, max_requests_burst) if max_requests_per_second else None
+    bandwidth_limit = SharedTokenBucket(max_bandwidth * 1024 * 1024) if max_bandwidth else None
+    circuit_breaker = SharedCircuitBreaker(outage_deadline=outage_deadline)
+    failed_prefixes_filepath = Path(
+        os.path.join(app_context.metadata_path, hash_type.value, FAILED_PREFIXES_FILENAME)  # type: ignore[arg-type]
+    )
+
+    if rate_limit:
         logger.info(
-            "Legend: lc = local-cache, et = ETag match, rc = remote-cache, ro = remote-origin, xx = unknown/failed"
+            f"API requests limited to {rate_limit.rate:g}req/s (burst {rate_limit.burst}) across all processes."
         )
+    if bandwidth_limit:
+        logger.info(f"API response data limited to {max_bandwidth:g}MB/s across all processes.")
+    logger.info(
+        "Legend: lc = local-cache, et = ETag match, rc = remote-cache, ro = remote-origin, "
+        "uc = unchanged content, xx = unknown/failed"
+    )
 
-        for i, worker_process in enumerate(worker_processes):
-            worker_process.join()
-            logger.debug(f"Queue worker process {i} finished.")
+    try:
+        running_stats = run_worker_processes(
+            work_items=work_items,
+            worker_count=min(number_of_workers, math.ceil(len(work_items) / chunk_size)),
+            worker_args=worker_args,
+            concurrency=chunk_size,
+            concurrency_max=max_chunk_size,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
+            circuit_breaker=circuit_breaker,
+            journal=journal,
+            local_cache_count=local_cache_count,
+            deadline=deadline,
+        )
+        failed_prefixes = running_stats.failed_prefixes
+        workers_lost = running_stats.workers_lost
+
+        budget_used = running_stats.stopped and deadline is not None and time.monotonic() >= deadline
+        if running_stats.stopped:
+            not_requested_count = len(work_items) - running_stats.prefix_count_sum
+            if not budget_used:
+                logger.warning(
+                    f"Download stopped with {not_requested_count} prefixes not requested; "
+                    "rerun download with --resume to continue."
+                )
+                raise typer.Exit(1)
+            logger.info(f"Run-time budget of {max_runtime}s used with {not_requested_count} prefixes not requested")
 
-        result_queue.put(QUEUE_WORKER_EXIT_SENTINEL)
-        results_queue_process.join()
+        if circuit_breaker.aborted:
+            # completed prefixes are in the download journal, so a --resume rerun requests only the others
+            not_requested_count = len(work_items) - running_stats.prefix_count_sum
+            logger.error(
+                f"Download aborted after an upstream outage; {len(failed_prefixes)} failed and {not_requested_count} "
+                "not requested prefixes; rerun download with --resume to continue."
+            )
+            raise typer.Exit(1)
 
-        try:
-            result_summary: dict[str, int] = summary_queue.get(timeout=5)
-        except Empty:
-            logger.error("Download summary process did not return a failure-count summary")
+        # one more, slower, pass over just the failed prefixes; most failures are transient
+        if failed_prefixes and retry_pass and not budget_used:
+            failed_prefixes_set = set(failed_prefixes)
+            failed_work_items = [work_item for work_item in work_items if work_item.prefix in failed_prefixes_set]
+            retry_worker_args = replace(worker_args, http_timeout=http_timeout * RETRY_PASS_HTTP_TIMEOUT_FACTOR)
+            logger.info(
+                f"Retrying {len(failed_work_items)} failed prefixes with {retry_worker_args.http_timeout}s timeout "
+                f"and {RETRY_PASS_CONCURRENCY} in-flight requests per process"
+            )
+            retry_stats = run_worker_processes(
+                work_items=failed_work_items,
+                worker_count=min(number_of_workers, math.ceil(len(failed_work_items) / RETRY_PASS_CONCURRENCY)),
+                worker_args=retry_worker_args,
+                concurrency=RETRY_PASS_CONCURRENCY,
+                concurrency_max=RETRY_PASS_CONCURRENCY,
+                rate_limit=rate_limit,
+                bandwidth_limit=bandwidth_limit,
+                circuit_breaker=circuit_breaker,
+                journal=journal,
+                deadline=deadline,
+            )
+            if retry_stats.stopped:
+                logger.warning("Download stopped during the retry pass; rerun download with --resume to continue.")
+                raise typer.Exit(1)
+            logger.info(
+                f"Retry pass recovered {len(failed_work_items) - len(retry_stats.failed_prefixes)} "
+                f"of {len(failed_work_items)} failed prefixes"
+            )
+            failed_prefixes = retry_stats.failed_prefixes
+            workers_lost += retry_stats.workers_lost
+
+        if workers_lost:
+            # the journal is not finished, so that a --resume rerun requests every prefix not completed
+            logger.error(
+                f"Download incomplete; {workers_lost} worker processes ended unexpectedly, with "
+                f"{len(failed_prefixes)} failed prefixes; rerun download with --resume to continue."
+            )
             raise typer.Exit(1)
 
-        failed_prefix_count = result_summary.get("failed_prefix_count", 0)
+        journal.finish()  # failed prefixes are listed in the failed-prefixes file rather than resumed
 
-        if failed_prefix_count > 0:
+        if failed_prefixes:
+            failed_prefixes_write(failed_prefixes_filepath, failed_prefixes)
             logger.error(
-                f"Download completed with {failed_prefix_count} failed prefixes; rerun download for the same range to recover."
+                f"Download completed with {len(failed_prefixes)} failed prefixes; these are listed in "
+                f"{str(failed_prefixes_filepath)!r}, rerun download with --prefixes-file to request just these."
             )
             raise typer.Exit(1)
 
+        if prefixes_file and prefixes_file.resolve() == failed_prefixes_filepath.resolve():
+            failed_prefixes_filepath.unlink()  # every prefix of the earlier failed download is now recovered
         logger.info("Done")
 
+    except KeyboardInterrupt:
+        logger.warning("Workers stopped.")
+
+    finally:
+        journal.close()
+
+
+def run_worker_processes(
+    work_items: list[PrefixWorkItem],
+    worker_count: int,
+    worker_args: WorkerArgs,
+    concurrency: int,
+    concurrency_max: int,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    circuit_breaker: SharedCircuitBreaker | None = None,
+    journal: RunJournal | None = None,
+    local_cache_count: int = 0,
+    deadline: float | None = None,
+) -> QueueRunningStats:
+    """Run worker processes over the work items until all have finished; return the run totals.
+
+    On SIGTERM, or at the (time.monotonic) deadline, no more work is handed out and the workers exit once their
+    in-flight requests have finished.
+    """
+    work_distributor = SharedWorkDistributor(work_items=work_items, worker_count=worker_count)
+    worker_processes: list[Process] = []
+
+    def stop_handler(signum: int, _: object) -> None:
+        if not work_distributor.stopped:
+            logger.warning(
+                f"Received {signal.Signals(signum).name}; stopping after the in-flight requests have finished..."
+            )
+        work_distributor.stop()
+
+    sigterm_handler = signal.signal(signal.SIGTERM, stop_handler)
+    deadline_timer = None
+
+    try:
+        worker_processes, result_readers = start_worker_processes(
+            work_distributor=work_distributor,
+            worker_count=worker_count,
+            worker_args=worker_args,
+            concurrency=concurrency,
+            concurrency_max=concurrency_max,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
+            circuit_breaker=circuit_breaker,
+        )
+        logger.info(f"Created {len(worker_processes)} worker processes to claim ranges of prefix-hash values.")
+
+        if deadline is not None:
+            deadline_timer = threading.Timer(max(0.0, deadline - time.monotonic()), work_distributor.stop)
+            deadline_timer.daemon = True
+            deadline_timer.start()
+
+        running_stats = results_pipe_processor(
+            dict(zip(result_readers, worker_processes)),
+            work_distributor=work_distributor,
+            local_cache_count=local_cache_count,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
+            circuit_breaker=circuit_breaker,
+            journal=journal,
+        )
+        running_stats.stopped = work_distributor.stopped and running_stats.prefix_count_sum < len(work_items)
+
+        for i, worker_process in enumerate(worker_processes):
+            worker_process.join()
+            logger.debug(f"Queue worker process {i} finished.")
+
     except KeyboardInterrupt:
         logger.warning("Download process interrupted by user. Stopping workers...")
         for p in worker_processes:
             if p.is_alive():
-                p.terminate()
-        if results_queue_process.is_alive():
-            results_queue_process.terminate()
+                p.kill()  # a SIGTERM would let the worker finish its in-flight requests first
+        raise
 
-        work_queue.close()
-        work_queue.cancel_join_thread()
+    finally:
+        signal.signal(signal.SIGTERM, sigterm_handler)
+        if deadline_timer:
+            deadline_timer.cancel()
 
-        logger.warning("Workers stopped.")
+    return running_stats
 
 
-def enqueue_worker_tasks(
-    first_hash: str, last_hash: str, worker_count: int, queue: Queue, chunk_size: int = 10
-) -> None:
-    prefix_chunks = iterable_chunker(
-        iterable=hex_sequence(hex_first=first_hash[0:5], hex_last=last_hash[0:5]), size=chunk_size
+def plan_worker_tasks(
+    metadata_store: MetadataStore,
+    worker_args: WorkerArgs,
+    first_hash: str,
+    last_hash: str,
+    prefixes: list[str] | None = None,
+    schedule: DownloadSchedule = DownloadSchedule.sequential,
+) -> tuple[list[PrefixWorkItem], int]:
+    """Return the work items to request, and the count of prefixes skipped as still within the local-cache TTL.
+
+    Metadata rows and the hex sequence (or the sorted `prefixes` list in its place) are both walked in prefix order
+    and merge-joined, so memory is bounded by the work items rather than by the metadata for the whole range.  With
+    the `stalest` schedule the work items are then ordered by the time each prefix was last downloaded or checked
+    unchanged (an ETag match), with prefixes never downloaded (or with a missing data file) first.  With the `largest` schedule they are ordered by
+    the content size last downloaded, largest first (longest-job-first), with prefixes of unknown size taken as the
+    mean size; without any sizes this leaves the prefix order.
+    """
+    if prefixes:
+        first_hash, last_hash = prefixes[0], prefixes[-1]
+    first_hash = first_hash[0:5].lower()
+    last_hash = last_hash[0:5].lower()
+
+    metadata_rows = metadata_store.scan_columns(
+        ("prefix", "etag", "server_timestamp", "data_source", "content_checksum", "last_modified", "bytes"),
+        first_prefix=first_hash,
+        last_prefix=last_hash,
+    )
+    metadata_row = next(metadata_rows, None)
+
+    now = time.time()
+    local_cache_count = 0
+    work_items = []
+    downloaded_timestamps: list[float] = []  # in step with work_items, for the stalest schedule
+    content_sizes: list[int | None] = []  # in step with work_items, for the largest schedule
+
+    with datastore_open(
+        worker_args.storage,
+        worker_args.data_path,
+        worker_args.hash_type.value,
+        worker_args.encoding_type,
+        storage_url=worker_args.storage_url,
+        data_format=worker_args.data_format,
+    ) as datastore:
+        for prefix in prefixes or hex_sequence(hex_first=first_hash, hex_last=last_hash):
+            while metadata_row and metadata_row[0] < prefix:
+                metadata_row = next(metadata_rows, None)
+
+            # metadata is ignored when the data file is missing so that the prefix is downloaded again in full
+            if not metadata_row or metadata_row[0] != prefix or not datastore.exists(prefix):
+                work_items.append(PrefixWorkItem(prefix=prefix))
+                downloaded_timestamps.append(0)
+                content_sizes.append(metadata_row[6] if metadata_row and metadata_row[0] == prefix else None)
+                continue
+
+            _, etag, server_timestamp, data_source, content_checksum, last_modified, content_bytes = metadata_row
+            if data_source and server_timestamp:
+                local_ttl = worker_args.local_cache_ttl - (now - server_timestamp)
+                if local_ttl > 0:
+                    logger.debug(f"Skipping {prefix}; local-cache has {local_ttl} time-to-live")
+                    local_cache_count += 1
+                    continue
+
+            # --ignore-etag (and --force) also rewrite the data file even when its content checksum is unchanged
+            if worker_args.ignore_etag:
+                work_items.append(PrefixWorkItem(prefix=prefix))
+            else:
+                work_items.append(PrefixWorkItem(prefix=prefix, etag=etag, content_checksum=content_checksum))
+            downloaded_timestamps.append(server_timestamp or last_modified or 0)
+            content_sizes.append(content_bytes)
+
+    # stable sorts, so prefixes with the same sort key (eg never downloaded) stay in prefix order
+    if schedule == DownloadSchedule.stalest:
+        order = sorted(range(len(work_items)), key=downloaded_timestamps.__getitem__)
+        work_items = [work_items[index] for index in order]
+    elif schedule == DownloadSchedule.largest:
+        known_sizes = [size for size in content_sizes if size]
+        mean_size = sum(known_sizes) / len(known_sizes) if known_sizes else 0
+        order = sorted(range(len(work_items)), key=lambda index: -(content_sizes[index] or mean_size))
+        work_items = [work_items[index] for index in order]
+
+    return work_items, local_cache_count
+
+
+def pending_metadata_resolve(metadata_store: MetadataStore, worker_args: WorkerArgs) -> int:
+    """Resolve the pending metadata of data file writes interrupted by an earlier download (see DatafileWriter).
+
+    Pending metadata is moved into place when the data file has the content it describes.  Otherwise the write did
+    not complete; the pending metadata is dropped, and so is the existing metadata unless it still describes the
+    data file, so that the prefix is downloaded again in full.  Return the count of prefixes not resolved as written.
+    """
+    pending = metadata_store.load_pending()
+    if not pending:
+        return 0
+
+    existing = metadata_store.load_many(item.prefix for item in pending)
+    written_prefixes, unwritten_prefixes, stale_prefixes = [], [], []
+    with datastore_open(
+        worker_args.storage,
+        worker_args.data_path,
+        worker_args.hash_type.value,
+        worker_args.encoding_type,
+        storage_url=worker_args.storage_url,
+        data_format=worker_args.data_format,
+    ) as datastore:
+        for item in pending:
+            checksum = datafile_content_checksum(datastore.read(item.prefix)) if datastore.exists(item.prefix) else None
+            if checksum and checksum == item.content_checksum:
+                written_prefixes.append(item.prefix)
+                continue
+            unwritten_prefixes.append(item.prefix)
+            if item.prefix in existing and existing[item.prefix].content_checksum != checksum:
+                stale_prefixes.append(item.prefix)
+
+    metadata_store.commit_pending(written_prefixes, discard_prefixes=unwritten_prefixes)
+    metadata_store.delete_many(stale_prefixes)
+    logger.warning(
+        f"Resolved {len(pending)} data file writes interrupted by an earlier download; "
+        f"{len(unwritten_prefixes)} of these prefixes will be downloaded again"
     )
+    return len(unwritten_prefixes)
 
-    for prefix_chunk in prefix_chunks:
-        queue.put(prefix_chunk)
 
-    for _ in range(0, worker_count):
-        queue.put(QUEUE_WORKER_EXIT_SENTINEL)
+def prefixes_file_read(filepath: Path) -> list[str]:
+    """Return the sorted, unique hash prefixes listed in a file; blank lines and # comments are ignored."""
+    prefixes = set()
+    with open(filepath) as f:
+        for line in f:
+            value = line.split("#", 1)[0].strip().lower()
+            if not value:
+                continue
+            if len(value) != 5 or not all(c in "0123456789abcdef" for c in value):
+                raise HibpDownloaderException(f"Invalid hash prefix {value!r} in {str(filepath)!r}")
+            prefixes.add(value)
+    return sorted(prefixes)
+
+
+def failed_prefixes_write(filepath: Path, prefixes: list[str]) -> None:
+    """Write the failed prefixes one per line, in the format read by --prefixes-file."""
+    os.makedirs(filepath.parent, exist_ok=True)
+    with open(filepath, "w") as f:
+        f.writelines(f"{prefix}\n" for prefix in sorted(prefixes))
 
 
 def start_worker_processes(
-    work_queue: Queue, result_queue: Any, worker_count: int, worker_args: WorkerArgs
-) -> list[Process]:
+    work_distributor: SharedWorkDistributor,
+    worker_count: int,
+    worker_args: WorkerArgs,
+    concurrency: int,
+    concurrency_max: int,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    circuit_breaker: SharedCircuitBreaker | None = None,
+) -> tuple[list[Process], list[Connection]]:
+    """Start the worker processes, each with its own one-way pipe back to this process for stats records."""
     worker_processes = []
+    result_readers = []
     for worker_index in range(0, worker_count):
+        result_reader, result_writer = Pipe(duplex=False)
         worker_process = Process(
-            target=queue_worker_process, args=(work_queue, result_queue, worker_index, worker_args)
+            target=queue_worker_process,
+            args=(
+                work_distributor,
+                result_writer,
+                worker_index,
+                worker_args,
+                concurrency,
+                concurrency_max,
+                rate_limit,
+                bandwidth_limit,
+                circuit_breaker,
+            ),
         )
         worker_process.daemon = True
         worker_process.start()
+        result_writer.close()  # the worker process holds the only writer needed
         worker_processes.append(worker_process)
+        result_readers.append(result_reader)
 
-    return worker_processes
+    return worker_processes, result_readers
 
 
-def queue_worker_process(work_queue: Queue, result_queue: Queue, worker_index: int, worker_args: WorkerArgs) -> None:
-    asyncio.run(async_worker_loop(work_queue, result_queue, worker_index, worker_args))
+def queue_worker_process(
+    work_distributor: SharedWorkDistributor,
+    result_writer: Connection,
+    worker_index: int,
+    worker_args: WorkerArgs,
+    concurrency: int,
+    concurrency_max: int,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    circuit_breaker: SharedCircuitBreaker | None = None,
+) -> None:
+    # on SIGTERM (eg sent to the whole process group) stop claiming work and drain the in-flight requests
+    signal.signal(signal.SIGTERM, lambda *_: work_distributor.stop())
+    asyncio.run(
+        async_worker_loop(
+            work_distributor,
+            result_writer,
+            worker_index,
+            worker_args,
+            concurrency,
+            concurrency_max,
+            rate_limit,
+            bandwidth_limit,
+            circuit_breaker,
+        )
+    )
+
+
+class WorkerResultsBatch:
+    """Collects per-prefix results in completion order and sends them to the parent process in small batches.
+
+    Each batch is summarised in the worker and sent as one fixed-size stats record over the worker's pipe, with the
+    (5-byte) failed and completed prefixes appended for the failed-prefix list and the run journal.  An empty message
+    marks the end of the stream.
+    """
+
+    def __init__(
+        self,
+        result_writer: Connection,
+        batch_size: int = MULTIPROCESSING_RESULTS_BATCH_SIZE,
+        lag_monitor: EventLoopLagMonitor | None = None,
+    ):
+        self.result_writer = result_writer
+        self.batch_size = batch_size
+        self.lag_monitor = lag_monitor
+        self.items: list[PrefixMetadata] = []
+
+    def append(self, item: PrefixMetadata) -> None:
+        self.items.append(item)
+        if len(self.items) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.items:
+            failed_prefixes = [
+                item.prefix for item in self.items if item.data_source == PrefixMetadataDataSource.unknown_source_status
+            ]
+            completed_prefixes = [
+                item.prefix for item in self.items if item.data_source != PrefixMetadataDataSource.unknown_source_status
+            ]
+            item_stats = QueueItemStatsCompute(self.items).stats
+            if self.lag_monitor:
+                item_stats.event_loop_lag_max, item_stats.event_loop_lag_sum, item_stats.event_loop_lag_count = (
+                    self.lag_monitor.take()
+                )
+            self.result_writer.send_bytes(item_stats.pack(failed_prefixes, completed_prefixes))
+            self.items = []
 
+    def close(self) -> None:
+        self.flush()
+        self.result_writer.send_bytes(b"")
+        self.result_writer.close()
 
-async def async_worker_loop(work_queue: Queue, result_queue: Queue, worker_index: int, worker_args: WorkerArgs) -> None:
-    loop = asyncio.get_running_loop()
+
+async def async_worker_loop(
+    work_distributor: SharedWorkDistributor,
+    result_writer: Connection,
+    worker_index: int,
+    worker_args: WorkerArgs,
+    concurrency: int,
+    concurrency_max: int,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    circuit_breaker: SharedCircuitBreaker | None = None,
+) -> None:
+    worker_args.worker_index = worker_index
+
+    # sliding window; a new request is started as soon as any in-flight request finishes, rather than waiting
+    # for every request in a chunk to complete, so that one slow prefix does not stall the others; the window
+    # size adapts to the highest concurrency the network sustains without latency growth or throttling
+    request_window = AdaptiveConcurrencyLimit(
+        initial=concurrency, minimum=1, maximum=concurrency_max, name=f"Worker {worker_index}"
+    )
+    # retries back off with jitter; a throttling response pauses every request of this worker, not just its own,
+    # and an upstream outage pauses every request of all workers
+    retry_backoff = RetryBackoff(
+        concurrency_limit=request_window, circuit_breaker=circuit_breaker, name=f"Worker {worker_index}"
+    )
+    # hashing and verification run on a small thread pool so they do not stall socket reads, and data files are
+    # written by a dedicated writer thread so that requests never wait on the filesystem
+    executor = ThreadPoolExecutor(
+        max_workers=MULTIPROCESSING_WORKER_THREADS, thread_name_prefix=f"worker-{worker_index}"
+    )
+    metadata_store = MetadataStore(
+        metadata_path=worker_args.metadata_path,
+        hash_type=worker_args.hash_type.value,
+        durable=worker_args.durability != DurabilityMode.none,
+    )
+    # unless the durability mode is none, the writer saves the metadata of each data file together with it
+    datastore = datastore_open(
+        worker_args.storage,
+        worker_args.data_path,
+        worker_args.hash_type.value,
+        worker_args.encoding_type,
+        storage_url=worker_args.storage_url,
+        data_format=worker_args.data_format,
+    )
+    datafile_writer = DatafileWriter(
+        datastore,
+        name=f"worker-{worker_index}-writer",
+        durability=worker_args.durability,
+        metadata_store=metadata_store,
+    )
+    datafile_writer.start()
+    lag_monitor = EventLoopLagMonitor()
+    lag_monitor.start()
+    results_batch = WorkerResultsBatch(result_writer, lag_monitor=lag_monitor)
+    in_flight: set[asyncio.Task] = set()
 
     async with httpx_async_client(
         encoding=worker_args.encoding_type,
@@ -250,40 +830,99 @@ async def async_worker_loop(work_queue: Queue, result_queue: Queue, worker_index
         verify=worker_args.http_certificates,
         debug=worker_args.http_debug,
     ) as http_client:
+        work_items: deque[PrefixWorkItem] = deque()
         while True:
-            hash_prefixes = await loop.run_in_executor(None, work_queue.get)
-            if hash_prefixes == QUEUE_WORKER_EXIT_SENTINEL:
+            await request_window.acquire()
+            if work_distributor.stopped or (circuit_breaker and circuit_breaker.aborted):
+                request_window.release()
                 break
-            worker_args.worker_index = worker_index
-            await pwnedpasswords_get_store_gather(result_queue, hash_prefixes, worker_args, http_client=http_client)
 
+            # claim only once a request slot is free, so that claimed work never waits behind this worker's window
+            if not work_items:
+                work_items.extend(work_distributor.claim(max_size=request_window.limit))
+                if not work_items:
+                    request_window.release()
+                    break
+
+            work_item = work_items.popleft()
+            task = asyncio.create_task(
+                pwnedpasswords_get_store_windowed(
+                    work_item,
+                    request_window,
+                    results_batch,
+                    worker_args,
+                    metadata_store=metadata_store,
+                    datafile_writer=datafile_writer,
+                    http_client=http_client,
+                    retry_backoff=retry_backoff,
+                    rate_limit=rate_limit,
+                    bandwidth_limit=bandwidth_limit,
+                    executor=executor,
+                )
+            )
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+    lag_monitor.stop()
+    datafile_writer.close()
+    datastore.close()
+    metadata_store.close()
+    executor.shutdown()
+    results_batch.close()
 
-async def pwnedpasswords_get_store_gather(
-    result_queue: Queue,
-    hash_prefixes: tuple,
+
+async def pwnedpasswords_get_store_windowed(
+    work_item: PrefixWorkItem,
+    request_window: AdaptiveConcurrencyLimit,
+    results_batch: WorkerResultsBatch,
     worker_args: WorkerArgs,
+    metadata_store: MetadataStore,
+    datafile_writer: DatafileWriter,
     http_client: httpx.AsyncClient | None = None,
+    retry_backoff: RetryBackoff | None = None,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    executor: Executor | None = None,
 ) -> None:
-    raw_results = await asyncio.gather(
-        *[
-            pwnedpasswords_get_and_store_async(hash_prefix, http_client=http_client, **worker_args.as_dict())
-            for hash_prefix in hash_prefixes
-        ],
-        return_exceptions=True,
-    )
-
-    metadata_results = []
-    for prefix, res in zip(hash_prefixes, raw_results):
-        if isinstance(res, PrefixMetadata):
-            metadata_results.append(res)
-        else:
-            if isinstance(res, Exception) and not isinstance(res, HibpDownloaderException):
-                logger.error(f"Prefix {prefix}: Unexpected error ({res})")
-            metadata_results.append(
-                PrefixMetadata(prefix=prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
-            )
+    datafile_written = None
+    try:
+        result, datafile_written = await pwnedpasswords_get_and_store_async(
+            work_item.prefix,
+            etag=work_item.etag,
+            content_checksum=work_item.content_checksum,
+            http_client=http_client,
+            request_limit=request_window,
+            retry_backoff=retry_backoff,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
+            executor=executor,
+            datafile_writer=datafile_writer,
+            **worker_args.as_dict(),
+        )
+    except HibpDownloaderException:
+        result = PrefixMetadata(prefix=work_item.prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
+    except Exception:
+        # any other error must still reach the results batch, so that the prefix is listed as failed
+        logger.exception(f"Prefix {work_item.prefix}: Unexpected error")
+        result = PrefixMetadata(prefix=work_item.prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
+    finally:
+        request_window.release()
+
+    # the request slot is free for the next request while the data file waits for the writer thread
+    if datafile_written:
+        try:
+            await datafile_written
+        except HibpDownloaderException:
+            result = PrefixMetadata(prefix=work_item.prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
+        if datafile_writer.saves_metadata:
+            results_batch.append(result)
+            return
 
-    result_queue.put(metadata_results)
+    await pwnedpasswords_save_metadata(result, metadata_store, executor=executor)
+    results_batch.append(result)
 
 
 async def pwnedpasswords_get_and_store_async(
@@ -297,88 +936,102 @@ async def pwnedpasswords_get_and_store_async(
     http_proxy: str,
     http_certificates: str,
     http_debug: bool,
+    api_url: str,
     ignore_etag: bool,
     local_cache_ttl: int,
+    durability: DurabilityMode,
+    storage: StorageBackend,
+    storage_url: str,
+    data_format: DataFormat,
     worker_index: int,
+    datafile_writer: DatafileWriter,
+    etag: str | None = None,
+    content_checksum: str | None = None,
     http_client: httpx.AsyncClient | None = None,
-) -> PrefixMetadata:
+    request_limit: AdaptiveConcurrencyLimit | None = None,
+    retry_backoff: RetryBackoff | None = None,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    executor: Executor | None = None,
+) -> tuple[PrefixMetadata, "asyncio.Future[None] | None"]:
+    """Request the prefix and queue new content to be written; return its metadata and the pending data file write.
+
+    The metadata is saved by the caller once the data file is written (see pwnedpasswords_save_metadata), or by the
+    datafile_writer together with the data file unless the durability mode is none.
+    """
     logger_ = logger_get(name=LOGGER_NAME)
     start_timestamp = datetime.now().astimezone()
 
     logger_.debug(
         f"{worker_index=} {prefix=} hash_type='{hash_type.value}' {encoding_type=} "
         f"{http_timeout=} {http_max_retries=} {http_proxy=} {http_certificates=} {http_debug=}"
-        f"{ignore_etag=} {local_cache_ttl=} start_timestamp={str(start_timestamp)}"
+        f"{ignore_etag=} {local_cache_ttl=} durability='{durability.value}' storage='{storage.value}' "
+        f"data_format='{data_format.value}' "
+        f"{etag=} start_timestamp={str(start_timestamp)}"
     )
 
-    datafile_suffix = encoding_type_file_suffix(encoding_type)
-
-    # get existing metadata if available
-    metadata_existing = await load_metadata(
-        metadata_path=metadata_path,
-        data_path=data_path,
+    datafile_stream = DatafileStream(
+        encoding_type=encoding_type,
+        executor=executor,
+        writer=datafile_writer,
         prefix=prefix,
-        hash_type=hash_type.value,
-        datafile_suffix=datafile_suffix,
+        data_format=data_format,
     )
+    datafile_written = None
 
-    if not metadata_existing:
-        logger_.debug(f"No existing metadata, will generate new metadata for {prefix!r}")
-
-    etag = None
-    if metadata_existing.data_source:
-        if metadata_existing.server_timestamp:
-            local_ttl = (
-                local_cache_ttl - (datetime.now().astimezone() - metadata_existing.server_timestamp).total_seconds()  # type: ignore[operator]
-            )
-            if local_ttl > 0:
-                logger_.debug(f"Skipping {prefix}; local-cache has {local_ttl} time-to-live")
-                metadata_existing.data_source = PrefixMetadataDataSource.local_source_ttl_cache
-                metadata_existing.start_timestamp = start_timestamp
-                return metadata_existing
-        if not ignore_etag:
-            etag = metadata_existing.etag
-
-    # download with etag setting
-    binary, metadata_latest = await pwnedpasswords_get(
-        prefix,
-        hash_type=hash_type,
-        etag=etag,
-        encoding=encoding_type,
-        http_timeout=http_timeout,
-        http_max_retires=http_max_retries,
-        http_proxy=http_proxy,
-        http_certificates=http_certificates,
-        http_debug=http_debug,
-        http_client=http_client,
-    )
-    metadata_latest.start_timestamp = start_timestamp
-
-    metadata = metadata_existing
-    for f in dataclasses.fields(metadata_latest):
-        value = getattr(metadata_latest, f.name)
-        if value is not None:
-            setattr(metadata, f.name, value)
-
-    # save
-    if binary:
-        await save_datafile(
-            data_path=data_path,
+    # download with etag setting; new content is streamed to a temporary file that the writer moves into the datastore
+    try:
+        _, metadata = await pwnedpasswords_get(
+            prefix,
             hash_type=hash_type,
-            prefix=prefix,
-            content=binary,
-            filename_suffix=datafile_suffix,
-            timestamp=metadata.last_modified,
+            etag=etag,
+            encoding=encoding_type,
+            http_timeout=http_timeout,
+            http_max_retires=http_max_retries,
+            http_proxy=http_proxy,
+            http_certificates=http_certificates,
+            http_debug=http_debug,
+            api_url=api_url,
+            http_client=http_client,
+            request_limit=request_limit,
+            retry_backoff=retry_backoff,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
+            body_stream=datafile_stream,
         )
+        metadata.start_timestamp = start_timestamp
+
+        # save; content that is identical to the existing data file (eg a new ETag only) only refreshes metadata
+        if metadata.data_source in (
+            PrefixMetadataDataSource.remote_source_remote_cache,
+            PrefixMetadataDataSource.remote_source_origin_source,
+        ):
+            if content_checksum and metadata.content_checksum == content_checksum:
+                metadata.data_source = PrefixMetadataDataSource.remote_source_content_unchanged
+            else:
+                datafile_written = await datafile_stream.commit_queued(
+                    timestamp=metadata.last_modified, metadata=metadata
+                )
+    finally:
+        await datafile_stream.discard()
+
+    return metadata, datafile_written
+
 
-    if metadata.data_source not in (
+async def pwnedpasswords_save_metadata(
+    metadata: PrefixMetadata, metadata_store: MetadataStore, executor: Executor | None = None
+) -> None:
+    if metadata.data_source == PrefixMetadataDataSource.local_source_etag_match:
+        # the existing metadata still describes the data file; only the time it was checked is updated, so that
+        # the stalest schedule moves on to other prefixes
+        metadata_store.queue_save_checked(metadata, autoflush=False)
+    elif metadata.data_source not in (
         PrefixMetadataDataSource.local_source_ttl_cache,
-        PrefixMetadataDataSource.local_source_etag_match,
         PrefixMetadataDataSource.unknown_source_status,
     ):
-        await save_metadatafile(metadata_path=metadata_path, hash_type=hash_type, prefix=prefix, metadata=metadata)
-
-    return metadata
+        metadata_store.queue_save(metadata, autoflush=False)
+    if metadata_store.flush_due:
+        await asyncio.get_running_loop().run_in_executor(executor, metadata_store.flush)
 
 
 async def pwnedpasswords_get(
@@ -391,12 +1044,19 @@ async def pwnedpasswords_get(
     http_proxy: str,
     http_certificates: str,
     http_debug: bool,
+    api_url: str = PWNEDPASSWORDS_API_URL,
     http_client: httpx.AsyncClient | None = None,
+    request_limit: AdaptiveConcurrencyLimit | None = None,
+    retry_backoff: RetryBackoff | None = None,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    body_stream: DatafileStream | None = None,
 ) -> tuple[bytes | None, PrefixMetadata]:
-    url = f"{PWNEDPASSWORDS_API_URL}/range/{prefix}"
+    url = f"{api_url}/range/{prefix}"
     if hash_type == HashType.ntlm:
         url += "?mode=ntlm"
 
+    request_start = time.monotonic()
     try:
         response = await httpx_binary_response(
             url=url,
@@ -408,29 +1068,65 @@ async def pwnedpasswords_get(
             proxy=http_proxy,
             verify=http_certificates,
             client=http_client,
+            body_stream=body_stream,
+            backoff=retry_backoff,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
         )
     except HibpDownloaderException:
+        if request_limit:
+            request_limit.record_error()
         return None, PrefixMetadata(prefix=prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
 
+    if request_limit:
+        if response.status_code == 429:
+            request_limit.record_backoff()
+        elif response.status_code >= 500:
+            request_limit.record_error()
+        else:
+            request_limit.record_success(time.monotonic() - request_start)
+
     binary = getattr(response, "binary", b"")
 
+    # a 200 body streamed to the body_stream has been checksummed and verified as it arrived
+    streamed = body_stream if body_stream and response.status_code == 200 else None
+    content_checksum: str | None
+    if streamed:
+        content_bytes, content_checksum = streamed.bytes, streamed.checksum
+    else:
+        content_bytes, content_checksum = len(binary), hashed_sha256(binary) if binary else None
+
+    # a missing or malformed Date or Last-Modified header is left unset rather than failing the prefix
+    server_timestamp = parse_http_date(response.headers.get("date"))
+    last_modified = parse_http_date(response.headers.get("last-modified"))
+    for name, timestamp in (("date", server_timestamp), ("last-modified", last_modified)):
+        if response.headers.get(name) and timestamp is None:
+            logger.warning(f"Prefix {prefix}: Invalid {name!r} header {response.headers.get(name)!r} ignored")
+
     metadata = PrefixMetadata(
         prefix=prefix,
         hash_type=hash_type,
         etag=response.headers.get("etag"),
-        bytes=len(binary),
-        server_timestamp=response.headers.get("date"),
-        last_modified=response.headers.get("last-modified"),
+        bytes=content_bytes,
+        server_timestamp=server_timestamp,
+        last_modified=last_modified,
         content_encoding=response.headers.get("content-encoding"),
-        content_checksum=hashed_sha256(binary) if binary else None,
+        content_checksum=content_checksum,
     )
 
     if response.status_code == 304:  # HTTP 304 Not Modified status
         metadata.data_source = PrefixMetadataDataSource.local_source_etag_match
     elif response.status_code == 200:
-        if not verify_binary_encoding(binary, encoding):
+        if streamed and not streamed.verified:
+            logger.warning(
+                f"Prefix {prefix}: Invalid binary received ({streamed.verify_failure}, encoding '{encoding}')"
+            )
+            return None, PrefixMetadata(prefix=prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
+        if not streamed and not verify_binary_encoding(binary, encoding):
             logger.warning(f"Prefix {prefix}: Invalid binary received (mismatch with expected encoding '{encoding}')")
             return None, PrefixMetadata(prefix=prefix, data_source=PrefixMetadataDataSource.unknown_source_status)
+        if streamed:
+            logger.debug(f"Prefix {prefix}: Verified {streamed.line_count} range lines in {streamed.bytes} bytes")
         if (
             response.headers.get("cf-cache-status", "").upper() == "HIT"
         ):  # Fragile: relies on HIBP hosted via Cloudflare
@@ -443,42 +1139,119 @@ async def pwnedpasswords_get(
     return binary, metadata
 
 
-def results_queue_processor(q: Queue, summary_queue: Queue) -> None:
-    running_stats = QueueRunningStats()
+def results_pipe_processor(
+    result_readers: dict[Connection, Process],
+    work_distributor: SharedWorkDistributor | None = None,
+    local_cache_count: int = 0,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
+    circuit_breaker: SharedCircuitBreaker | None = None,
+    journal: RunJournal | None = None,
+) -> QueueRunningStats:
+    """Read stats records from every worker pipe until all workers have finished; return the run totals.
 
-    try:
-        while True:
-            metadata_items = q.get()
-            if metadata_items == QUEUE_WORKER_EXIT_SENTINEL:
-                running_stats.end_trigger()
-                logger.info(f"Finished in {round(running_stats.run_time / 60, 1)}min")
-                summary_queue.put({"failed_prefix_count": running_stats.unknown_source_status_count_sum})
-                break
+    The prefixes claimed (from the `work_distributor`) by a worker that ended without its end-of-stream message, eg
+    killed, and not reported before it ended are added to the failed prefixes.
+    """
+    running_stats = QueueRunningStats(local_source_ttl_cache_count_sum=local_cache_count)
+
+    def limits_status() -> str:
+        # live rates (including retries) since the previous progress line, against the limits that are set
+        status = ""
+        if rate_limit:
+            status += f"rate=[{int(rate_limit.take_rate())}/{rate_limit.rate:g}req/s] "
+        if bandwidth_limit:
+            status += (
+                f"bandwidth=[{to_mbytes(bandwidth_limit.take_rate(), 1)}/{to_mbytes(bandwidth_limit.rate, 1)}MB/s] "
+            )
+        return status
+
+    # a worker that exits without its end-of-stream message (eg killed) is detected by the end of its pipe, or through
+    # its process sentinel
+    readers = dict(result_readers)
+    sentinels = {process.sentinel: reader for reader, process in readers.items()}
+    reported = bytearray(RUN_JOURNAL_PREFIX_SPACE)  # one byte per prefix, set once the prefix is reported
+
+    def reader_lost(reader: Connection) -> None:
+        readers.pop(reader)
+        reader.close()
+        running_stats.workers_lost += 1
+        process = result_readers[reader]
+        process.join()  # the pipe and sentinel may be ready before the exit code is
+        logger.error(
+            f"Worker process {process.pid} ended unexpectedly (exit code {process.exitcode}) before reporting all "
+            "of its prefixes"
+        )
 
-            if metadata_items:
-                for metadata_item in metadata_items:
-                    if metadata_item.data_source == PrefixMetadataDataSource.unknown_source_status:
-                        logger.error(
-                            f"Failed to download prefix {metadata_item.prefix!r}; local data file was not updated"
-                        )
-                running_stats.add_item_stats(item=QueueItemStatsCompute(metadata_items).stats)
-
-            if running_stats.queue_item_count % LOGGING_INFO_EVENT_MODULUS == 0:
-                logger.info(
-                    f"prefix={running_stats.prefix_latest} "
-                    f"source=[lc:{running_stats.local_source_ttl_cache_count_sum} "
-                    f"et:{running_stats.local_source_etag_match_count_sum} "
-                    f"rc:{running_stats.remote_source_remote_cache_count_sum} "
-                    f"ro:{running_stats.remote_source_origin_source_count_sum} "
-                    f"xx:{running_stats.unknown_source_status_count_sum}] "
-                    f"processed=[{to_mbytes(running_stats.bytes_processed_sum, 1)}MB "
-                    f"~{int(running_stats.bytes_processed_rate_total / APPROX_GZIP_BYTES_PER_HASH)}H/s] "
-                    f"api=[{int(running_stats.request_rate_total)}req/s "
-                    f"{to_mbytes(running_stats.bytes_received_sum, 1)}MB] "
-                    f"runtime={round(running_stats.run_time / 60, 1)}min"
-                )
-    except KeyboardInterrupt:
-        return
+    def receive(reader: Connection) -> None:
+        try:
+            data = reader.recv_bytes()
+        except EOFError:
+            reader_lost(reader)
+            return
+        if not data:
+            readers.pop(reader, None)
+            reader.close()
+            return
+
+        item_stats, failed_prefixes, completed_prefixes = QueueItemStats.unpack(data)
+        for prefix in (*failed_prefixes, *completed_prefixes):
+            reported[int(prefix, 16)] = 1
+        if journal:
+            journal.record(completed_prefixes)
+        for prefix in failed_prefixes:
+            # after an abort the in-flight prefixes fail together; they are summarised once at the end instead
+            if not (circuit_breaker and circuit_breaker.aborted):
+                logger.error(f"Failed to download prefix {prefix!r}; local data file was not updated")
+        running_stats.add_item_stats(item=item_stats)
+        running_stats.failed_prefixes.extend(failed_prefixes)
+
+        if running_stats.queue_item_count % LOGGING_INFO_EVENT_MODULUS == 0:
+            logger.info(
+                f"prefix={running_stats.prefix_latest} "
+                f"source=[lc:{running_stats.local_source_ttl_cache_count_sum} "
+                f"et:{running_stats.local_source_etag_match_count_sum} "
+                f"rc:{running_stats.remote_source_remote_cache_count_sum} "
+                f"ro:{running_stats.remote_source_origin_source_count_sum} "
+                f"uc:{running_stats.remote_source_content_unchanged_count_sum} "
+                f"xx:{running_stats.unknown_source_status_count_sum}] "
+                f"processed=[{to_mbytes(running_stats.bytes_processed_sum, 1)}MB "
+                f"~{int(running_stats.bytes_processed_rate_total / APPROX_GZIP_BYTES_PER_HASH)}H/s] "
+                f"api=[{int(running_stats.request_rate_total)}req/s "
+                f"{to_mbytes(running_stats.bytes_received_sum, 1)}MB] "
+                f"{limits_status()}"
+                f"runtime={round(running_stats.run_time / 60, 1)}min"
+            )
+
+    while readers:
+        for ready in wait([*readers, *sentinels]):
+            if isinstance(ready, int):
+                reader = sentinels.pop(ready)
+                while reader in readers and reader.poll():
+                    receive(reader)
+                if reader in readers:
+                    reader_lost(reader)
+            elif isinstance(ready, Connection) and ready in readers:
+                receive(ready)
+
+    if running_stats.workers_lost and work_distributor:
+        lost_prefixes = [
+            work_item.prefix
+            for work_item in work_distributor.work_items[: work_distributor.claimed_count]
+            if not reported[int(work_item.prefix, 16)]
+        ]
+        if lost_prefixes:
+            logger.error(f"{len(lost_prefixes)} prefixes claimed by the ended worker processes were not reported")
+        running_stats.failed_prefixes.extend(lost_prefixes)
+
+    running_stats.end_trigger()
+    logger.info(f"Finished in {round(running_stats.run_time / 60, 1)}min")
+    logger.info(
+        f"Worker event-loop lag: mean {round(running_stats.event_loop_lag_mean * 1000, 1)}ms "
+        f"max {round(running_stats.event_loop_lag_max * 1000, 1)}ms"
+    )
+
+    return running_stats
 
 
 def to_mbytes(value: float | None, rounding: int | None = None) -> float | None:
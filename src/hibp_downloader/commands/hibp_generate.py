@@ -6,7 +6,8 @@ from typing import Annotated
 
 from hibp_downloader import ENCODING_TYPE, HELP_EPILOG_FOOTER, LOGGER_NAME, LOGGING_INFO_EVENT_MODULUS, app_context
 from hibp_downloader.exceptions import HibpDownloaderException
-from hibp_downloader.lib.filedata import append_stringfile, load_datafile
+from hibp_downloader.lib.datastore import Datastore, datastore_open
+from hibp_downloader.lib.filedata import append_stringfile, datafile_decode
 from hibp_downloader.lib.generators import hex_sequence, iterable_chunker
 from hibp_downloader.lib.logger import logger_get
 from hibp_downloader.models import HashType
@@ -61,14 +62,23 @@ def main(
         logger.error(f"Output file already exists {filename!r}")
         raise typer.Exit(1)
 
-    asyncio.run(pwnedpasswords_datastore_sorted_gather(filename, hash_type, first_hash[0:5], last_hash[0:5]))
+    with datastore_open(
+        app_context.storage,
+        app_context.data_path,  # type: ignore[arg-type]
+        hash_type.value,
+        storage_url=app_context.storage_url,
+        data_format=app_context.data_format,
+    ) as datastore:
+        asyncio.run(
+            pwnedpasswords_datastore_sorted_gather(filename, hash_type, first_hash[0:5], last_hash[0:5], datastore)
+        )
 
 
-async def pwnedpasswords_datastore_sorted_gather(filename, hash_type, first_hash, last_hash, chunk_size=16):
+async def pwnedpasswords_datastore_sorted_gather(filename, hash_type, first_hash, last_hash, datastore, chunk_size=16):
     iteration_count = 0
     for prefixes in iterable_chunker(iterable=hex_sequence(hex_first=first_hash, hex_last=last_hash), size=chunk_size):
         results = await asyncio.gather(
-            *[pwnedpasswords_datastore_sorted_async(prefix, hash_type) for prefix in prefixes],
+            *[pwnedpasswords_datastore_sorted_async(prefix, hash_type, datastore) for prefix in prefixes],
         )
 
         if iteration_count == 0 or iteration_count % (LOGGING_INFO_EVENT_MODULUS * 5) == 0:
@@ -82,20 +92,14 @@ async def pwnedpasswords_datastore_sorted_gather(filename, hash_type, first_hash
         await append_stringfile(filepath=filename, content=output)
 
 
-async def pwnedpasswords_datastore_sorted_async(prefix, hash_type):
+async def pwnedpasswords_datastore_sorted_async(prefix, hash_type, datastore: Datastore):
     if ENCODING_TYPE in ("gz", "gzip"):
-        filename_suffix = "gz"
         decompression_mode = "gzip"
     else:
         raise HibpDownloaderException(f"Unsupported ENCODING_TYPE {ENCODING_TYPE}")
 
-    datafile_content, datafile_filepath = await load_datafile(
-        data_path=app_context.data_path,
-        hash_type=hash_type,
-        prefix=prefix,
-        datafile_suffix=filename_suffix,
-        decompression_type=decompression_mode,
-        prepend_prefix=True,
+    datafile_content = datafile_decode(
+        datastore.read(prefix), prefix, decompression_type=decompression_mode, prepend_prefix=True
     )
 
-    return {prefix: datafile_content, f"{prefix}_datafile": datafile_filepath}
+    return {prefix: datafile_content, f"{prefix}_datafile": datastore.location(prefix)}
@@ -8,7 +8,9 @@ from typing import Annotated
 
 from hibp_downloader import ENCODING_TYPE, HELP_EPILOG_FOOTER, LOGGER_NAME, app_context
 from hibp_downloader.exceptions import HibpDownloaderException
-from hibp_downloader.lib.filedata import load_datafile
+from hibp_downloader.lib.binary_prefix import BinaryPrefix, is_binary_prefix
+from hibp_downloader.lib.datastore import datastore_open
+from hibp_downloader.lib.filedata import datafile_decode
 from hibp_downloader.lib.hashing import hashed_ntlm, hashed_sha1
 from hibp_downloader.lib.logger import logger_get
 from hibp_downloader.models import HashType
@@ -77,7 +79,6 @@ def main(
 
 async def pwnedpasswords_query_datastore(password_hashed: str, hash_type: HashType):
     if ENCODING_TYPE in ("gz", "gzip"):
-        filename_suffix = "gz"
         decompression_mode = "gzip"
     else:
         raise HibpDownloaderException(f"Unsupported ENCODING_TYPE {ENCODING_TYPE}")
@@ -91,21 +92,34 @@ async def pwnedpasswords_query_datastore(password_hashed: str, hash_type: HashTy
         "hibp_count": None,
     }
 
-    try:
-        datafile_content, datafile_filepath = await load_datafile(
-            data_path=app_context.data_path,  # type: ignore[arg-type]
-            hash_type=hash_type,
-            prefix=prefix,
-            datafile_suffix=filename_suffix,
-            decompression_type=decompression_mode,
-            prepend_prefix=True,
-        )
-    except HibpDownloaderException as e:
-        result["status"] = str(e)
-        return stdout_json(result)
+    with datastore_open(
+        app_context.storage,
+        app_context.data_path,  # type: ignore[arg-type]
+        hash_type.value,
+        storage_url=app_context.storage_url,
+        data_format=app_context.data_format,
+    ) as datastore:
+        try:
+            data = datastore.read(prefix)
+            binary_prefix = BinaryPrefix(data) if is_binary_prefix(data) else None
+            if binary_prefix is None:
+                datafile_content = datafile_decode(
+                    data, prefix, decompression_type=decompression_mode, prepend_prefix=True
+                )
+        except HibpDownloaderException as e:
+            result["status"] = str(e)
+            return stdout_json(result)
+        result["data_file"] = datastore.location(prefix)
 
-    if datafile_filepath:
-        result["data_file"] = str(datafile_filepath)
+    # the binary prefix format is binary searched for the hash suffix, without decoding the other lines
+    if binary_prefix is not None:
+        hibp_count = binary_prefix.count(password_hashed[5:])
+        if hibp_count is not None:
+            result["hibp_count"] = hibp_count  # type: ignore[assignment]
+            result["status"] = "Found"
+            return stdout_json(result)
+        result["status"] = "Not Found"
+        return stdout_json(result)
 
     for line in datafile_content.split("\n"):
         if password_hashed.upper() in line:
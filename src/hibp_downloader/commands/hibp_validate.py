@@ -1,16 +1,18 @@
 import asyncio
 import os
 import time
-from pathlib import Path
 import typer
 from typing import Annotated
-import aiofiles
 
 from hibp_downloader import ENCODING_TYPE, HELP_EPILOG_FOOTER, LOGGER_NAME, LOGGING_INFO_EVENT_MODULUS, app_context
-from hibp_downloader.lib.filedata import encoding_type_file_suffix, generate_filepath, verify_binary_encoding
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.binary_prefix import BINARY_PREFIX_ENCODING_TYPE
+from hibp_downloader.lib.datastore import Datastore, datastore_open
+from hibp_downloader.lib.filedata import verify_binary_encoding
 from hibp_downloader.lib.generators import hex_sequence, iterable_chunker
 from hibp_downloader.lib.logger import logger_get
-from hibp_downloader.models import HashType
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import DataFormat, HashType
 
 logger = logger_get(name=LOGGER_NAME)
 
@@ -69,7 +71,22 @@ def main(
     logger.info(f"metadata-path {app_context.metadata_path!r}")
 
     stats = ValidationStats()
-    asyncio.run(pwnedpasswords_validate_gather(stats, hash_type, first_hash[0:5], last_hash[0:5]))
+    with (
+        MetadataStore(metadata_path=app_context.metadata_path, hash_type=hash_type.value) as metadata_store,  # type: ignore[arg-type]
+        datastore_open(
+            app_context.storage,
+            app_context.data_path,  # type: ignore[arg-type]
+            hash_type.value,
+            storage_url=app_context.storage_url,
+            data_format=app_context.data_format,
+        ) as datastore,
+    ):
+        metadata_store.import_metafiles()
+        asyncio.run(
+            pwnedpasswords_validate_gather(
+                stats, hash_type, metadata_store, first_hash[0:5], last_hash[0:5], datastore=datastore
+            )
+        )
 
     logger.info("Validation completed:")
     logger.info(f"  Checked prefixes:   {stats.checked}")
@@ -81,38 +98,43 @@ def main(
 async def pwnedpasswords_validate_gather(
     stats: ValidationStats,
     hash_type: HashType,
+    metadata_store: MetadataStore,
     first_hash: str,
     last_hash: str,
+    datastore: Datastore,
     chunk_size: int = 64,
 ) -> None:
     prefixes = list(hex_sequence(hex_first=first_hash, hex_last=last_hash))
     total_prefixes = len(prefixes)
     logger.info(f"Validating {total_prefixes} prefixes...")
     logger.info("Legend: vd = valid, ms = missing, cr = corrupted")
+    encoding_type = BINARY_PREFIX_ENCODING_TYPE if app_context.data_format == DataFormat.binary else ENCODING_TYPE
 
     iteration_count = 0
+    unstored_prefixes = []  # prefixes with a missing or corrupted data file, whose metadata is deleted
     for chunk in iterable_chunker(iterable=prefixes, size=chunk_size):
         results = await asyncio.gather(
             *[
                 verify_local_datafile(
                     prefix=prefix,
                     hash_type=hash_type,
-                    data_path=Path(app_context.data_path),  # type: ignore[arg-type]
-                    metadata_path=Path(app_context.metadata_path),  # type: ignore[arg-type]
-                    encoding_type=ENCODING_TYPE,
+                    datastore=datastore,
+                    encoding_type=encoding_type,
                 )
                 for prefix in chunk
             ],
         )
 
-        for res in results:
+        for prefix, res in zip(chunk, results):
             stats.checked += 1
             if res == "valid":
                 stats.valid += 1
             elif res == "missing":
                 stats.missing_data += 1
+                unstored_prefixes.append(prefix)
             elif res == "corrupted":
                 stats.corrupted += 1
+                unstored_prefixes.append(prefix)
 
         iteration_count += len(chunk)
         if (iteration_count // chunk_size) % LOGGING_INFO_EVENT_MODULUS == 0 or iteration_count == total_prefixes:
@@ -126,43 +148,39 @@ async def pwnedpasswords_validate_gather(
                 f"runtime={round(elapsed / 60, 1)}min"
             )
 
+    # one metadata store transaction after the scan, rather than one per prefix
+    try:
+        deleted_count = metadata_store.delete_many(unstored_prefixes)
+    except HibpDownloaderException as e:
+        logger.error(f"Error deleting the metadata of {len(unstored_prefixes)} missing or corrupted data files: {e}")
+        return
+    if deleted_count:
+        logger.warning(f"Deleted the metadata of {deleted_count} prefixes with a missing or corrupted data file")
+
 
 async def verify_local_datafile(
     prefix: str,
     hash_type: HashType,
-    data_path: Path,
-    metadata_path: Path,
+    datastore: Datastore,
     encoding_type: str,
 ) -> str:
     """Checks that the local file exists and is valid.
 
-    If datafile is missing, deletes metadata file.
-    If datafile is corrupted, deletes both datafile and metadata file.
+    If datafile is corrupted, deletes the datafile; the caller deletes the metadata entry of a missing or corrupted
+    datafile.
     Returns:
       "valid" if the datafile exists and is valid.
-      "missing" if datafile was missing (and metadata was deleted if it existed).
+      "missing" if datafile was missing.
       "corrupted" if datafile was corrupted and deleted.
     """
     logger_ = logger_get(name=LOGGER_NAME)
-    hash_type_str = hash_type.value.lower()
-    datafile_suffix = encoding_type_file_suffix(encoding_type)
-
-    data_file_path = generate_filepath(data_path, hash_type_str, prefix, datafile_suffix)
-    metadata_file_path = generate_filepath(metadata_path, hash_type_str, prefix, "meta")
-
-    if not data_file_path.exists():
-        if metadata_file_path.exists():
-            logger_.warning(f"Prefix {prefix}: Metadata file exists but data file is missing. Deleting metadata.")
-            try:
-                metadata_file_path.unlink()
-            except OSError as e:
-                logger_.error(f"Prefix {prefix}: Error deleting metadata file: {e}")
+
+    if not datastore.exists(prefix):
         return "missing"
 
     # verify contents
     try:
-        async with aiofiles.open(data_file_path, "rb") as f:
-            data = await f.read()
+        data = datastore.read(prefix)
 
         if verify_binary_encoding(data, encoding_type):
             return "valid"
@@ -174,17 +192,9 @@ async def verify_local_datafile(
         logger_.warning(f"Prefix {prefix}: Error reading data file ({e}). Deleting data and metadata.")
 
     # delete corrupted file
-    if data_file_path.exists():
-        try:
-            data_file_path.unlink()
-        except OSError as e:
-            logger_.error(f"Prefix {prefix}: Error deleting corrupted data file: {e}")
-
-    # delete metadata
-    if metadata_file_path.exists():
-        try:
-            metadata_file_path.unlink()
-        except OSError as e:
-            logger_.error(f"Prefix {prefix}: Error deleting metadata file: {e}")
+    try:
+        datastore.delete(prefix)
+    except HibpDownloaderException as e:
+        logger_.error(f"Prefix {prefix}: Error deleting corrupted data file: {e}")
 
     return "corrupted"
@@ -4,9 +4,10 @@ import typer
 from typing import Annotated
 
 from .. import HELP_EPILOG_FOOTER, LOGGER_NAME, __title__, __version__, app_context
-from ..commands import hibp_download, hibp_generate, hibp_query, hibp_validate
+from ..commands import hibp_compact, hibp_download, hibp_generate, hibp_query, hibp_validate
 from ..exceptions import HibpDownloaderException
 from ..lib.logger import logger_get
+from ..models import DataFormat, StorageBackend
 
 """
 2026-04-05 Bug fix JimTheFrog and the AI:
@@ -57,6 +58,37 @@ def main(
             hidden=False if app_context.debug else True,
         ),
     ] = "",
+    storage: Annotated[
+        StorageBackend,
+        typer.Option(
+            help="Storage backend for the data: 'files' with one data file per hash-prefix in the --data-path, 'pack' "
+            "with append-only pack files and an index in the --data-path (use the compact command to reclaim "
+            "superseded data), or 's3' with one object per hash-prefix at the --storage-url",
+            envvar="HIBPDL_STORAGE",
+            show_envvar=False,
+            case_sensitive=False,
+        ),
+    ] = StorageBackend.files,
+    storage_url: Annotated[
+        str,
+        typer.Option(
+            help="Object store location for --storage s3, eg s3://bucket/hibp; the endpoint (eg MinIO) and credentials "
+            "are taken from the AWS_* environment variables; metadata is still saved in the local --data-path",
+            envvar="HIBPDL_STORAGE_URL",
+            show_envvar=False,
+        ),
+    ] = "",
+    data_format: Annotated[
+        DataFormat,
+        typer.Option(
+            help="Format of the stored hash-prefix data: 'gzip' with the range lines as received, or 'binary' with the "
+            "range lines transcoded on download into a sorted binary format that query, generate and validate read "
+            "without text parsing",
+            envvar="HIBPDL_DATA_FORMAT",
+            show_envvar=False,
+            case_sensitive=False,
+        ),
+    ] = DataFormat.gzip,
     debug: Annotated[
         bool,
         typer.Option("--debug", help="Set logging to debug-level messages", envvar="HIBPDL_DEBUG", show_envvar=False),
@@ -82,6 +114,9 @@ def main(
     if not data_path:
         raise typer.BadParameter("Missing option '--data-path'", param_hint="--data-path")
 
+    if storage == StorageBackend.s3 and not storage_url:
+        raise typer.BadParameter("Missing option '--storage-url' for --storage s3", param_hint="--storage-url")
+
     # debug is captured at __init__; referenced here for happy linters
     if debug:
         ...
@@ -94,6 +129,9 @@ def main(
     app_context.command = ctx.invoked_subcommand
     app_context.data_path = data_path
     app_context.metadata_path = metadata_path if metadata_path else data_path
+    app_context.storage = storage
+    app_context.storage_url = storage_url
+    app_context.data_format = data_format
 
     # start
     logger.info(f"{__title__}: v{__version__}")
@@ -104,3 +142,4 @@ def load_commands() -> None:
     app.add_typer(hibp_generate.command, name=hibp_generate.command_name, rich_help_panel=hibp_generate.command_section)
     app.add_typer(hibp_query.command, name=hibp_query.command_name, rich_help_panel=hibp_query.command_section)
     app.add_typer(hibp_validate.command, name=hibp_validate.command_name, rich_help_panel=hibp_validate.command_section)
+    app.add_typer(hibp_compact.command, name=hibp_compact.command_name, rich_help_panel=hibp_compact.command_section)
@@ -0,0 +1,200 @@
+import gzip
+import struct
+import zlib
+
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.hashing import hashed_sha256
+
+BINARY_PREFIX_MAGIC = b"HPB1"
+BINARY_PREFIX_VERSION = 1
+BINARY_PREFIX_HEADER = struct.Struct("<4sBBHI32s")  # magic, version, suffix hex digits, index stride, count, checksum
+BINARY_PREFIX_INDEX_ENTRY = struct.Struct("<I")  # offset of a count in the counts section
+BINARY_PREFIX_INDEX_STRIDE = 64
+BINARY_PREFIX_ENCODING_TYPE = "binary"
+
+
+class BinaryPrefix:
+    """The range lines of one prefix in the binary prefix format, read without any text parsing.
+
+    The format is a BINARY_PREFIX_HEADER, the hash suffixes in ascending order as fixed-width packed hex digits (17.5
+    bytes each for sha1, 13.5 for ntlm; the last byte is padded with a zero digit), an index with the offset of every
+    BINARY_PREFIX_INDEX_STRIDE-th count, and the counts as LEB128 varints.  The header holds the SHA-256 checksum of
+    the content the lines were transcoded from, ie the `content_checksum` of the prefix metadata.
+
+    A suffix is found by a binary search of the suffixes (as one hex string), and its count by decoding at most
+    BINARY_PREFIX_INDEX_STRIDE - 1 varints after the nearest index entry.
+    """
+
+    def __init__(self, data: bytes | bytearray):
+        layout = _binary_prefix_layout(data)
+        if layout is None:
+            raise HibpDownloaderException("Invalid binary prefix data")
+        self.data = bytes(data)
+        self.suffix_length, self.index_stride, self.record_count, self.content_checksum = layout[0:4]
+        self._index_offset, self._counts_offset = layout[4:6]
+        self._suffixes = ""
+
+    @property
+    def suffixes(self) -> str:
+        """All the suffixes as one uppercase hex string, `suffix_length` digits each."""
+        if not self._suffixes and self.record_count:
+            suffixes = self.data[BINARY_PREFIX_HEADER.size : self._index_offset].hex().upper()
+            self._suffixes = suffixes[0 : self.record_count * self.suffix_length]
+        return self._suffixes
+
+    def find(self, suffix: str) -> int | None:
+        """Return the record index of the hash suffix, or None when it is not in the prefix."""
+        suffix = suffix.upper()
+        if len(suffix) != self.suffix_length:
+            return None
+        suffixes, length = self.suffixes, self.suffix_length
+        low, high = 0, self.record_count
+        while low < high:
+            middle = (low + high) // 2
+            if suffixes[middle * length : (middle + 1) * length] < suffix:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.record_count and suffixes[low * length : (low + 1) * length] == suffix:
+            return low
+        return None
+
+    def count(self, suffix: str) -> int | None:
+        """Return the count of the hash suffix, or None when it is not in the prefix."""
+        index = self.find(suffix)
+        if index is None:
+            return None
+        entry = index // self.index_stride
+        (offset,) = BINARY_PREFIX_INDEX_ENTRY.unpack_from(
+            self.data, self._index_offset + entry * BINARY_PREFIX_INDEX_ENTRY.size
+        )
+        counts = _varints_decode(self.data, self._counts_offset + offset, index - entry * self.index_stride + 1)
+        return counts[-1]
+
+    def counts(self) -> list[int]:
+        return _varints_decode(self.data, self._counts_offset, self.record_count)
+
+    def lines(self, prefix: str = "") -> list[str]:
+        """Return the range lines, `<prefix><suffix>:<count>`, as uppercase hex."""
+        suffixes, length, prefix = self.suffixes, self.suffix_length, prefix.upper()
+        return [
+            f"{prefix}{suffixes[index * length : (index + 1) * length]}:{count}"
+            for index, count in enumerate(self.counts())
+        ]
+
+
+def is_binary_prefix(data: bytes | bytearray) -> bool:
+    return data[0:4] == BINARY_PREFIX_MAGIC
+
+
+def binary_prefix_encode(lines: bytes, content_checksum: str) -> bytes:
+    """Encode the range lines (`<hex-suffix>:<count>`, newline separated) in the binary prefix format; raises
+    ValueError when the lines are malformed or not in ascending suffix order."""
+    suffixes: list[str] = []
+    counts: list[int] = []
+    for line in lines.decode("ascii").upper().split():
+        suffix, _, count_digits = line.partition(":")
+        suffixes.append(suffix)
+        counts.append(int(count_digits))
+
+    suffix_length = len(suffixes[0]) if suffixes else 0
+    if any(len(suffix) != suffix_length for suffix in suffixes) or suffix_length > 255:
+        raise ValueError("hash suffixes of different lengths")
+    if any(suffixes[index] >= suffixes[index + 1] for index in range(len(suffixes) - 1)):
+        raise ValueError("hash suffixes not in ascending order")
+    suffix_digits = "".join(suffixes)
+    suffix_bytes = bytes.fromhex(suffix_digits + "0" * (len(suffix_digits) % 2))
+
+    index, encoded = bytearray(), bytearray()
+    for record, count in enumerate(counts):
+        if record % BINARY_PREFIX_INDEX_STRIDE == 0:
+            index += BINARY_PREFIX_INDEX_ENTRY.pack(len(encoded))
+        while count > 0x7F:
+            encoded.append(count & 0x7F | 0x80)
+            count >>= 7
+        encoded.append(count)
+
+    header = BINARY_PREFIX_HEADER.pack(
+        BINARY_PREFIX_MAGIC,
+        BINARY_PREFIX_VERSION,
+        suffix_length,
+        BINARY_PREFIX_INDEX_STRIDE,
+        len(suffixes),
+        bytes.fromhex(content_checksum),
+    )
+    return header + suffix_bytes + index + encoded
+
+
+def binary_prefix_transcode(prefix: str, content: bytes | bytearray, content_checksum: str) -> bytes:
+    """Transcode the content of a prefix (as received, gzip or identity) into the binary prefix format.
+
+    The content must match its `content_checksum`, and the binary prefix must decode to the same range lines as the
+    content, so that a binary prefix always describes exactly the content named by its checksum.
+    """
+    if hashed_sha256(bytes(content)) != content_checksum:
+        raise HibpDownloaderException(f"Prefix {prefix}: Content does not match its content checksum; not transcoded")
+
+    try:
+        lines = gzip.decompress(content) if content[0:2] == b"\x1f\x8b" else bytes(content)
+        data = binary_prefix_encode(lines, content_checksum)
+    except (OSError, EOFError, zlib.error, ValueError) as e:
+        raise HibpDownloaderException(f"Prefix {prefix}: Invalid range lines, not transcoded ({e})") from e
+    if BinaryPrefix(data).lines() != lines.decode("ascii").upper().split():
+        raise HibpDownloaderException(f"Prefix {prefix}: Binary prefix does not decode to the content range lines")
+    return data
+
+
+def binary_prefix_verify(data: bytes | bytearray) -> bool:
+    """Verify the structure of a binary prefix: its header, index, counts and suffix order."""
+    layout = _binary_prefix_layout(data)
+    if layout is None:
+        return False
+    suffix_length, index_stride, record_count, _, index_offset, counts_offset = layout
+
+    offsets = [offset for (offset,) in BINARY_PREFIX_INDEX_ENTRY.iter_unpack(bytes(data[index_offset:counts_offset]))]
+    encoded = bytes(data[counts_offset:])
+    terminators = [position for position, byte in enumerate(encoded) if byte < 0x80]
+    if len(terminators) != record_count or (terminators[-1] if terminators else -1) != len(encoded) - 1:
+        return False
+    expected_offsets = [terminators[record - 1] + 1 if record else 0 for record in range(0, record_count, index_stride)]
+    if offsets != expected_offsets:
+        return False
+
+    suffixes = bytes(data[BINARY_PREFIX_HEADER.size : index_offset]).hex()
+    return all(
+        suffixes[index * suffix_length : (index + 1) * suffix_length]
+        < suffixes[(index + 1) * suffix_length : (index + 2) * suffix_length]
+        for index in range(record_count - 1)
+    )
+
+
+def _binary_prefix_layout(data: bytes | bytearray) -> tuple[int, int, int, str, int, int] | None:
+    """Return (suffix_length, index_stride, record_count, content_checksum, index_offset, counts_offset), or None."""
+    if len(data) < BINARY_PREFIX_HEADER.size:
+        return None
+    magic, version, suffix_length, index_stride, record_count, checksum = BINARY_PREFIX_HEADER.unpack_from(data)
+    if magic != BINARY_PREFIX_MAGIC or version != BINARY_PREFIX_VERSION or not index_stride:
+        return None
+    if record_count and not suffix_length:
+        return None
+
+    index_offset = BINARY_PREFIX_HEADER.size + (record_count * suffix_length + 1) // 2
+    counts_offset = index_offset + -(-record_count // index_stride) * BINARY_PREFIX_INDEX_ENTRY.size
+    if len(data) < counts_offset + record_count:
+        return None
+    return suffix_length, index_stride, record_count, checksum.hex(), index_offset, counts_offset
+
+
+def _varints_decode(data: bytes, offset: int, count: int) -> list[int]:
+    values = []
+    value = shift = 0
+    for byte in memoryview(data)[offset:]:
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            values.append(value)
+            if len(values) == count:
+                break
+            value = shift = 0
+        else:
+            shift += 7
+    return values
@@ -0,0 +1,147 @@
+import asyncio
+import multiprocessing
+import time
+
+from hibp_downloader import LOGGER_NAME
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.logger import logger_get
+
+logger = logger_get(name=LOGGER_NAME)
+
+CIRCUIT_CLOSED = 0
+CIRCUIT_OPEN = 1
+CIRCUIT_HALF_OPEN = 2
+CIRCUIT_ABORTED = 3
+
+# positions in the shared state array
+_STATE, _WINDOW_START, _WINDOW_TOTAL, _WINDOW_FAILURES, _OPENED_AT, _OUTAGE_START, _PROBE_FAILURES, _PROBE = range(8)
+
+
+class SharedCircuitBreaker:
+    """Circuit breaker shared by all worker processes, so that an upstream outage pauses every worker together.
+
+    Request outcomes (transport errors and 5xx responses are failures) are counted in a time window across all
+    processes.  When at least `failure_ratio` of at least `minimum_requests` requests in the window fail, the circuit
+    opens and no new request attempt is sent.  After a cooldown, which doubles with every failed probe up to
+    `cooldown_max`, a single request across all processes is let through as a probe; its success closes the circuit
+    and every waiting request resumes.  The probe is numbered when `acquire` lets it through, and while the circuit is
+    half-open only the outcome recorded with that number counts, not that of a request sent before the circuit
+    opened.  An outage that lasts longer than `outage_deadline` seconds (0 for no deadline) aborts the circuit for
+    good; waiting and later requests then fail at once.
+
+    The state is held in shared memory and passed to the worker processes once as a process argument.
+    """
+
+    def __init__(
+        self,
+        failure_ratio: float = 0.5,
+        minimum_requests: int = 20,
+        window: float = 10.0,
+        cooldown: float = 5.0,
+        cooldown_max: float = 60.0,
+        probe_timeout: float = 60.0,
+        outage_deadline: float = 0,
+    ):
+        self.failure_ratio = failure_ratio
+        self.minimum_requests = minimum_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.cooldown_max = cooldown_max
+        self.probe_timeout = probe_timeout
+        self.outage_deadline = outage_deadline
+        self._state = multiprocessing.Array("d", [CIRCUIT_CLOSED, time.monotonic(), 0, 0, 0, 0, 0, 0])
+
+    @property
+    def state(self) -> int:
+        return int(self._state[_STATE])
+
+    @property
+    def aborted(self) -> bool:
+        return self.state == CIRCUIT_ABORTED
+
+    def record(self, available: bool, probe: int = 0) -> None:
+        """Record the outcome of one request attempt; `available` is False for a transport error or 5xx response, and
+        `probe` is the number `acquire` returned for the attempt."""
+        with self._state.get_lock():
+            now = time.monotonic()
+            state = self._state[_STATE]
+
+            if state == CIRCUIT_HALF_OPEN:
+                if not probe or probe != self._state[_PROBE]:
+                    return  # outcome of a request other than the probe, eg one sent before the circuit opened
+                if available:
+                    outage = now - self._state[_OUTAGE_START]
+                    self._close(now)
+                    logger.warning(f"Upstream recovered after {outage:.0f}s; resuming requests from all workers")
+                else:
+                    self._state[_PROBE_FAILURES] += 1
+                    self._state[_STATE] = CIRCUIT_OPEN
+                    self._state[_OPENED_AT] = now
+                return
+
+            if state != CIRCUIT_CLOSED:
+                return  # outcome of a request that was sent before the circuit opened
+
+            if now - self._state[_WINDOW_START] > self.window:
+                self._state[_WINDOW_START] = now
+                self._state[_WINDOW_TOTAL] = 0
+                self._state[_WINDOW_FAILURES] = 0
+            self._state[_WINDOW_TOTAL] += 1
+            if not available:
+                self._state[_WINDOW_FAILURES] += 1
+
+            total, failures = self._state[_WINDOW_TOTAL], self._state[_WINDOW_FAILURES]
+            if total >= self.minimum_requests and failures >= total * self.failure_ratio:
+                self._state[_STATE] = CIRCUIT_OPEN
+                self._state[_OPENED_AT] = now
+                self._state[_OUTAGE_START] = now
+                self._state[_PROBE_FAILURES] = 0
+                logger.warning(
+                    f"Upstream failing ({int(failures)} of {int(total)} recent requests failed); "
+                    "pausing requests from all workers"
+                )
+
+    async def acquire(self) -> int:
+        """Wait until a request attempt may be sent; return the probe number when the attempt is the probe, otherwise
+        0, to be passed to `record` with its outcome.  Raises HibpDownloaderException once the circuit is aborted."""
+        while True:
+            delay, probe = self._acquire()
+            if delay <= 0:
+                return probe
+            await asyncio.sleep(delay)
+
+    def _acquire(self) -> tuple[float, int]:
+        with self._state.get_lock():
+            now = time.monotonic()
+            state = self._state[_STATE]
+            if state == CIRCUIT_CLOSED:
+                return 0, 0
+
+            outage = now - self._state[_OUTAGE_START]
+            if state != CIRCUIT_ABORTED and self.outage_deadline and outage > self.outage_deadline:
+                self._state[_STATE] = state = CIRCUIT_ABORTED
+                logger.error(f"Upstream unavailable for more than {self.outage_deadline:g}s; aborting requests")
+            if state == CIRCUIT_ABORTED:
+                raise HibpDownloaderException()  # without a message, so it is not logged for every request
+
+            if state == CIRCUIT_OPEN:
+                cooldown = min(self.cooldown * 2 ** self._state[_PROBE_FAILURES], self.cooldown_max)
+                wait = self._state[_OPENED_AT] + cooldown - now
+            else:
+                # a probe is in flight; a probe that never reports (eg its process was killed) is replaced
+                wait = self._state[_OPENED_AT] + self.probe_timeout - now
+            if wait > 0:
+                return min(wait, 1.0), 0
+
+            self._state[_STATE] = CIRCUIT_HALF_OPEN
+            self._state[_OPENED_AT] = now
+            self._state[_PROBE] += 1
+            logger.debug("Sending a probe request to the upstream")
+            return 0, int(self._state[_PROBE])
+
+    def _close(self, now: float) -> None:
+        self._state[_STATE] = CIRCUIT_CLOSED
+        self._state[_WINDOW_START] = now
+        self._state[_WINDOW_TOTAL] = 0
+        self._state[_WINDOW_FAILURES] = 0
+        self._state[_PROBE_FAILURES] = 0
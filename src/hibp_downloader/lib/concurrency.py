@@ -0,0 +1,217 @@
+import asyncio
+import random
+import time
+from collections import deque
+
+from hibp_downloader import LOGGER_NAME
+from hibp_downloader.lib.circuit_breaker import SharedCircuitBreaker
+from hibp_downloader.lib.logger import logger_get
+
+logger = logger_get(name=LOGGER_NAME)
+
+ERROR_RATE_SMOOTHING = 0.1  # weight of each request outcome in the smoothed error rate
+
+
+class AdaptiveConcurrencyLimit:
+    """Additive-increase / multiplicative-decrease (AIMD) limit on the number of in-flight requests.
+
+    The limit grows by one for every full window of successful requests while the smoothed latency stays close to
+    the best latency observed and the smoothed error rate (of timeouts, transport errors and 5xx responses) is at
+    most `error_rate_threshold`, and holds otherwise.  It is cut multiplicatively, at most once per latency period,
+    when a request is throttled (429 or Retry-After) or when an error takes the error rate above the threshold; so
+    an isolated error only holds the limit, while errors in close succession cut it.
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int = 1,
+        maximum: int = 64,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 1.5,
+        error_rate_threshold: float = 0.1,
+        name: str = "",
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = min(max(initial, self.minimum), self.maximum)
+        self.in_flight = 0
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.name = name
+
+        self.latency_ewma: float | None = None
+        self.latency_baseline: float | None = None
+        self.error_rate = 0.0
+        self._window_successes = 0
+        self._last_decrease = 0.0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    async def acquire(self) -> None:
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._wake_waiters()
+
+    def record_success(self, latency: float) -> None:
+        self.error_rate -= ERROR_RATE_SMOOTHING * self.error_rate
+        if self.latency_ewma is None or self.latency_baseline is None:
+            self.latency_ewma = latency
+            self.latency_baseline = latency
+        else:
+            self.latency_ewma += 0.2 * (latency - self.latency_ewma)
+            self.latency_baseline = min(self.latency_ewma, self.latency_baseline)
+
+        self._window_successes += 1
+        if self._window_successes < self.limit:
+            return
+        self._window_successes = 0
+
+        # baseline follows the best latency, drifting slowly upward so a permanent network change is accepted
+        self.latency_baseline *= 1.01
+
+        if (
+            self.limit < self.maximum
+            and self.latency_ewma <= self.latency_baseline * self.latency_tolerance
+            and self.error_rate <= self.error_rate_threshold
+        ):
+            self.limit += 1
+            logger.debug(f"{self.name} in-flight limit increased to {self.limit}")
+            self._wake_waiters()
+
+    def record_error(self) -> None:
+        """Record a request that failed with a timeout, transport error or 5xx response."""
+        self.error_rate += ERROR_RATE_SMOOTHING * (1.0 - self.error_rate)
+        self._window_successes = 0
+        if self.error_rate > self.error_rate_threshold:
+            self._decrease()
+
+    def record_backoff(self) -> None:
+        """Record a throttled request (429 or Retry-After); the limit is cut whatever the error rate."""
+        self._window_successes = 0
+        self._decrease()
+
+    def _decrease(self) -> None:
+        # several in-flight requests typically fail together; decrease only once per latency period
+        now = time.monotonic()
+        if now - self._last_decrease < max(self.latency_ewma or 0, 1.0):
+            return
+        self._last_decrease = now
+
+        limit = max(self.minimum, int(self.limit * self.decrease_factor))
+        if limit < self.limit:
+            self.limit = limit
+            logger.debug(f"{self.name} in-flight limit decreased to {self.limit}")
+
+    def _wake_waiters(self) -> None:
+        available = self.limit - self.in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+
+class RetryBackoff:
+    """Retry delays for the requests of one worker, with a worker-wide pause on throttling.
+
+    Each retry waits an exponential backoff with full jitter (a uniform random delay up to `base * 2**(attempt-1)`,
+    capped at `maximum`) so that requests that failed together do not retry together.  A throttling signal (a 429, or
+    a `Retry-After`) pauses every request of the worker, not only the one that was throttled; requests resume spread
+    over one `base` period after the pause ends.  Failures are also reported to the worker's concurrency limit, and
+    request outcomes to the circuit breaker shared by all workers, which holds back every attempt while it is open.
+    """
+
+    def __init__(
+        self,
+        base: float = 0.5,
+        maximum: float = 30.0,
+        concurrency_limit: AdaptiveConcurrencyLimit | None = None,
+        circuit_breaker: SharedCircuitBreaker | None = None,
+        name: str = "",
+    ):
+        self.base = base
+        self.maximum = maximum
+        self.concurrency_limit = concurrency_limit
+        self.circuit_breaker = circuit_breaker
+        self.name = name
+        self.resume_at = 0.0
+
+    def delay(self, attempt: int, retry_after: float | None = None) -> float:
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base)
+        return random.uniform(0, min(self.maximum, self.base * 2 ** (max(1, attempt) - 1)))
+
+    def record_failure(self) -> None:
+        if self.concurrency_limit:
+            self.concurrency_limit.record_error()
+
+    def record_result(self, available: bool, probe: int = 0) -> None:
+        if self.circuit_breaker:
+            self.circuit_breaker.record(available, probe=probe)
+
+    def pause(self, delay: float) -> None:
+        resume_at = time.monotonic() + delay
+        if resume_at > self.resume_at:
+            self.resume_at = resume_at
+            logger.debug(f"{self.name} requests paused for {delay:.1f}s")
+        if self.concurrency_limit:
+            self.concurrency_limit.record_backoff()
+
+    async def wait(self) -> int:
+        """Wait until a request attempt may be sent; return its circuit breaker probe number for `record_result`."""
+        probe = await self.circuit_breaker.acquire() if self.circuit_breaker else 0
+        if self.resume_at <= time.monotonic():
+            return probe
+        while (remaining := self.resume_at - time.monotonic()) > 0:
+            await asyncio.sleep(remaining)
+        await asyncio.sleep(random.uniform(0, self.base))
+        return probe
+
+
+class EventLoopLagMonitor:
+    """Measures event-loop lag: how much later than scheduled a periodic timer actually runs.
+
+    Lag is time during which no other coroutine could run, eg because CPU-bound work ran on the event loop thread;
+    with many requests in-flight it directly delays socket reads.  Samples are summarised until `take` is called.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.lag_max = 0.0
+        self.lag_sum = 0.0
+        self.lag_count = 0
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def take(self) -> tuple[float, float, int]:
+        """Return and reset the (max, sum, count) of the lag samples taken since the previous call."""
+        summary = (self.lag_max, self.lag_sum, self.lag_count)
+        self.lag_max, self.lag_sum, self.lag_count = 0.0, 0.0, 0
+        return summary
+
+    async def _run(self) -> None:
+        while True:
+            scheduled = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - scheduled)
+            self.lag_max = max(self.lag_max, lag)
+            self.lag_sum += lag
+            self.lag_count += 1
@@ -0,0 +1,660 @@
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import urllib.parse
+from abc import ABC, abstractmethod
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
+
+from hibp_downloader import ENCODING_TYPE, LOGGER_NAME
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.binary_prefix import BINARY_PREFIX_ENCODING_TYPE
+from hibp_downloader.lib.filedata import (
+    DatafileDirectoryIndex,
+    DatastoreItem,
+    encoding_type_file_suffix,
+    generate_filepath,
+)
+from hibp_downloader.lib.logger import logger_get
+from hibp_downloader.models import DataFormat, StorageBackend
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, where pack stores are not locked against a concurrent compact
+    fcntl = None  # type: ignore[assignment]
+
+logger = logger_get(name=LOGGER_NAME)
+
+PACK_DIRNAME = "pack"
+PACK_INDEX_FILENAME = "index"
+PACK_LOCK_FILENAME = "lock"
+PACK_FILE_MAX_SIZE = 256 * 1024 * 1024
+PACK_PREFIX_SPACE = 16**5
+PACK_INDEX_ENTRY = struct.Struct("<IIQ")  # pack number (0 for none), content length, content offset
+PACK_RECORD_HEADER = struct.Struct("<4s5s3xI")  # magic, prefix, content length; precedes the content in a pack
+PACK_RECORD_MAGIC = b"HPK1"
+S3_DATASTORE_THREADS = 16
+S3_NOT_FOUND_ERROR_CODES = ("404", "NoSuchKey")
+
+
+class PackCompactStats(NamedTuple):
+    prefix_count: int
+    pack_count_before: int
+    bytes_before: int
+    pack_count_after: int
+    bytes_after: int
+
+
+class Datastore(ABC):
+    """Storage of the data file content of each prefix of one hash type; downloads write, and the query, generate and
+    validate commands read, through this interface regardless of the storage backend (see `datastore_open`).
+
+    The content is stored as received, eg gzip; a datastore is used by one thread at a time.  A storage backend is a
+    subclass implementing the abstract methods, with a StorageBackend value that `datastore_open` maps to it.
+    """
+
+    def __init__(self, hash_type: str, encoding_type: str = ENCODING_TYPE):
+        self.hash_type = hash_type.lower()
+        self.datafile_suffix = encoding_type_file_suffix(encoding_type)
+
+    def __enter__(self) -> "Self":
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    @abstractmethod
+    def location(self, prefix: str) -> str:
+        """Describe where the content of the prefix is (or would be) stored, eg for log messages."""
+
+    @abstractmethod
+    def exists(self, prefix: str) -> bool:
+        """Return whether content of the prefix is stored."""
+
+    @abstractmethod
+    def read(self, prefix: str) -> bytes:
+        """Return the content of the prefix; raises HibpDownloaderException when it is not stored."""
+
+    @abstractmethod
+    def delete(self, prefix: str) -> bool:
+        """Remove the content of the prefix; return False when it was not stored."""
+
+    @abstractmethod
+    def temp_filepath(self, prefix: str) -> Path:
+        """Return the path of a temporary file to receive the content of the prefix, for a DatastoreItem `filepath`."""
+
+    @abstractmethod
+    def write_many(self, items: list[DatastoreItem], sync: bool = False) -> dict[int, Exception]:
+        """Store the content of each item, replacing earlier content; return the errors by item index.
+
+        Content is never partly replaced; with `sync` all successful writes are on disk once this returns.  The
+        temporary file of each item with a `filepath` is removed, whether or not its write succeeds.  Storage errors
+        (eg OSError, or an object store client error) are returned; any other exception propagates.
+        """
+
+    def discard_temp_files(self, items: list[DatastoreItem]) -> None:
+        """Remove the temporary files of items that are not to be written."""
+        for item in items:
+            if item.filepath:
+                try:
+                    os.unlink(item.filepath)
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        pass
+
+
+class FilesDatastore(Datastore):
+    """One data file per prefix, at `<data-path>/<hash-type>/xx/yy/<prefix>.gz` (see `generate_filepath`).
+
+    Each file is written to a temporary file beside it and moved into place (atomically, by `os.replace`), with its
+    modification time set to the content Last-Modified time; the directories already created are remembered, so each
+    `xx/yy` directory costs one `makedirs`.  Existence is answered from one listing per directory (see
+    DatafileDirectoryIndex), so checking prefixes in order costs far less than a stat per prefix.
+    """
+
+    def __init__(self, data_path: Path | str, hash_type: str, encoding_type: str = ENCODING_TYPE):
+        super().__init__(hash_type, encoding_type)
+        self.data_path = Path(os.path.expanduser(data_path))
+        self._index = DatafileDirectoryIndex(self.data_path, self.hash_type, self.datafile_suffix)
+        self._directories: set[Path] = set()
+
+    def filepath(self, prefix: str) -> Path:
+        return generate_filepath(self.data_path, self.hash_type, prefix, self.datafile_suffix)
+
+    def location(self, prefix: str) -> str:
+        return str(self.filepath(prefix))
+
+    def temp_filepath(self, prefix: str) -> Path:
+        filepath = self.filepath(prefix)
+        return filepath.with_name(f"{filepath.name}.{os.getpid()}.tmp")
+
+    def exists(self, prefix: str) -> bool:
+        return self._index.exists(prefix)
+
+    def read(self, prefix: str) -> bytes:
+        filepath = self.filepath(prefix)
+        try:
+            with open(filepath, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise HibpDownloaderException(f"File not found {filepath}") from None
+        except OSError as e:
+            raise HibpDownloaderException(f"Failed to read bytes file: {e}") from e
+
+    def delete(self, prefix: str) -> bool:
+        self._index.directory_key = ""
+        try:
+            self.filepath(prefix).unlink()
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            raise HibpDownloaderException(f"Failed to delete data file for prefix {prefix}: {e}") from e
+        return True
+
+    def write_many(self, items: list[DatastoreItem], sync: bool = False) -> dict[int, Exception]:
+        # with sync, the content of each file is synced before it is moved into place, and each directory once after
+        self._index.directory_key = ""
+
+        errors: dict[int, Exception] = {}
+        for index, item in enumerate(items):
+            filepath = self.filepath(item.prefix)
+            try:
+                if filepath.parent not in self._directories:
+                    os.makedirs(filepath.parent, exist_ok=True)
+                    self._directories.add(filepath.parent)
+                if item.filepath:
+                    if sync:
+                        with open(item.filepath, mode="r+b") as f:
+                            sync_file_data(f.fileno())
+                    continue
+                with open(self.temp_filepath(item.prefix), mode="wb") as f:
+                    f.write(item.content)
+                    if sync:
+                        f.flush()
+                        sync_file_data(f.fileno())
+            except OSError as e:
+                errors[index] = e
+
+        for index, item in enumerate(items):
+            if index in errors:
+                continue
+            temp_filepath = item.filepath or self.temp_filepath(item.prefix)
+            try:
+                if item.timestamp:
+                    timestamp = item.timestamp.timestamp()
+                    os.utime(temp_filepath, times=(timestamp, timestamp))
+                os.replace(temp_filepath, self.filepath(item.prefix))
+            except OSError as e:
+                errors[index] = e
+
+        for index, item in enumerate(items):
+            if index in errors:
+                try:
+                    os.unlink(item.filepath or self.temp_filepath(item.prefix))
+                except OSError:
+                    pass
+
+        if sync:
+            try:
+                sync_directories(
+                    {self.filepath(item.prefix).parent for index, item in enumerate(items) if index not in errors}
+                )
+            except OSError as e:
+                for index in range(len(items)):
+                    errors.setdefault(index, e)
+
+        return errors
+
+
+class PackDatastore(Datastore):
+    """The content of every prefix in a few hundred append-only pack files, with an index of (pack, offset, length).
+
+    The store is held in `<data-path>/<hash-type>/pack/`: an `index` file with one PACK_INDEX_ENTRY for every prefix
+    of the prefix space (16 MiB), and `NNNNNN.pack` files holding records of a PACK_RECORD_HEADER, which names the
+    prefix, followed by the content.  The index and the packs are read through mmap, so reading a prefix costs no
+    system call, and a full-store scan or copy touches a few hundred files rather than a million.
+
+    Each writer (one per worker process) appends to pack files of its own, started on its first write and rotated at
+    PACK_FILE_MAX_SIZE, and then updates the index entries in place through the shared mapping; a prefix is written
+    by one process at a time, so entries never conflict.  Replaced and deleted content stays in its pack until
+    `compact`, which writers exclude by holding a shared lock on the store.  Content timestamps are not kept (the
+    metadata store has the Last-Modified time).
+    """
+
+    def __init__(self, data_path: Path | str, hash_type: str, encoding_type: str = ENCODING_TYPE):
+        super().__init__(hash_type, encoding_type)
+        self.data_path = Path(os.path.expanduser(data_path))
+        self.path = self.data_path / self.hash_type / PACK_DIRNAME
+        self._index: mmap.mmap | None = None
+        self._index_writable = False
+        self._packs: dict[int, mmap.mmap] = {}
+        self._pack_file: BinaryIO | None = None
+        self._pack_number = 0
+        self._lock_file: BinaryIO | None = None
+
+    def pack_filepath(self, number: int) -> Path:
+        return self.path / f"{number:06d}.pack"
+
+    def pack_numbers(self) -> list[int]:
+        try:
+            filenames = os.listdir(self.path)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            int(filename[:-5]) for filename in filenames if filename.endswith(".pack") and filename[:-5].isdigit()
+        )
+
+    def location(self, prefix: str) -> str:
+        entry = self._entry(prefix)
+        if not entry:
+            return str(self.path)
+        number, _, offset = entry
+        return f"{self.pack_filepath(number)}@{offset}"
+
+    def exists(self, prefix: str) -> bool:
+        return self._entry(prefix) is not None
+
+    def temp_filepath(self, prefix: str) -> Path:
+        return self.path / f"{prefix.lower()}.{os.getpid()}.tmp"
+
+    def read(self, prefix: str) -> bytes:
+        entry = self._entry(prefix)
+        if not entry:
+            raise HibpDownloaderException(f"Prefix {prefix} not found in pack store {str(self.path)!r}")
+        number, length, offset = entry
+        pack = self._pack_map(number, offset + length)
+
+        header_offset = offset - PACK_RECORD_HEADER.size
+        if header_offset < 0 or PACK_RECORD_HEADER.unpack_from(pack, header_offset) != (
+            PACK_RECORD_MAGIC,
+            prefix.lower().encode("ascii"),
+            length,
+        ):
+            raise HibpDownloaderException(f"Pack record for prefix {prefix} not found at {self.location(prefix)}")
+        return pack[offset : offset + length]
+
+    def delete(self, prefix: str) -> bool:
+        if not self.exists(prefix):
+            return False
+        PACK_INDEX_ENTRY.pack_into(self._index_map_writable(), int(prefix, 16) * PACK_INDEX_ENTRY.size, 0, 0, 0)
+        return True
+
+    def write_many(self, items: list[DatastoreItem], sync: bool = False) -> dict[int, Exception]:
+        try:
+            return self._write_many(items, sync)
+        finally:
+            self.discard_temp_files(items)
+
+    def _write_many(self, items: list[DatastoreItem], sync: bool) -> dict[int, Exception]:
+        try:
+            index_map = self._index_map_writable()
+            self._lock(exclusive=False)
+        except (OSError, HibpDownloaderException) as e:
+            return dict.fromkeys(range(len(items)), e)
+
+        errors: dict[int, Exception] = {}
+        entries: dict[int, tuple[int, int, int]] = {}
+        for index, item in enumerate(items):
+            try:
+                if item.filepath:
+                    with open(item.filepath, "rb") as f:
+                        entries[index] = self._append(item.prefix, f, os.fstat(f.fileno()).st_size)
+                else:
+                    entries[index] = self._append(item.prefix, item.content)
+            except OSError as e:
+                errors[index] = e
+
+        # the index entries are only updated once the content is in the pack file (and on disk, with sync)
+        try:
+            if self._pack_file:
+                self._pack_file.flush()
+                if sync:
+                    os.fsync(self._pack_file.fileno())
+        except OSError as e:
+            return {index: errors.get(index, e) for index in range(len(items))}
+
+        for index, entry in entries.items():
+            PACK_INDEX_ENTRY.pack_into(index_map, int(items[index].prefix, 16) * PACK_INDEX_ENTRY.size, *entry)
+        if sync:
+            try:
+                index_map.flush()
+            except OSError as e:
+                for index in range(len(items)):
+                    errors.setdefault(index, e)
+        return errors
+
+    def compact(self) -> PackCompactStats:
+        """Rewrite the current content of every prefix, in prefix order, into new pack files and remove the old ones.
+
+        Raises HibpDownloaderException when a download (or another compact) is writing to the store.  A compact that
+        is interrupted leaves the store as it was, apart from new pack files that the next compact removes.
+        """
+        self._lock(exclusive=True)
+        index_map = self._index_map_writable()
+        pack_numbers = self.pack_numbers()
+        bytes_before = sum(os.path.getsize(self.pack_filepath(number)) for number in pack_numbers)
+
+        compact_index = bytearray(len(index_map))
+        prefix_count = 0
+        for prefix_value in range(PACK_PREFIX_SPACE):
+            if not PACK_INDEX_ENTRY.unpack_from(index_map, prefix_value * PACK_INDEX_ENTRY.size)[0]:
+                continue
+            prefix = f"{prefix_value:05x}"
+            try:
+                content = self.read(prefix)
+            except HibpDownloaderException:
+                logger.warning(f"Prefix {prefix}: Pack record is missing or damaged; dropped from the pack store")
+                continue
+            entry = self._append(prefix, content)
+            PACK_INDEX_ENTRY.pack_into(compact_index, prefix_value * PACK_INDEX_ENTRY.size, *entry)
+            prefix_count += 1
+        self._pack_close(sync=True)
+
+        index_filepath = self.path / PACK_INDEX_FILENAME
+        temp_filepath = index_filepath.with_name(f"{PACK_INDEX_FILENAME}.{os.getpid()}.tmp")
+        with open(temp_filepath, "wb") as f:
+            f.write(compact_index)
+            os.fsync(f.fileno())
+        self._maps_close()
+        os.replace(temp_filepath, index_filepath)
+        sync_directories([self.path])
+
+        for number in pack_numbers:
+            self.pack_filepath(number).unlink()
+        compact_numbers = self.pack_numbers()
+        return PackCompactStats(
+            prefix_count=prefix_count,
+            pack_count_before=len(pack_numbers),
+            bytes_before=bytes_before,
+            pack_count_after=len(compact_numbers),
+            bytes_after=sum(os.path.getsize(self.pack_filepath(number)) for number in compact_numbers),
+        )
+
+    def close(self) -> None:
+        self._pack_close()
+        self._maps_close()
+        if self._lock_file:
+            self._lock_file.close()  # releases the lock
+            self._lock_file = None
+
+    def _entry(self, prefix: str) -> tuple[int, int, int] | None:
+        index_map = self._index_map()
+        if index_map is None:
+            return None
+        entry = PACK_INDEX_ENTRY.unpack_from(index_map, int(prefix, 16) * PACK_INDEX_ENTRY.size)
+        return entry if entry[0] else None
+
+    def _index_map_writable(self) -> mmap.mmap:
+        index_map = self._index_map(write=True)
+        if index_map is None:
+            raise HibpDownloaderException(f"Failed to open pack store index in {str(self.path)!r}")
+        return index_map
+
+    def _index_map(self, write: bool = False) -> mmap.mmap | None:
+        if self._index is not None and (self._index_writable or not write):
+            return self._index
+
+        index_filepath = self.path / PACK_INDEX_FILENAME
+        index_size = PACK_PREFIX_SPACE * PACK_INDEX_ENTRY.size
+        try:
+            if write:
+                os.makedirs(self.path, exist_ok=True)
+                with open(index_filepath, "ab") as f:
+                    if os.path.getsize(index_filepath) < index_size:
+                        f.truncate(index_size)  # sparse; entries are zero (no content) until written
+            with open(index_filepath, "r+b" if write else "rb") as f:
+                if os.fstat(f.fileno()).st_size != index_size:
+                    raise HibpDownloaderException(f"Invalid pack store index {str(index_filepath)!r}")
+                index_map = mmap.mmap(f.fileno(), index_size, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            raise HibpDownloaderException(f"Failed to open pack store index {str(index_filepath)!r}: {e}") from e
+
+        if self._index is not None:
+            self._index.close()
+        self._index, self._index_writable = index_map, write
+        return index_map
+
+    def _pack_map(self, number: int, end: int) -> mmap.mmap:
+        pack = self._packs.get(number)
+        if pack is None or len(pack) < end:  # packs that are still being written are mapped again as they grow
+            filepath = self.pack_filepath(number)
+            try:
+                with open(filepath, "rb") as f:
+                    size = os.fstat(f.fileno()).st_size
+                    if size < end:
+                        raise HibpDownloaderException(f"Pack file {str(filepath)!r} is truncated")
+                    pack = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+            except OSError as e:
+                raise HibpDownloaderException(f"Failed to read pack file {str(filepath)!r}: {e}") from e
+            if number in self._packs:
+                self._packs[number].close()
+            self._packs[number] = pack
+        return pack
+
+    def _append(self, prefix: str, content: bytes | bytearray | BinaryIO, length: int = 0) -> tuple[int, int, int]:
+        """Append a record to the current pack file, starting a new one as needed; return its index entry.
+
+        The content is bytes, or a file of `length` bytes that is copied in chunks.
+        """
+        if isinstance(content, (bytes, bytearray)):
+            length = len(content)
+        if self._pack_file and self._pack_file.tell() + PACK_RECORD_HEADER.size + length > PACK_FILE_MAX_SIZE:
+            self._pack_close()
+        if self._pack_file is None:
+            self._pack_number = max(self.pack_numbers(), default=0) + 1
+            while True:
+                try:
+                    self._pack_file = open(self.pack_filepath(self._pack_number), "xb")  # noqa: SIM115
+                    break
+                except FileExistsError:
+                    self._pack_number += 1  # started by another writer
+
+        offset = self._pack_file.tell() + PACK_RECORD_HEADER.size
+        self._pack_file.write(PACK_RECORD_HEADER.pack(PACK_RECORD_MAGIC, prefix.lower().encode("ascii"), length))
+        if isinstance(content, (bytes, bytearray)):
+            self._pack_file.write(content)
+        else:
+            shutil.copyfileobj(content, self._pack_file)
+        if self._pack_file.tell() != offset + length:
+            raise OSError(f"Pack record for prefix {prefix} is {self._pack_file.tell() - offset} bytes, not {length}")
+        return self._pack_number, length, offset
+
+    def _pack_close(self, sync: bool = False) -> None:
+        if self._pack_file:
+            pack_file, self._pack_file = self._pack_file, None
+            pack_file.flush()
+            if sync:
+                os.fsync(pack_file.fileno())
+            pack_file.close()
+
+    def _maps_close(self) -> None:
+        for pack in self._packs.values():
+            pack.close()
+        self._packs = {}
+        if self._index is not None:
+            self._index.close()
+            self._index, self._index_writable = None, False
+
+    def _lock(self, exclusive: bool) -> None:
+        if fcntl is None or (self._lock_file and not exclusive):
+            return
+        os.makedirs(self.path, exist_ok=True)
+        if self._lock_file is None:
+            self._lock_file = open(self.path / PACK_LOCK_FILENAME, "ab")  # noqa: SIM115
+        try:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB if exclusive else fcntl.LOCK_SH)
+        except BlockingIOError:
+            raise HibpDownloaderException(
+                f"Pack store {str(self.path)!r} is in use, eg by a download; try again once it has finished"
+            ) from None
+
+
+class S3Datastore(Datastore):
+    """One object per prefix in an S3-compatible object store, keyed as the `files` layout under the `url` path, ie
+    `s3://<bucket>/<path>/<hash-type>/xx/yy/<prefix>.gz`, so a store can be copied to or from a data path as it is.
+
+    The endpoint (eg MinIO), region and credentials are those of boto3, ie the AWS_* environment variables or the
+    AWS config files.  An object is replaced as a whole by its PUT and is durable once the PUT has succeeded, so
+    `sync` needs no further work; the items of a `write_many` are put concurrently on S3_DATASTORE_THREADS threads.
+    Existence is answered from one listing per `<hash-type>/xx/` key prefix (4096 objects, a few list requests), so
+    checking prefixes in order costs far less than a request per prefix.  Content timestamps are kept as the
+    `last-modified` object metadata.  The boto3 package is an optional dependency, `hibp-downloader[s3]`.
+    """
+
+    def __init__(self, url: str, hash_type: str, encoding_type: str = ENCODING_TYPE):
+        super().__init__(hash_type, encoding_type)
+        try:
+            import boto3  # type: ignore[import-untyped]
+            import botocore.config  # type: ignore[import-untyped]
+            import botocore.exceptions  # type: ignore[import-untyped]
+        except ImportError:
+            raise HibpDownloaderException(
+                "The s3 storage backend requires the boto3 package; install it with: pip install hibp-downloader[s3]"
+            ) from None
+
+        url_parts = urllib.parse.urlsplit(url)
+        if url_parts.scheme != "s3" or not url_parts.netloc:
+            raise HibpDownloaderException(f"Invalid storage url {url!r}, expected s3://<bucket>/<path>")
+        self.url = url
+        self.bucket = url_parts.netloc
+        self.key_prefix = url_parts.path.strip("/")
+
+        config = botocore.config.Config(
+            max_pool_connections=S3_DATASTORE_THREADS, retries={"mode": "standard", "max_attempts": 5}
+        )
+        self._client: Any = boto3.client("s3", config=config)
+        self._client_error = botocore.exceptions.ClientError
+        self._client_errors = (botocore.exceptions.BotoCoreError, botocore.exceptions.ClientError)
+        self._executor: ThreadPoolExecutor | None = None
+        self._listing_key = ""
+        self._listing: set[str] = set()
+
+    def key(self, prefix: str) -> str:
+        prefix = prefix.lower()
+        key = f"{self.hash_type}/{prefix[0:2]}/{prefix[2:4]}/{prefix}.{self.datafile_suffix}"
+        return f"{self.key_prefix}/{key}" if self.key_prefix else key
+
+    def location(self, prefix: str) -> str:
+        return f"s3://{self.bucket}/{self.key(prefix)}"
+
+    def temp_filepath(self, prefix: str) -> Path:
+        return Path(tempfile.gettempdir()) / "hibp-downloader" / f"{self.hash_type}-{prefix.lower()}.{os.getpid()}.tmp"
+
+    def exists(self, prefix: str) -> bool:
+        key = self.key(prefix)
+        listing_key = key.rsplit("/", 2)[0] + "/"
+        if listing_key != self._listing_key:
+            self._listing = set()
+            try:
+                for page in self._client.get_paginator("list_objects_v2").paginate(
+                    Bucket=self.bucket, Prefix=listing_key
+                ):
+                    self._listing.update(item["Key"] for item in page.get("Contents", []))
+            except self._client_errors as e:
+                self._listing_key = ""
+                raise HibpDownloaderException(f"Failed to list objects s3://{self.bucket}/{listing_key}: {e}") from e
+            self._listing_key = listing_key
+        return key in self._listing
+
+    def read(self, prefix: str) -> bytes:
+        try:
+            return self._client.get_object(Bucket=self.bucket, Key=self.key(prefix))["Body"].read()
+        except self._client_errors as e:
+            if (
+                isinstance(e, self._client_error)
+                and e.response.get("Error", {}).get("Code") in S3_NOT_FOUND_ERROR_CODES
+            ):
+                raise HibpDownloaderException(f"Object not found {self.location(prefix)}") from None
+            raise HibpDownloaderException(f"Failed to read object {self.location(prefix)}: {e}") from e
+
+    def delete(self, prefix: str) -> bool:
+        if not self.exists(prefix):
+            return False
+        try:
+            self._client.delete_object(Bucket=self.bucket, Key=self.key(prefix))
+        except self._client_errors as e:
+            raise HibpDownloaderException(f"Failed to delete object {self.location(prefix)}: {e}") from e
+        self._listing.discard(self.key(prefix))
+        return True
+
+    def write_many(self, items: list[DatastoreItem], sync: bool = False) -> dict[int, Exception]:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=S3_DATASTORE_THREADS, thread_name_prefix="s3-datastore")
+
+        errors: dict[int, Exception] = {}
+        futures = [self._executor.submit(self._put, item) for item in items]
+        wait(futures)
+        self.discard_temp_files(items)
+        for index, future in enumerate(futures):
+            try:
+                future.result()
+            except (*self._client_errors, OSError) as e:
+                errors[index] = e
+                continue
+            if self._listing_key and self.key(items[index].prefix).startswith(self._listing_key):
+                self._listing.add(self.key(items[index].prefix))
+        return errors
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        self._client.close()
+
+    def _put(self, item: DatastoreItem) -> None:
+        metadata = {"last-modified": item.timestamp.isoformat()} if item.timestamp else {}
+        if item.filepath:
+            with open(item.filepath, "rb") as f:
+                self._client.put_object(Bucket=self.bucket, Key=self.key(item.prefix), Body=f, Metadata=metadata)
+        else:
+            self._client.put_object(Bucket=self.bucket, Key=self.key(item.prefix), Body=item.content, Metadata=metadata)
+
+
+def sync_file_data(fd: int) -> None:
+    """Sync the content of the file to disk, without its timestamps where the platform has fdatasync(2)."""
+    if hasattr(os, "fdatasync"):
+        os.fdatasync(fd)
+    else:
+        os.fsync(fd)
+
+
+def sync_directories(directories: Iterable[Path]) -> None:
+    """Sync the directory entries, ie the files moved into place; not possible (nor needed) on Windows."""
+    if os.name != "posix":
+        return
+    for directory in directories:
+        fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def datastore_open(
+    storage: StorageBackend,
+    data_path: Path | str,
+    hash_type: str,
+    encoding_type: str = ENCODING_TYPE,
+    storage_url: str = "",
+    data_format: DataFormat = DataFormat.gzip,
+) -> Datastore:
+    """Open the datastore of the storage backend; the `data_path` is used by the files and pack backends, and the
+    `storage_url` by the s3 backend.  Data in the binary `data_format` is held in `.bin` data files (and objects)."""
+    if data_format == DataFormat.binary:
+        encoding_type = BINARY_PREFIX_ENCODING_TYPE
+    if storage == StorageBackend.s3:
+        return S3Datastore(storage_url, hash_type, encoding_type)
+    if storage == StorageBackend.pack:
+        return PackDatastore(data_path, hash_type, encoding_type)
+    return FilesDatastore(data_path, hash_type, encoding_type)
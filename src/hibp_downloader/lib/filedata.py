@@ -1,19 +1,48 @@
+import asyncio
 import gzip
-import json
+import hashlib
 import os
+import queue
+import struct
+import threading
+import time
+import zlib
+from collections.abc import Callable
+from concurrent.futures import Executor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, NamedTuple
 
 import aiofiles
 import aiofiles.os
 
 from hibp_downloader import LOGGER_NAME
 from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.binary_prefix import (
+    BINARY_PREFIX_ENCODING_TYPE,
+    BinaryPrefix,
+    binary_prefix_transcode,
+    binary_prefix_verify,
+    is_binary_prefix,
+)
+from hibp_downloader.lib.hashing import hashed_sha256
 from hibp_downloader.lib.logger import logger_get
-from hibp_downloader.models import PrefixMetadata
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import DataFormat, DurabilityMode, PrefixMetadata
+
+if TYPE_CHECKING:
+    from hibp_downloader.lib.datastore import Datastore
 
 logger = logger_get(name=LOGGER_NAME)
 
+GZIP_VERIFY_MAX_DECODED_SIZE = 64 * 1024  # bounds the memory used to inflate each received chunk during verification
+GZIP_VERIFY_MAX_HEADER_SIZE = 4096
+HIBP_RANGE_LINE_BYTES = b"0123456789ABCDEFabcdef:\r\n"
+HIBP_RANGE_LINE_MAX_SIZE = 256
+DATAFILE_WRITER_QUEUE_SIZE = 64  # data files received and waiting to be written, per writer
+DATAFILE_WRITER_BATCH_SIZE = 32
+DATAFILE_WRITER_BATCH_INTERVAL = 1.0  # seconds a batched durability group waits to fill before it is committed
+
 
 def generate_filepath(
     base_path: Path,
@@ -56,56 +85,352 @@ async def save_bytesfile(filepath: Path, content: bytes, timestamp: datetime | N
         raise HibpDownloaderException(f"Failed to save bytes file: {e}") from e
 
 
-async def save_datafile(
-    data_path: Path,
-    hash_type: str,
-    prefix: str,
-    filename_suffix: str,
-    content: bytes,
-    timestamp: str | datetime | None = None,
-) -> None:
-    if isinstance(timestamp, str):
-        timestamp = datetime.fromisoformat(timestamp)
-
-    await save_bytesfile(
-        filepath=generate_filepath(data_path, hash_type, prefix, filename_suffix),
-        content=content,
-        timestamp=timestamp,
-    )
-
+class DatafileStream:
+    """Receives content chunk by chunk into a temporary file, then moves it into place or hands it to a writer.
 
-async def save_metadatafile(
-    metadata_path: Path, hash_type: str, prefix: str, metadata: PrefixMetadata
-) -> PrefixMetadata:
-    def json_serial(data):
-        if isinstance(data, datetime):
-            return data.isoformat()
-        raise HibpDownloaderException(f"Type {type(data)!r} not serializable")
-
-    await save_bytesfile(
-        filepath=generate_filepath(metadata_path, hash_type, prefix, filename_suffix="meta"),
-        content=json.dumps(metadata.as_dict(), default=json_serial, separators=(",", ":")).encode("utf8"),
-    )
+    The SHA-256 checksum and the encoding verification are computed incrementally as chunks arrive, so the content
+    is never held in memory as a whole; the target file is only replaced (atomically, by `os.replace`) once the
+    content is complete and verified, so an interrupted download never leaves a truncated data file in place.
 
-    return metadata
+    Hashing, verification and the file writes for each chunk run together in one call on the `executor` (the
+    event loop default executor if None) so that this work never stalls the event loop; hashlib and zlib release
+    the GIL while they work on the chunk.
 
+    Without a `writer` the temporary file is beside the `filepath`, and the commit moves it into place.  With a
+    `writer` the temporary file is the one its datastore names for the `prefix` (see `Datastore.temp_filepath`), and
+    the commit hands just its path to the DatafileWriter, which syncs it and moves it into the datastore; the
+    `filepath` is not used.  With the binary `data_format` (a writer is required) the completed temporary file is
+    transcoded into the binary prefix format on the `executor` before it is handed over.
+    """
 
-async def load_bytesfile(filepath: Path) -> bytes:
-    if not await aiofiles.os.path.isfile(filepath):
-        raise HibpDownloaderException(f"File not found {filepath}")
-    try:
-        async with aiofiles.open(filepath, mode="rb") as f:
-            return await f.read()
-    except OSError as e:
-        logger.error(f"Failed to read bytes from file {filepath}: {e}")
-        raise HibpDownloaderException(f"Failed to read bytes file: {e}") from e
-
+    def __init__(
+        self,
+        encoding_type: str | None,
+        filepath: Path | None = None,
+        executor: Executor | None = None,
+        writer: "DatafileWriter | None" = None,
+        prefix: str = "",
+        data_format: DataFormat = DataFormat.gzip,
+    ):
+        if data_format == DataFormat.binary and writer is None:
+            raise HibpDownloaderException("The binary data format requires a DatafileWriter")
+        if writer:
+            self.filepath = None
+            self.temp_filepath = writer.datastore.temp_filepath(prefix)
+        elif filepath:
+            self.filepath = Path(os.path.realpath(os.path.expanduser(filepath)))
+            self.temp_filepath = self.filepath.with_name(f"{self.filepath.name}.{os.getpid()}.tmp")
+        else:
+            raise HibpDownloaderException("A DatafileStream requires a filepath or a DatafileWriter")
+        self.prefix = prefix
+        self.encoding_type = encoding_type
+        self.executor = executor
+        self.writer = writer
+        self.data_format = data_format
+        self.bytes = 0
+        self._sha256 = hashlib.sha256(usedforsecurity=False)
+        self._verifier = BinaryEncodingVerifier(encoding_type, check_lines=True)
+        self._file: BinaryIO | None = None
+        self._temp_exists = False
+
+    @property
+    def checksum(self) -> str:
+        return self._sha256.hexdigest()
+
+    @property
+    def verified(self) -> bool:
+        return self._verifier.verified
+
+    @property
+    def verify_failure(self) -> str | None:
+        return self._verifier.failure
+
+    @property
+    def line_count(self) -> int:
+        return self._verifier.line_count
+
+    async def open(self) -> None:
+        """Open (or re-open, truncating any earlier attempt) the temporary file."""
+        await self._run(self._open)
+
+    async def write(self, chunk: bytes) -> None:
+        await self._run(self._write, chunk)
+
+    async def close(self) -> None:
+        if self._file is not None:
+            await self._run(self._close)
+
+    async def commit(self, timestamp: str | datetime | None = None) -> None:
+        """Move the completed temporary file into place as the target file."""
+        await (await self.commit_queued(timestamp))
+
+    async def commit_queued(
+        self, timestamp: str | datetime | None = None, metadata: PrefixMetadata | None = None
+    ) -> "asyncio.Future[None]":
+        """Commit as `commit`, but with a writer return once the content is queued; the future completes once written.
+
+        The `metadata` is passed to the writer, which saves it together with the data file unless its durability
+        mode is `none`.
+        """
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        if self.writer:
+            await self._run(self._close)
+            if self.data_format == DataFormat.binary:
+                await self._run(self._transcode)
+            # the writer now owns the temporary file, and removes it once stored (or failed)
+            self._temp_exists = False
+            return await self.writer.submit(
+                self.prefix, timestamp=timestamp, metadata=metadata, filepath=self.temp_filepath
+            )
+
+        await self._run(self._commit, timestamp)
+        written: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        written.set_result(None)
+        return written
+
+    async def discard(self) -> None:
+        if self._temp_exists:
+            await self._run(self._discard)
+
+    async def _run(self, func: Callable[..., None], *args: Any) -> None:
+        await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    def _open(self) -> None:
+        self._close()
+        self.bytes = 0
+        self._sha256 = hashlib.sha256(usedforsecurity=False)
+        self._verifier = BinaryEncodingVerifier(self.encoding_type, check_lines=True)
+        try:
+            os.makedirs(self.temp_filepath.parent, exist_ok=True)
+            self._file = open(self.temp_filepath, mode="wb")  # noqa: SIM115
+            self._temp_exists = True
+        except OSError as e:
+            logger.error(f"Failed to open temporary file {self.temp_filepath}: {e}")
+            raise HibpDownloaderException(f"Failed to open temporary file: {e}") from e
+
+    def _write(self, chunk: bytes) -> None:
+        self.bytes += len(chunk)
+        self._sha256.update(chunk)
+        self._verifier.update(chunk)
+        if self._file is None:
+            raise HibpDownloaderException(f"Temporary file {self.temp_filepath} is not open")
+        try:
+            self._file.write(chunk)
+        except OSError as e:
+            logger.error(f"Failed to write temporary file {self.temp_filepath}: {e}")
+            raise HibpDownloaderException(f"Failed to write temporary file: {e}") from e
+
+    def _close(self) -> None:
+        if self._file is not None:
+            file, self._file = self._file, None
+            file.close()
+
+    def _transcode(self) -> None:
+        try:
+            content = self.temp_filepath.read_bytes()
+            self.temp_filepath.write_bytes(binary_prefix_transcode(self.prefix, content, self.checksum))
+        except OSError as e:
+            logger.error(f"Failed to transcode temporary file {self.temp_filepath}: {e}")
+            raise HibpDownloaderException(f"Failed to transcode temporary file: {e}") from e
+
+    def _commit(self, timestamp: datetime | None) -> None:
+        self._close()
+        if self.filepath is None:
+            raise HibpDownloaderException(f"Temporary file {self.temp_filepath} has no target file")
+        try:
+            if timestamp:
+                os.utime(self.temp_filepath, times=(timestamp.timestamp(), timestamp.timestamp()))
+            os.replace(self.temp_filepath, self.filepath)
+            self._temp_exists = False
+        except OSError as e:
+            logger.error(f"Failed to save bytes to file {self.filepath}: {e}")
+            raise HibpDownloaderException(f"Failed to save bytes file: {e}") from e
+
+    def _discard(self) -> None:
+        self._close()
+        try:
+            os.unlink(self.temp_filepath)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove temporary file {self.temp_filepath}: {e}")
+        self._temp_exists = False
+
+
+class DatastoreItem(NamedTuple):
+    """The content of a prefix to store; with a `filepath`, the content is that completed temporary file (see
+    `Datastore.temp_filepath`), which the datastore moves or copies into place and removes."""
+
+    prefix: str
+    content: bytes | bytearray = b""
+    timestamp: datetime | None = None
+    filepath: Path | None = None
+
+
+class DatafileWriterJob(NamedTuple):
+    item: DatastoreItem
+    metadata: PrefixMetadata | None
+    written: asyncio.Future
+
+
+class DatafileWriter:
+    """Writes data files to the datastore on a dedicated thread, fed by a bounded queue, so that the download
+    coroutines never wait on filesystem calls (eg on an NFS data path) other than for space in the queue.
+
+    Queued files are written in batches (see `Datastore.write_many`).
+
+    Unless the `durability` mode is `none`, the metadata submitted with each file is saved to the `metadata_store`
+    together with it, so that a crash never leaves metadata describing content other than that of the data file:
+
+      1. the metadata of the batch is recorded as pending (`MetadataStore.save_pending`), synced,
+      2. the data files are written to the datastore, each synced, and then their directories once each,
+      3. the pending metadata is moved into place in one transaction (`MetadataStore.commit_pending`), synced.
+
+    Pending metadata left by a crash is resolved against the data files when the next download starts.  In `batched`
+    mode a batch collects files for up to `batch_interval` seconds (or `batch_size` files), so that the pending
+    metadata, the directories of the data files and the metadata commit are each synced once for the whole batch.
+    In `strict` mode every file is a batch of its own, so each file is synced with its metadata before the next is
+    written.
+
+    Downloads submit the temporary file their content was streamed to, so a queued file holds no memory.  Create, use
+    and close the writer within one event loop; `submit` waits (without blocking the loop) while the queue is full,
+    so that downloads slow to the pace of the disk rather than leaving ever more temporary files behind.
+    """
 
-async def load_datafile(
-    data_path: Path, hash_type: str, prefix: str, datafile_suffix: str, decompression_type=None, prepend_prefix=False
-) -> tuple[str, Path]:
-    data_filepath = generate_filepath(data_path, hash_type, prefix, datafile_suffix)
-    data: bytes = await load_bytesfile(filepath=data_filepath)
+    def __init__(
+        self,
+        datastore: "Datastore",
+        queue_size: int = DATAFILE_WRITER_QUEUE_SIZE,
+        batch_size: int = DATAFILE_WRITER_BATCH_SIZE,
+        name: str = "datafile-writer",
+        durability: DurabilityMode = DurabilityMode.none,
+        metadata_store: MetadataStore | None = None,
+        batch_interval: float = DATAFILE_WRITER_BATCH_INTERVAL,
+    ):
+        if durability != DurabilityMode.none and metadata_store is None:
+            raise HibpDownloaderException(f"Durability mode {durability.value!r} requires a metadata store")
+        self.datastore = datastore
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.durability = durability
+        self.metadata_store = metadata_store if durability != DurabilityMode.none else None
+        self._slots = asyncio.Semaphore(queue_size)
+        self._queue: queue.SimpleQueue[DatafileWriterJob | None] = queue.SimpleQueue()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    @property
+    def saves_metadata(self) -> bool:
+        return self.metadata_store is not None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread.start()
+
+    async def submit(
+        self,
+        prefix: str,
+        content: bytes | bytearray = b"",
+        timestamp: datetime | None = None,
+        metadata: PrefixMetadata | None = None,
+        filepath: Path | None = None,
+    ) -> "asyncio.Future[None]":
+        """Queue the content (or the temporary file at `filepath`, see DatastoreItem) to be written for the prefix;
+        return a future that completes once it is written."""
+        await self._slots.acquire()
+        written: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._queue.put(DatafileWriterJob(DatastoreItem(prefix, content, timestamp, filepath), metadata, written))
+        return written
+
+    def close(self) -> None:
+        """Write the files still queued and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            jobs = [self._queue.get()]
+            group_deadline = time.monotonic() + self.batch_interval
+            while len(jobs) < self.batch_size and jobs[-1] is not None:
+                try:
+                    if self.durability == DurabilityMode.batched:
+                        jobs.append(self._queue.get(timeout=max(0.0, group_deadline - time.monotonic())))
+                    else:
+                        jobs.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            batch = [job for job in jobs if job is not None]
+            if self.durability == DurabilityMode.strict:
+                for job in batch:
+                    self._write_batch([job])
+            else:
+                self._write_batch(batch)
+            if jobs[-1] is None:
+                return
+
+    def _write_batch(self, jobs: list[DatafileWriterJob]) -> None:
+        try:
+            errors = self._write_jobs(jobs)
+        except Exception as e:
+            # an unexpected error fails the batch rather than ending the writer thread, which would leave every
+            # pending write, and every download waiting for a queue slot, waiting forever
+            logger.exception(f"Unexpected error writing {len(jobs)} data files")
+            self.datastore.discard_temp_files([job.item for job in jobs])
+            errors = dict.fromkeys(range(len(jobs)), e)
+
+        for index, job in enumerate(jobs):
+            self._loop.call_soon_threadsafe(self._complete, job.item.prefix, job.written, errors.get(index))  # type: ignore[union-attr]
+
+    def _write_jobs(self, jobs: list[DatafileWriterJob]) -> dict[int, Exception]:
+        """Write the batch; return the errors by job index."""
+        errors: dict[int, Exception] = {}
+        if self.metadata_store:
+            try:
+                self.metadata_store.save_pending(job.metadata for job in jobs if job.metadata)
+            except HibpDownloaderException as e:
+                errors = dict.fromkeys(range(len(jobs)), e)
+
+        if not errors:
+            errors = self.datastore.write_many([job.item for job in jobs], sync=self.metadata_store is not None)
+        else:
+            self.datastore.discard_temp_files([job.item for job in jobs])
+
+        if self.metadata_store:
+            try:
+                self.metadata_store.commit_pending(
+                    [job.metadata.prefix for index, job in enumerate(jobs) if job.metadata and index not in errors],
+                    discard_prefixes=[
+                        job.metadata.prefix for index, job in enumerate(jobs) if job.metadata and index in errors
+                    ],
+                )
+            except HibpDownloaderException as e:
+                # the pending metadata is resolved against the data files by the next download
+                for index in range(len(jobs)):
+                    errors.setdefault(index, e)
+        return errors
+
+    def _complete(self, prefix: str, written: asyncio.Future, error: Exception | None) -> None:
+        self._slots.release()
+        if written.done():
+            return
+        if error:
+            written.set_exception(
+                HibpDownloaderException(f"Failed to save data file {self.datastore.location(prefix)}: {error}")
+            )
+        else:
+            written.set_result(None)
+
+
+def datafile_decode(data: bytes, prefix: str, decompression_type=None, prepend_prefix=False) -> str:
+    # data in the binary prefix format is rendered from its records; the decompression_type does not apply
+    if is_binary_prefix(data):
+        binary_prefix = BinaryPrefix(data)
+        if prepend_prefix is False:
+            return "\r\n".join(binary_prefix.lines())
+        return "\n".join(binary_prefix.lines(prefix))
 
     if decompression_type is None:
         pass
@@ -115,60 +440,41 @@ async def load_datafile(
         raise HibpDownloaderException(f"Unsupported decompression_type {decompression_type}")
 
     if prepend_prefix is False:
-        return data.decode("utf8"), data_filepath
+        return data.decode("utf8")
 
     data_lines = [f"{prefix.upper()}{x.upper()}" for x in data.decode("utf8").replace("\r", "").split("\n")]
-    return "\n".join(data_lines), data_filepath
+    return "\n".join(data_lines)
 
 
-async def load_metadata(
-    metadata_path: Path, data_path: Path, hash_type: str, prefix: str, datafile_suffix="gz"
-) -> PrefixMetadata:
-    metadata_filepath = generate_filepath(metadata_path, hash_type, prefix, filename_suffix="meta")
+def datafile_content_checksum(data: bytes) -> str:
+    """Return the content checksum of stored data, ie the checksum of the content it was received as."""
+    if is_binary_prefix(data):
+        return BinaryPrefix(data).content_checksum
+    return hashed_sha256(data)
 
-    content = None
-    try:
-        if await aiofiles.os.path.isfile(metadata_filepath):
-            async with aiofiles.open(metadata_filepath, "r") as f:
-                content = await f.read()
-    except OSError as e:
-        logger.error(f"Failed to read metadata file {metadata_filepath}: {e}")
-        raise HibpDownloaderException(f"Failed to read metadata file: {e}") from e
 
-    if not content:
-        logger.debug(
-            f"No existing metadata file {str(metadata_filepath)!r} using an empty entry",
-        )
-        return PrefixMetadata(prefix=prefix)
+class DatafileDirectoryIndex:
+    """Answers whether the data file for a prefix exists using one directory listing per `xx/yy` directory.
 
-    try:
-        prefix_metadata = PrefixMetadata(**json.loads(content))
-    except ValueError:
-        logger.warning(
-            f"Unable to parse metadata file {metadata_filepath!r} using an empty entry",
-        )
-        return PrefixMetadata(prefix=prefix)
-
-    if isinstance(prefix_metadata.server_timestamp, str):
-        prefix_metadata.server_timestamp = datetime.fromisoformat(prefix_metadata.server_timestamp)
-    if isinstance(prefix_metadata.last_modified, str):
-        prefix_metadata.last_modified = datetime.fromisoformat(prefix_metadata.last_modified)
-
-    # If the data file is missing despite metadata existing, force a re-download
-    # by returning empty metadata (clears etag and server_timestamp so we don't skip)
-    data_file = generate_filepath(data_path, hash_type, prefix, datafile_suffix)
-    if not data_file.is_file():
-        logger.debug(
-            f"Data file {str(data_file)!r} missing despite metadata existing for {prefix!r}, forcing re-download"
-        )
-        return PrefixMetadata(prefix=prefix)
+    Prefixes must be queried in order so that each directory is listed once; far cheaper than a stat per prefix.
+    """
 
-    if not prefix_metadata.bytes or prefix_metadata.bytes < 1:
-        data_file = generate_filepath(data_path, hash_type, prefix, datafile_suffix)
-        if data_file.is_file():
-            prefix_metadata.bytes = data_file.stat().st_size
+    def __init__(self, data_path: Path, hash_type: str, datafile_suffix: str):
+        self.data_path = data_path
+        self.hash_type = hash_type
+        self.datafile_suffix = datafile_suffix
+        self.directory_key = ""
+        self.filenames: set[str] = set()
 
-    return prefix_metadata
+    def exists(self, prefix: str) -> bool:
+        filepath = generate_filepath(self.data_path, self.hash_type, prefix, self.datafile_suffix)
+        if prefix[0:4].lower() != self.directory_key:
+            self.directory_key = prefix[0:4].lower()
+            try:
+                self.filenames = set(os.listdir(filepath.parent))
+            except OSError:
+                self.filenames = set()
+        return filepath.name in self.filenames
 
 
 def encoding_type_file_suffix(encoding_type: str) -> str:
@@ -176,6 +482,8 @@ def encoding_type_file_suffix(encoding_type: str) -> str:
         return "txt"
     elif encoding_type.lower() == "gzip" or encoding_type.lower() == "gz":
         return "gz"  # extension makes shell command completion for zcat, zgrep and others work nicely
+    elif encoding_type.lower() == BINARY_PREFIX_ENCODING_TYPE:
+        return "bin"
 
     # the encoding type becomes a naive 1:1 mapping at this point
     return encoding_type.lower()
@@ -189,15 +497,9 @@ def is_valid_gzip(data: bytes) -> bool:
     - https://github.com/threatpatrols/hibp-downloader/pull/14/changes/8516fb21e48a312dcdb9cfdbf429e5c2594885c5
 
     """
-    if not data or len(data) < 2:
-        return False
-    if not data.startswith(b"\x1f\x8b"):
-        return False
-    try:
-        gzip.decompress(data)
-        return True
-    except Exception:
-        return False
+    verifier = BinaryEncodingVerifier("gzip")
+    verifier.update(data)
+    return verifier.verified
 
 
 def is_valid_identity(data: bytes) -> bool:
@@ -222,6 +524,175 @@ def is_valid_identity(data: bytes) -> bool:
         return False
 
 
+class BinaryEncodingVerifier:
+    """Streaming verification of content that is received in chunks, without holding the decoded content in memory.
+
+    For gzip the member header is parsed, the deflate stream is inflated in bounded pieces as chunks arrive, and the
+    CRC32 and ISIZE trailer are checked against the inflated content.  With `check_lines` each decoded line is also
+    checked to be a `<hex-suffix>:<count>` range line, and counted, on the fly.
+    """
+
+    def __init__(self, encoding_type: str | None, check_lines: bool = False):
+        self.encoding = (encoding_type or "identity").lower()
+        self.check_lines = check_lines
+        self.bytes = 0
+        self._line_count = 0
+        self._failure: str | None = None
+        self._head = b""
+        self._partial_line = b""
+
+        self._decompressor = None
+        if self.encoding in ("gzip", "gz"):
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)  # raw deflate; header and trailer parsed here
+        self._header_complete = False
+        self._trailer = b""
+        self._crc32 = 0
+        self._isize = 0
+
+    def update(self, chunk: bytes | bytearray | memoryview) -> None:
+        if self._failure or not chunk:
+            return
+        self.bytes += len(chunk)
+
+        if self._decompressor is None:
+            if self.encoding == "identity":
+                if self.check_lines:
+                    self._update_lines(bytes(chunk))
+                elif b"\n" not in self._head:
+                    self._head += chunk  # only the first line is inspected
+            return
+
+        if not self._header_complete:
+            self._head += chunk
+            header_size = self._gzip_header_size()
+            if header_size is None:
+                return
+            self._header_complete = True
+            chunk, self._head = self._head[header_size:], b""
+
+        if self._decompressor.eof:
+            self._trailer += chunk
+        else:
+            self._inflate(self._decompressor, chunk)
+
+    @property
+    def failure(self) -> str | None:
+        """Reason the content is not valid, or None once complete and valid."""
+        if self._failure:
+            return self._failure
+        if not self.bytes:
+            return "no content"
+
+        if self._decompressor is not None:
+            if not self._header_complete:
+                return "incomplete gzip header"
+            if not self._decompressor.eof:
+                return "truncated deflate stream"
+            if len(self._trailer) < 8:
+                return "truncated gzip trailer"
+            crc32, isize = struct.unpack("<II", self._trailer[:8])
+            if crc32 != self._crc32:
+                return "gzip CRC32 mismatch"
+            if isize != self._isize & 0xFFFFFFFF:
+                return "gzip ISIZE mismatch"
+            if self._trailer[8:].strip(b"\x00"):
+                return "unexpected data after gzip member"
+        elif self.encoding != "identity":
+            return None
+
+        if self.check_lines:
+            if self._partial_line and range_lines_count(self._partial_line + b"\n") is None:
+                return "invalid range line format"
+            if not self.line_count:
+                return "no range lines"
+        elif self._decompressor is None and not is_valid_identity(self._head):
+            return "invalid range line format"
+        return None
+
+    @property
+    def verified(self) -> bool:
+        return self.failure is None
+
+    @property
+    def line_count(self) -> int:
+        return self._line_count + bool(self._partial_line)  # the last line need not end with a newline
+
+    def _inflate(self, decompressor: Any, data: bytes | bytearray | memoryview) -> None:
+        while True:
+            try:
+                decoded = decompressor.decompress(data, GZIP_VERIFY_MAX_DECODED_SIZE)
+            except zlib.error as e:
+                self._failure = f"invalid deflate stream ({e})"
+                return
+            self._crc32 = zlib.crc32(decoded, self._crc32)
+            self._isize += len(decoded)
+            if self.check_lines:
+                self._update_lines(decoded)
+            if decompressor.eof:
+                self._trailer += decompressor.unused_data
+                return
+            data = decompressor.unconsumed_tail
+            if not data and len(decoded) < GZIP_VERIFY_MAX_DECODED_SIZE:
+                return
+
+    def _update_lines(self, decoded: bytes) -> None:
+        if self._partial_line:
+            decoded = self._partial_line + decoded
+        end = decoded.rfind(b"\n") + 1
+        if end:
+            line_count = range_lines_count(decoded[:end])
+            if line_count is None:
+                self._failure = "invalid range line format"
+                return
+            self._line_count += line_count
+        self._partial_line = decoded[end:]
+        if len(self._partial_line) > HIBP_RANGE_LINE_MAX_SIZE:
+            self._failure = "invalid range line format"
+
+    def _gzip_header_size(self) -> int | None:
+        """Return the size of the gzip member header once it is complete (None until then); see RFC 1952."""
+        head = self._head
+        if b"\x1f\x8b\x08"[: len(head)] != head[:3]:
+            self._failure = "invalid gzip header"
+            return None
+        if len(head) < 10:
+            return None
+        flags = head[3]
+        if flags & 0xE0:
+            self._failure = "invalid gzip header flags"
+            return None
+
+        position = 10
+        if flags & 0x04:  # FEXTRA
+            if len(head) < position + 2:
+                return None
+            position += 2 + int.from_bytes(head[position : position + 2], "little")
+        for flag in (0x08, 0x10):  # FNAME, FCOMMENT; zero-terminated
+            if flags & flag:
+                terminator = head.find(b"\x00", position)
+                if terminator < 0:
+                    if len(head) > GZIP_VERIFY_MAX_HEADER_SIZE:
+                        self._failure = "invalid gzip header"
+                    return None
+                position = terminator + 1
+        if flags & 0x02:  # FHCRC
+            position += 2
+
+        return position if len(head) >= position else None
+
+
+def range_lines_count(lines: bytes) -> int | None:
+    """Count the `<hex-suffix>:<count>` lines in a block of newline-terminated lines; None if malformed.
+
+    Checks the block as a whole (only hex, digit, colon and line-end bytes; one colon per line) with C-level bytes
+    operations rather than a per-line regex, so that the check stays cheap relative to inflating the content.
+    """
+    line_count = lines.count(b"\n")
+    if lines.translate(None, HIBP_RANGE_LINE_BYTES) or lines.count(b":") != line_count:
+        return None
+    return line_count
+
+
 def verify_binary_encoding(data: bytes, encoding_type: str | None) -> bool:
     """Verify that the binary blob matches the expected ENCODING_TYPE."""
     if not data:
@@ -231,4 +702,6 @@ def verify_binary_encoding(data: bytes, encoding_type: str | None) -> bool:
         return is_valid_gzip(data)
     elif encoding_lower == "identity":
         return is_valid_identity(data)
+    elif encoding_lower == BINARY_PREFIX_ENCODING_TYPE:
+        return binary_prefix_verify(data)
     return True
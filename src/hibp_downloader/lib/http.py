@@ -1,15 +1,23 @@
-import random
+import asyncio
+from collections.abc import AsyncIterator
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 from typing import Any, Callable
 
 import httpx
 
 from hibp_downloader import LOGGER_NAME, __title__, __version__
 from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.concurrency import RetryBackoff
+from hibp_downloader.lib.filedata import DatafileStream
 from hibp_downloader.lib.logger import logger_get
+from hibp_downloader.lib.rate_limit import SharedTokenBucket
 
 logger = logger_get(LOGGER_NAME)
 
-__TESTING_RANDOM_ERROR_INJECT_RATE = 0  # manual development testing only
+HTTP_RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+HTTP_THROTTLE_STATUS_CODES = frozenset({429, 503})
+HTTP_RETRY_AFTER_MAX = 120.0  # seconds; a longer Retry-After is treated as this, rather than stalling the worker
 
 
 async def httpx_debug_request(request: httpx.Request) -> None:
@@ -36,6 +44,10 @@ async def httpx_binary_response(
     verify: str | bool = "",
     debug: bool = False,
     client: httpx.AsyncClient | None = None,
+    body_stream: DatafileStream | None = None,
+    backoff: RetryBackoff | None = None,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
 ) -> Any:
     httpx_client = httpx_client_options(
         etag=etag,
@@ -53,6 +65,10 @@ async def httpx_binary_response(
             method=method,
             max_retries=max_retries,
             etag=etag,
+            body_stream=body_stream,
+            backoff=backoff,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
         )
 
     async with httpx.AsyncClient(**httpx_client) as http_client:
@@ -61,6 +77,10 @@ async def httpx_binary_response(
             url=url,
             method=method,
             max_retries=max_retries,
+            body_stream=body_stream,
+            backoff=backoff,
+            rate_limit=rate_limit,
+            bandwidth_limit=bandwidth_limit,
         )
 
 
@@ -133,16 +153,29 @@ async def _httpx_binary_response_with_client(
     method: str = "GET",
     max_retries: int = 3,
     etag: str | None = None,
+    body_stream: DatafileStream | None = None,
+    backoff: RetryBackoff | None = None,
+    rate_limit: SharedTokenBucket | None = None,
+    bandwidth_limit: SharedTokenBucket | None = None,
 ) -> Any:
-    original_url = url
-    attempt = 0
+    """Send the request with retries; the raw (still content-encoded) body is set as `response.binary`.
+
+    When a `body_stream` is given, a 200 response body is streamed into it instead and `response.binary` is empty;
+    the caller then commits or discards the stream.  Other bodies are buffered, pre-sized from Content-Length.
 
-    if __TESTING_RANDOM_ERROR_INJECT_RATE and __TESTING_RANDOM_ERROR_INJECT_RATE > random.random():
-        url = url.replace("http", "BR0KEN")
-        logger.warning(f"Testing, creating broken URL {url}")
+    Transport errors and 429/5xx responses are retried after a backoff delay; a throttling response pauses all
+    requests sharing the `backoff`, for at least its `Retry-After`.  The last 429/5xx response is returned when the
+    retries are exhausted.  Every attempt, including retries, takes a token from the `rate_limit` when given,
+    and every body byte received takes a token from the `bandwidth_limit`; a bodyless 304 takes none.
+    """
+    backoff = backoff or RetryBackoff()
+    attempt = 0
 
     while attempt < max_retries:
         attempt += 1
+        probe = await backoff.wait()
+        if rate_limit:
+            await rate_limit.acquire()
         logger.debug(f"Request attempt {attempt} of {max_retries} for {url!r}")
         per_request_headers = {"If-None-Match": etag} if etag else {}
         request = client.build_request(method=method, url=url, headers=per_request_headers)
@@ -150,18 +183,101 @@ async def _httpx_binary_response_with_client(
         try:
             response = await client.send(request=request, stream=True)
             try:
-                response.binary = b"".join([part async for part in response.aiter_raw()])  # type: ignore[attr-defined]
-                return response
+                if body_stream and response.status_code == 200:
+                    await body_stream.open()
+                    async for part in _aiter_raw(response, bandwidth_limit):
+                        await body_stream.write(part)
+                    await body_stream.close()
+                    response.binary = b""  # type: ignore[attr-defined]
+                else:
+                    response.binary = await _read_raw_body(response, bandwidth_limit)  # type: ignore[attr-defined]
             finally:
                 await response.aclose()
         except (httpx.ConnectError, httpx.RemoteProtocolError, httpx.HTTPError):
+            backoff.record_result(available=False, probe=probe)
+            if body_stream:
+                await body_stream.discard()
             logger.warning(f"Request [{attempt} of {max_retries}] failed for {request.method!r} {url!r}")
             if attempt >= max_retries:
-                raise HibpDownloaderException(f"Request failed after {attempt} retries: {original_url!r}")
-            if "BR0KEN" in url:
-                url = url.replace("BR0KEN", "http")
-            else:
-                url = original_url
+                raise HibpDownloaderException(f"Request failed after {attempt} retries: {url!r}")
+            backoff.record_failure()
+            await asyncio.sleep(backoff.delay(attempt))
             continue
 
-    raise HibpDownloaderException(f"Request failed after {max_retries} retries: {original_url!r}")
+        backoff.record_result(available=response.status_code < 500, probe=probe)
+        if response.status_code not in HTTP_RETRY_STATUS_CODES or attempt >= max_retries:
+            return response
+
+        retry_after = None
+        if response.status_code in HTTP_THROTTLE_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get("retry-after"))
+        delay = backoff.delay(attempt, retry_after=retry_after)
+        logger.warning(
+            f"Request [{attempt} of {max_retries}] for {request.method!r} {url!r} returned status "
+            f"{response.status_code}; retrying in {delay:.1f}s"
+        )
+        if response.status_code == 429 or retry_after is not None:
+            backoff.pause(delay)
+        else:
+            backoff.record_failure()
+            await asyncio.sleep(delay)
+
+    raise HibpDownloaderException(f"Request failed after {max_retries} retries: {url!r}")
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a `Retry-After` header of delay-seconds or an HTTP-date; None if absent or invalid."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), HTTP_RETRY_AFTER_MAX)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        return None
+    return min(max(0.0, (retry_at - datetime.now(retry_at.tzinfo)).total_seconds()), HTTP_RETRY_AFTER_MAX)
+
+
+def parse_http_date(value: str | None) -> datetime | None:
+    """Datetime of an HTTP-date header, eg `Date` or `Last-Modified`; None if absent or invalid."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value.strip())
+    except (TypeError, ValueError):
+        return None
+
+
+async def _read_raw_body(
+    response: httpx.Response, bandwidth_limit: SharedTokenBucket | None = None
+) -> bytes | bytearray:
+    try:
+        content_length = int(response.headers.get("content-length", 0))
+    except ValueError:
+        content_length = 0
+
+    if content_length <= 0:
+        return b"".join([part async for part in _aiter_raw(response, bandwidth_limit)])
+
+    # fill a buffer allocated once at the announced size, rather than joining a list of parts into a new copy
+    body = bytearray(content_length)
+    offset = 0
+    async for part in _aiter_raw(response, bandwidth_limit):
+        body[offset : offset + len(part)] = part
+        offset += len(part)
+    if offset < content_length:
+        del body[offset:]
+    return body
+
+
+async def _aiter_raw(
+    response: httpx.Response, bandwidth_limit: SharedTokenBucket | None = None
+) -> AsyncIterator[bytes]:
+    """Iterate the raw body; each part is paid for in bandwidth-limit tokens before the next part is read."""
+    async for part in response.aiter_raw():
+        if bandwidth_limit:
+            await bandwidth_limit.acquire(len(part))
+        yield part
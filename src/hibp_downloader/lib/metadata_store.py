@@ -0,0 +1,384 @@
+import json
+import os
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from hibp_downloader import LOGGER_NAME
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.logger import logger_get
+from hibp_downloader.models import HashType, PrefixMetadata, PrefixMetadataDataSource
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+logger = logger_get(name=LOGGER_NAME)
+
+METADATA_STORE_FILENAME = "metadata.sqlite"
+METADATA_STORE_BATCH_SIZE = 32
+METADATA_STORE_QUERY_CHUNK = 500  # stays below the SQLite host-parameter limit
+
+METADATA_STORE_COLUMNS = (
+    "prefix",
+    "start_timestamp",
+    "etag",
+    "bytes",
+    "server_timestamp",
+    "last_modified",
+    "content_encoding",
+    "content_checksum",
+    "data_source",
+)
+
+METADATA_STORE_CHECKED_STATEMENT = "UPDATE prefix_metadata SET server_timestamp = ? WHERE prefix = ?"
+
+METADATA_STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS prefix_metadata (
+    prefix TEXT PRIMARY KEY,
+    start_timestamp REAL,
+    etag TEXT,
+    bytes INTEGER,
+    server_timestamp REAL,
+    last_modified REAL,
+    content_encoding TEXT,
+    content_checksum TEXT,
+    data_source TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending_metadata (
+    prefix TEXT PRIMARY KEY,
+    start_timestamp REAL,
+    etag TEXT,
+    bytes INTEGER,
+    server_timestamp REAL,
+    last_modified REAL,
+    content_encoding TEXT,
+    content_checksum TEXT,
+    data_source TEXT
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS store_info (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+"""
+
+
+class MetadataStore:
+    """Per-prefix metadata for one hash type held in a single SQLite (WAL mode) file keyed by prefix.
+
+    Replaces the one-JSON-file-per-prefix `.meta` layout; reads and writes are batched so that a run over the
+    full prefix range costs a few thousand SQLite statements rather than millions of small-file operations.
+    Each process must open its own store instance; SQLite connections are not shared across processes.  Within a
+    process the store may be used from several threads (eg flushed from a worker thread), access is serialized.
+
+    With `durable` each transaction is synced to disk before it returns (SQLite `synchronous=FULL`); otherwise the
+    last transactions before a power loss may be lost, though the store stays consistent.
+    """
+
+    def __init__(self, metadata_path: Path | str, hash_type: str, timeout: float = 60, durable: bool = False):
+        self.hash_type = hash_type.lower()
+        self.filepath = Path(os.path.join(os.path.expanduser(metadata_path), self.hash_type, METADATA_STORE_FILENAME))
+        self.timeout = timeout
+        self.durable = durable
+        self.pending: list[PrefixMetadata] = []
+        self.pending_checked: list[PrefixMetadata] = []
+        self._connection: sqlite3.Connection | None = None
+        self._connection_lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+
+    def __enter__(self) -> "Self":
+        return self.open()
+
+    def __exit__(self, *_: object) -> None:
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        return self._connection  # type: ignore[return-value]
+
+    def open(self) -> "Self":
+        with self._connection_lock:
+            return self._open()
+
+    def _open(self) -> "Self":
+        if self._connection is not None:
+            return self
+        try:
+            os.makedirs(self.filepath.parent, exist_ok=True)
+            connection = sqlite3.connect(
+                self.filepath, timeout=self.timeout, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={'FULL' if self.durable else 'NORMAL'}")
+            connection.executescript(METADATA_STORE_SCHEMA)
+        except (OSError, sqlite3.Error) as e:
+            raise HibpDownloaderException(f"Failed to open metadata store {str(self.filepath)!r}: {e}") from e
+        self._connection = connection
+        return self
+
+    def close(self) -> None:
+        self.flush()
+        with self._connection_lock:
+            if self._connection is None:
+                return
+            self._connection.close()
+            self._connection = None
+
+    def load_many(self, prefixes: Iterable[str]) -> dict[str, PrefixMetadata]:
+        prefixes = list(prefixes)
+        results: dict[str, PrefixMetadata] = {}
+        for index in range(0, len(prefixes), METADATA_STORE_QUERY_CHUNK):
+            chunk = prefixes[index : index + METADATA_STORE_QUERY_CHUNK]
+            query = (
+                f"SELECT {','.join(METADATA_STORE_COLUMNS)} FROM prefix_metadata "
+                f"WHERE prefix IN ({','.join('?' * len(chunk))})"
+            )
+            for row in self._execute(query, chunk):
+                results[row[0]] = self._from_row(row)
+        return results
+
+    def scan(self, first_prefix: str = "00000", last_prefix: str = "fffff") -> Iterator[PrefixMetadata]:
+        query = (
+            f"SELECT {','.join(METADATA_STORE_COLUMNS)} FROM prefix_metadata "
+            "WHERE prefix BETWEEN ? AND ? ORDER BY prefix"
+        )
+        for row in self._execute(query, (first_prefix.lower(), last_prefix.lower())):
+            yield self._from_row(row)
+
+    def scan_columns(
+        self, columns: tuple[str, ...], first_prefix: str = "00000", last_prefix: str = "fffff"
+    ) -> Iterator[tuple]:
+        """Stream raw column values in prefix order without building PrefixMetadata objects for every row."""
+        for column in columns:
+            if column not in METADATA_STORE_COLUMNS:
+                raise HibpDownloaderException(f"Unknown metadata store column {column!r}")
+        query = f"SELECT {','.join(columns)} FROM prefix_metadata WHERE prefix BETWEEN ? AND ? ORDER BY prefix"
+        try:
+            yield from self.connection.execute(query, (first_prefix.lower(), last_prefix.lower()))
+        except sqlite3.Error as e:
+            raise HibpDownloaderException(f"Failed to read metadata store {str(self.filepath)!r}: {e}") from e
+
+    def save_many(self, items: Iterable[PrefixMetadata], replace: bool = True) -> int:
+        rows = [self._to_row(item) for item in items]
+        if not rows:
+            return 0
+        self._execute_transaction(self._save_statement(replace), rows)
+        return len(rows)
+
+    def save_checked_many(self, items: Iterable[PrefixMetadata]) -> int:
+        """Update the server timestamp of prefixes checked unchanged (eg an ETag match); other metadata is kept.
+
+        The server timestamp is the time a prefix was last known to be current, for the local-cache TTL and the
+        stalest schedule; without a `Date` header the request start time is used.
+        """
+        rows = self._to_checked_rows(items)
+        if not rows:
+            return 0
+        return self._execute_transaction(METADATA_STORE_CHECKED_STATEMENT, rows)
+
+    def queue_save(self, item: PrefixMetadata, autoflush: bool = True) -> None:
+        """Buffer a metadata item; buffered items are written in one transaction per METADATA_STORE_BATCH_SIZE.
+
+        With `autoflush` False the caller is responsible for calling `flush` once `flush_due`.
+        """
+        with self._pending_lock:
+            self.pending.append(item)
+        if autoflush and self.flush_due:
+            self.flush()
+
+    def queue_save_checked(self, item: PrefixMetadata, autoflush: bool = True) -> None:
+        """Buffer a prefix checked unchanged, see `save_checked_many`; written together with the `queue_save` items."""
+        with self._pending_lock:
+            self.pending_checked.append(item)
+        if autoflush and self.flush_due:
+            self.flush()
+
+    @property
+    def flush_due(self) -> bool:
+        return len(self.pending) + len(self.pending_checked) >= METADATA_STORE_BATCH_SIZE
+
+    def flush(self) -> None:
+        with self._pending_lock:
+            pending, self.pending = self.pending, []
+            pending_checked, self.pending_checked = self.pending_checked, []
+        if pending or pending_checked:
+            self._execute_transactions(
+                [
+                    (self._save_statement(), [self._to_row(item) for item in pending]),
+                    (METADATA_STORE_CHECKED_STATEMENT, self._to_checked_rows(pending_checked)),
+                ]
+            )
+
+    def save_pending(self, items: Iterable[PrefixMetadata]) -> int:
+        """Record metadata for data files about to be replaced; see `commit_pending`.
+
+        A pending entry that is still present when the store is next opened belongs to a data file replacement that
+        was interrupted (eg by a crash) and is resolved by `load_pending` and `commit_pending`.
+        """
+        rows = [self._to_row(item) for item in items]
+        if not rows:
+            return 0
+        statement = (
+            f"INSERT OR REPLACE INTO pending_metadata ({','.join(METADATA_STORE_COLUMNS)}) "
+            f"VALUES ({','.join('?' * len(METADATA_STORE_COLUMNS))})"
+        )
+        return self._execute_transaction(statement, rows)
+
+    def commit_pending(self, prefixes: Iterable[str], discard_prefixes: Iterable[str] = ()) -> None:
+        """In one transaction, move the pending metadata of `prefixes` into place and drop that of `discard_prefixes`."""
+        commit_rows = [(prefix.lower(),) for prefix in prefixes]
+        discard_rows = [(prefix.lower(),) for prefix in discard_prefixes]
+        self._execute_transactions(
+            [
+                (
+                    (
+                        f"INSERT OR REPLACE INTO prefix_metadata ({','.join(METADATA_STORE_COLUMNS)}) "
+                        f"SELECT {','.join(METADATA_STORE_COLUMNS)} FROM pending_metadata WHERE prefix = ?"
+                    ),
+                    commit_rows,
+                ),
+                ("DELETE FROM pending_metadata WHERE prefix = ?", commit_rows + discard_rows),
+            ]
+        )
+
+    def load_pending(self) -> list[PrefixMetadata]:
+        query = f"SELECT {','.join(METADATA_STORE_COLUMNS)} FROM pending_metadata ORDER BY prefix"
+        return [self._from_row(row) for row in self._execute(query, ())]
+
+    def delete_many(self, prefixes: Iterable[str]) -> int:
+        rows = [(prefix.lower(),) for prefix in prefixes]
+        if not rows:
+            return 0
+        return self._execute_transaction("DELETE FROM prefix_metadata WHERE prefix = ?", rows)
+
+    def import_metafiles(self) -> int:
+        """One-shot import of the legacy per-prefix JSON `.meta` files under this hash type path.
+
+        The import is recorded in the store so that it only ever runs once; entries already present in the store
+        take precedence over the legacy files, which are left in place and are no longer read.
+        """
+        if self._info_get("metafiles_imported"):
+            return 0
+
+        imported_count = 0
+        batch: list[PrefixMetadata] = []
+        for dirpath, _, filenames in os.walk(self.filepath.parent):
+            for filename in filenames:
+                if not filename.endswith(".meta"):
+                    continue
+                metadata = self._load_metafile(Path(os.path.join(dirpath, filename)))
+                if metadata:
+                    batch.append(metadata)
+                if len(batch) >= METADATA_STORE_QUERY_CHUNK * 10:
+                    imported_count += self.save_many(batch, replace=False)
+                    batch = []
+        imported_count += self.save_many(batch, replace=False)
+
+        self._info_set("metafiles_imported", datetime.now().astimezone().isoformat())
+        if imported_count:
+            logger.info(
+                f"Imported {imported_count} legacy .meta files into metadata store {str(self.filepath)!r}; "
+                "the .meta files are no longer used and may be removed"
+            )
+        return imported_count
+
+    def _load_metafile(self, filepath: Path) -> PrefixMetadata | None:
+        try:
+            with open(filepath) as f:
+                return PrefixMetadata(**json.loads(f.read()))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Unable to import metadata file {str(filepath)!r} ({e})")
+        return None
+
+    def _info_get(self, key: str) -> str | None:
+        for row in self._execute("SELECT value FROM store_info WHERE key = ?", (key,)):
+            return row[0]
+        return None
+
+    def _info_set(self, key: str, value: str) -> None:
+        self._execute_transaction("INSERT OR REPLACE INTO store_info (key, value) VALUES (?, ?)", [(key, value)])
+
+    def _execute(self, query: str, parameters: Iterable[Any]) -> list[tuple]:
+        try:
+            with self._connection_lock:
+                return self.connection.execute(query, tuple(parameters)).fetchall()
+        except sqlite3.Error as e:
+            raise HibpDownloaderException(f"Failed to read metadata store {str(self.filepath)!r}: {e}") from e
+
+    def _execute_transaction(self, statement: str, rows: list[tuple]) -> int:
+        return self._execute_transactions([(statement, rows)])
+
+    def _execute_transactions(self, statements: list[tuple[str, list[tuple]]]) -> int:
+        """Execute the statements, each over its rows, in one transaction; return the row count of the last one."""
+        rowcount = 0
+        try:
+            with self._connection_lock:
+                connection = self.connection
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    for statement, rows in statements:
+                        if rows:
+                            rowcount = connection.executemany(statement, rows).rowcount
+                    connection.execute("COMMIT")
+                except sqlite3.Error:
+                    connection.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            raise HibpDownloaderException(f"Failed to write metadata store {str(self.filepath)!r}: {e}") from e
+        return rowcount
+
+    @staticmethod
+    def _save_statement(replace: bool = True) -> str:
+        return (
+            f"INSERT OR {'REPLACE' if replace else 'IGNORE'} INTO prefix_metadata ({','.join(METADATA_STORE_COLUMNS)}) "
+            f"VALUES ({','.join('?' * len(METADATA_STORE_COLUMNS))})"
+        )
+
+    @staticmethod
+    def _to_timestamp(value: str | datetime | None) -> float | None:
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        return value.timestamp() if value else None
+
+    @classmethod
+    def _to_row(cls, item: PrefixMetadata) -> tuple:
+        return (
+            item.prefix.lower(),
+            cls._to_timestamp(item.start_timestamp),
+            item.etag,
+            item.bytes,
+            cls._to_timestamp(item.server_timestamp),
+            cls._to_timestamp(item.last_modified),
+            item.content_encoding,
+            item.content_checksum,
+            PrefixMetadataDataSource(item.data_source).value if item.data_source else None,
+        )
+
+    @classmethod
+    def _to_checked_rows(cls, items: Iterable[PrefixMetadata]) -> list[tuple]:
+        return [
+            (cls._to_timestamp(item.server_timestamp or item.start_timestamp), item.prefix.lower())
+            for item in items
+            if item.server_timestamp or item.start_timestamp
+        ]
+
+    def _from_row(self, row: tuple) -> PrefixMetadata:
+        def timestamp(value: float | None) -> datetime | None:
+            return datetime.fromtimestamp(value, tz=timezone.utc) if value is not None else None
+
+        return PrefixMetadata(
+            prefix=row[0],
+            start_timestamp=timestamp(row[1]),
+            hash_type=HashType(self.hash_type),
+            etag=row[2],
+            bytes=row[3],
+            server_timestamp=timestamp(row[4]),
+            last_modified=timestamp(row[5]),
+            content_encoding=row[6],
+            content_checksum=row[7],
+            data_source=PrefixMetadataDataSource(row[8]) if row[8] else None,
+        )
@@ -0,0 +1,50 @@
+import asyncio
+import math
+import multiprocessing
+import time
+
+
+class SharedTokenBucket:
+    """Rate limit shared by all worker processes: a token bucket held in shared memory.
+
+    Used for the request rate (a token per request) and for bandwidth (a token per byte received).  The bucket
+    refills at `rate` tokens per second up to `burst` tokens.  Each use takes tokens; when not enough are
+    available they are still reserved (the bucket goes into debt) and the caller sleeps until its tokens are due, so
+    callers are paced at exactly `rate` without polling.  The bucket state is updated under one lock with the
+    system-wide monotonic clock, so the limit applies to the total across processes rather than a per-process split.
+
+    The bucket is passed to the worker processes once as a process argument, like the SharedWorkDistributor.
+    """
+
+    def __init__(self, rate: float, burst: int = 0):
+        self.rate = rate
+        self.burst = max(1, burst or math.ceil(rate))
+        # tokens, time of the last update, total tokens taken
+        self._state = multiprocessing.Array("d", [float(self.burst), time.monotonic(), 0.0])
+        self._rate_sample = (time.monotonic(), 0)
+
+    @property
+    def acquired_count(self) -> int:
+        return int(self._state[2])
+
+    def take_rate(self) -> float:
+        """Return the rate at which tokens were taken, across all processes, since the previous call."""
+        sample = (time.monotonic(), self.acquired_count)
+        rate = (sample[1] - self._rate_sample[1]) / max(sample[0] - self._rate_sample[0], 0.001)
+        self._rate_sample = sample
+        return rate
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take tokens from the bucket and return the seconds to wait before they may be used."""
+        with self._state.get_lock():
+            now = time.monotonic()
+            available = min(float(self.burst), self._state[0] + (now - self._state[1]) * self.rate) - tokens
+            self._state[0] = available
+            self._state[1] = now
+            self._state[2] += tokens
+        return -available / self.rate if available < 0 else 0.0
+
+    async def acquire(self, tokens: float = 1) -> None:
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
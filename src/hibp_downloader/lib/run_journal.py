@@ -0,0 +1,113 @@
+import json
+import os
+from collections.abc import Iterable
+from pathlib import Path
+from typing import Any, TextIO
+
+RUN_JOURNAL_FILENAME = "download-journal.log"
+RUN_JOURNAL_PREFIX_SPACE = 16**5
+
+
+class RunJournal:
+    """Append-only journal of the prefixes completed by a download run, so that an interrupted run can be resumed.
+
+    The journal is a text file in the metadata path for the hash type, holding the parameters of one run:
+
+      run {"first_hash": "00000", "last_hash": "fffff", ...}
+      done 00000-00007 0000a
+      end
+
+    A `done` line with the completed prefixes (as ranges) is appended for each stats record received from the
+    workers, and `end` once the run has finished.  A journal without `end` belongs to a run that was interrupted;
+    `resume()` loads its completed prefixes (into a bitmap over the prefix space) and continues to append to it.
+    Lines are flushed as they are written, so at most the line being written by a crash is lost.
+    """
+
+    def __init__(self, metadata_path: Path | str, hash_type: str):
+        self.filepath = Path(os.path.join(os.path.expanduser(metadata_path), hash_type.lower(), RUN_JOURNAL_FILENAME))
+        self.completed_count = 0
+        self._completed = bytearray(RUN_JOURNAL_PREFIX_SPACE)
+        self._file: TextIO | None = None
+
+    def start(self, run: dict[str, Any]) -> None:
+        """Start the journal for a new run, replacing the journal of any earlier run."""
+        os.makedirs(self.filepath.parent, exist_ok=True)
+        self._file = open(self.filepath, "w", encoding="ascii", buffering=1)  # noqa: SIM115
+        self._file.write(f"run {json.dumps(run, sort_keys=True)}\n")
+
+    def resume(self) -> dict[str, Any] | None:
+        """Return the parameters of the interrupted run in the journal, or None when there is no such run."""
+        if not self.filepath.is_file():
+            return None
+
+        # a last line without its newline was cut short by a crash; it is dropped
+        content = self.filepath.read_bytes()
+        content = content[: content.rfind(b"\n") + 1]
+
+        run = None
+        for line in content.decode("ascii", errors="replace").splitlines():
+            record, _, value = line.partition(" ")
+            if record == "run":
+                try:
+                    run = json.loads(value)
+                except json.JSONDecodeError:
+                    return None
+            elif record == "done":
+                self._load_ranges(value.split())
+            elif record == "end":
+                return None
+
+        if run is None:
+            return None
+
+        with open(self.filepath, "r+b") as f:
+            f.truncate(len(content))
+        self._file = open(self.filepath, "a", encoding="ascii", buffering=1)  # noqa: SIM115
+        return run
+
+    def completed(self, prefix: str) -> bool:
+        return bool(self._completed[int(prefix, 16)])
+
+    def record(self, prefixes: Iterable[str]) -> None:
+        """Append the prefixes as completed."""
+        values = sorted(int(prefix, 16) for prefix in prefixes)
+        if not values or not self._file:
+            return
+
+        ranges = []
+        first = last = values[0]
+        for value in values[1:]:
+            if value != last + 1:
+                ranges.append((first, last))
+                first = value
+            last = value
+        ranges.append((first, last))
+
+        self._file.write("done " + " ".join(f"{a:05x}" if a == b else f"{a:05x}-{b:05x}" for a, b in ranges) + "\n")
+        for value in values:
+            if not self._completed[value]:
+                self._completed[value] = 1
+                self.completed_count += 1
+
+    def finish(self) -> None:
+        """Mark the run as finished, so that it is not resumed, and close the journal."""
+        if self._file:
+            self._file.write("end\n")
+        self.close()
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _load_ranges(self, ranges: list[str]) -> None:
+        for value in ranges:
+            try:
+                first, _, last = value.partition("-")
+                start, end = int(first, 16), int(last or first, 16)
+            except ValueError:
+                continue
+            for index in range(start, min(end, RUN_JOURNAL_PREFIX_SPACE - 1) + 1):
+                if not self._completed[index]:
+                    self._completed[index] = 1
+                    self.completed_count += 1
@@ -0,0 +1,47 @@
+import multiprocessing
+from collections.abc import Sequence
+from typing import Any
+
+
+class SharedWorkDistributor:
+    """Hands out ranges of a fixed work-item sequence to worker processes through a shared claim counter.
+
+    Each claim is an atomic fetch-and-add on a counter in shared memory, so there is no feeder thread and no
+    per-chunk pickling; workers claim just before they can start the work and can begin immediately. Claim sizes
+    shrink as the remaining work runs down (guided self-scheduling) so that at the tail the last items are spread
+    across all workers rather than stranded in one worker's large claim.
+
+    The work items are passed to the worker processes once as a process argument; with the fork start method they
+    are inherited without being copied.
+    """
+
+    def __init__(self, work_items: Sequence[Any], worker_count: int):
+        self.work_items = work_items
+        self.worker_count = max(1, worker_count)
+        self._claimed = multiprocessing.Value("q", 0)
+        self._stopped = multiprocessing.Value("b", 0, lock=False)  # set from signal handlers, so without a lock
+
+    @property
+    def claimed_count(self) -> int:
+        return min(self._claimed.value, len(self.work_items))
+
+    @property
+    def stopped(self) -> bool:
+        return bool(self._stopped.value)
+
+    def stop(self) -> None:
+        """Hand out no more work; claims made before this are not affected."""
+        self._stopped.value = 1
+
+    def claim(self, max_size: int) -> Sequence[Any]:
+        with self._claimed.get_lock():
+            if self._stopped.value:
+                return []
+            start = self._claimed.value
+            remaining = len(self.work_items) - start
+            if remaining <= 0:
+                return []
+            size = min(max(1, max_size), max(1, remaining // (self.worker_count * 2)))
+            self._claimed.value = start + size
+
+        return self.work_items[start : start + size]
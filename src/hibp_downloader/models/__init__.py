@@ -1,5 +1,10 @@
 from .app_context import AppContext
+from .data_format import DataFormat
+from .download_schedule import DownloadSchedule
+from .durability_mode import DurabilityMode
 from .hash_type import HashType
 from .prefix_metadata import PrefixMetadata, PrefixMetadataDataSource
+from .prefix_work_item import PrefixWorkItem
 from .stats import QueueItemStats, QueueItemStatsCompute, QueueRunningStats
+from .storage_backend import StorageBackend
 from .worker_args import WorkerArgs
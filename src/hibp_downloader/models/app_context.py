@@ -1,5 +1,8 @@
 from dataclasses import dataclass, field
 
+from .data_format import DataFormat
+from .storage_backend import StorageBackend
+
 
 @dataclass()
 class AppContext:
@@ -7,5 +10,8 @@ class AppContext:
     command: str | None = field(default=None)
     data_path: str | None = field(default=None)
     metadata_path: str | None = field(default=None)
+    storage: StorageBackend = field(default=StorageBackend.files)
+    storage_url: str = field(default="")
+    data_format: DataFormat = field(default=DataFormat.gzip)
     add_completion: bool = False
     no_args_is_help: bool = True
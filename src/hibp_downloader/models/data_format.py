@@ -0,0 +1,6 @@
+from enum import Enum
+
+
+class DataFormat(str, Enum):
+    gzip = "gzip"  # the range lines text as received, gzip compressed, in <prefix>.gz data files
+    binary = "binary"  # the range lines transcoded into the binary prefix format (lib/binary_prefix.py), <prefix>.bin
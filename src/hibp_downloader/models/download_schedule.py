@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class DownloadSchedule(str, Enum):
+    sequential = "sequential"  # in prefix order from --first-hash to --last-hash
+    stalest = "stalest"  # never downloaded first, then by the time each prefix was last downloaded
+    largest = "largest"  # largest content size last downloaded first, so that worker processes finish together
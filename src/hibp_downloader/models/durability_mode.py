@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class DurabilityMode(str, Enum):
+    none = "none"  # no fsync; the operating system writes data files and metadata back in its own time
+    batched = "batched"  # data files and their metadata are committed together in groups, synced once per group
+    strict = "strict"  # each data file and its metadata are committed together, synced before the next
@@ -12,6 +12,7 @@ class PrefixMetadataDataSource(str, Enum):
     local_source_etag_match = "local_source_etag_match"
     remote_source_remote_cache = "remote_source_remote_cache"
     remote_source_origin_source = "remote_source_origin_source"
+    remote_source_content_unchanged = "remote_source_content_unchanged"
 
 
 @dataclass()
@@ -0,0 +1,12 @@
+from typing import NamedTuple
+
+
+class PrefixWorkItem(NamedTuple):
+    """A hash-prefix to request, with the values from existing metadata that the request needs.
+
+    A NamedTuple rather than a dataclass so that the many work items passed to worker processes pickle compactly.
+    """
+
+    prefix: str
+    etag: str | None = None
+    content_checksum: str | None = None
@@ -1,10 +1,17 @@
+import struct
 import time
+from collections.abc import Sequence
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Any
 
 from .prefix_metadata import PrefixMetadata, PrefixMetadataDataSource
 
+# fixed-size stats record: first and last prefix, ten counters, start time and event-loop lag; the failed and then
+# the completed prefixes follow, split by the unknown_source_status_count counter
+QUEUE_ITEM_STATS_RECORD = struct.Struct("<5s5s10Q3dQ")
+QUEUE_ITEM_STATS_PREFIX_SIZE = 5
+
 
 @dataclass()
 class QueueItemStats:
@@ -20,9 +27,13 @@ class QueueItemStats:
     local_source_etag_match_count: int
     remote_source_remote_cache_count: int
     remote_source_origin_source_count: int
+    remote_source_content_unchanged_count: int
     unknown_source_status_count: int
 
     start_time: float = field(default=time.time())
+    event_loop_lag_max: float = field(default=0)  # seconds, worker event-loop lag samples during the item
+    event_loop_lag_sum: float = field(default=0)
+    event_loop_lag_count: int = field(default=0)
     __end_time: float | None = field(default=None)
     __request_rate: float = field(default=0)  # per-second
     __bytes_processed_rate: float = field(default=0)  # per-second
@@ -53,6 +64,56 @@ class QueueItemStats:
     def end_trigger(self) -> None:
         self.end_time = time.time()
 
+    def pack(self, failed_prefixes: Sequence[str] = (), completed_prefixes: Sequence[str] = ()) -> bytes:
+        """Encode as a compact fixed-size record followed by the (5-byte) prefixes that failed and that completed."""
+        record = QUEUE_ITEM_STATS_RECORD.pack(
+            self.prefix_first.encode("ascii"),
+            self.prefix_last.encode("ascii"),
+            self.prefix_count,
+            self.request_count,
+            self.bytes_received,
+            self.bytes_processed,
+            self.local_source_ttl_cache_count,
+            self.local_source_etag_match_count,
+            self.remote_source_remote_cache_count,
+            self.remote_source_origin_source_count,
+            self.remote_source_content_unchanged_count,
+            self.unknown_source_status_count,
+            self.start_time,
+            self.event_loop_lag_max,
+            self.event_loop_lag_sum,
+            self.event_loop_lag_count,
+        )
+        return record + "".join((*failed_prefixes, *completed_prefixes)).encode("ascii")
+
+    @classmethod
+    def unpack(cls, data: bytes) -> tuple["QueueItemStats", list[str], list[str]]:
+        values = QUEUE_ITEM_STATS_RECORD.unpack_from(data)
+        stats = cls(
+            prefix_first=values[0].decode("ascii"),
+            prefix_last=values[1].decode("ascii"),
+            prefix_count=values[2],
+            request_count=values[3],
+            bytes_received=values[4],
+            bytes_processed=values[5],
+            local_source_ttl_cache_count=values[6],
+            local_source_etag_match_count=values[7],
+            remote_source_remote_cache_count=values[8],
+            remote_source_origin_source_count=values[9],
+            remote_source_content_unchanged_count=values[10],
+            unknown_source_status_count=values[11],
+            start_time=values[12],
+            event_loop_lag_max=values[13],
+            event_loop_lag_sum=values[14],
+            event_loop_lag_count=values[15],
+        )
+        tail = data[QUEUE_ITEM_STATS_RECORD.size :].decode("ascii")
+        prefixes = [
+            tail[i : i + QUEUE_ITEM_STATS_PREFIX_SIZE] for i in range(0, len(tail), QUEUE_ITEM_STATS_PREFIX_SIZE)
+        ]
+        failed_count = stats.unknown_source_status_count
+        return stats, prefixes[:failed_count], prefixes[failed_count:]
+
 
 @dataclass()
 class QueueRunningStats:
@@ -70,8 +131,17 @@ class QueueRunningStats:
     local_source_etag_match_count_sum: int = field(default=0)
     remote_source_remote_cache_count_sum: int = field(default=0)
     remote_source_origin_source_count_sum: int = field(default=0)
+    remote_source_content_unchanged_count_sum: int = field(default=0)
     unknown_source_status_count_sum: int = field(default=0)
 
+    event_loop_lag_max: float = field(default=0)
+    event_loop_lag_sum: float = field(default=0)
+    event_loop_lag_count: int = field(default=0)
+
+    failed_prefixes: list[str] = field(default_factory=list)
+    stopped: bool = field(default=False)  # workers were asked to stop (SIGTERM) before all work items were claimed
+    workers_lost: int = field(default=0)  # worker processes that ended without their end-of-stream message
+
     __end_time: float | None = field(default=None)
     __request_rate_total: float = field(default=0)  # per-second
     __bytes_processed_rate_total: float = field(default=0)  # per-second
@@ -84,6 +154,10 @@ class QueueRunningStats:
     def bytes_processed_rate_total(self) -> float:
         return self.__bytes_processed_rate_total
 
+    @property
+    def event_loop_lag_mean(self) -> float:
+        return self.event_loop_lag_sum / self.event_loop_lag_count if self.event_loop_lag_count else 0
+
     @property
     def run_time(self) -> float:
         return self.end_time - self.start_time  # type: ignore[operator]
@@ -113,7 +187,11 @@ class QueueRunningStats:
         self.local_source_etag_match_count_sum += item.local_source_etag_match_count
         self.remote_source_remote_cache_count_sum += item.remote_source_remote_cache_count
         self.remote_source_origin_source_count_sum += item.remote_source_origin_source_count
+        self.remote_source_content_unchanged_count_sum += item.remote_source_content_unchanged_count
         self.unknown_source_status_count_sum += item.unknown_source_status_count
+        self.event_loop_lag_max = max(self.event_loop_lag_max, item.event_loop_lag_max)
+        self.event_loop_lag_sum += item.event_loop_lag_sum
+        self.event_loop_lag_count += item.event_loop_lag_count
         self.end_trigger()
 
 
@@ -133,6 +211,7 @@ class QueueItemStatsCompute:
             "local_source_etag_match_count": 0,
             "remote_source_remote_cache_count": 0,
             "remote_source_origin_source_count": 0,
+            "remote_source_content_unchanged_count": 0,
             "unknown_source_status_count": 0,
         }
 
@@ -165,6 +244,8 @@ class QueueItemStatsCompute:
                 data["remote_source_remote_cache_count"] += 1
             elif item.data_source == PrefixMetadataDataSource.remote_source_origin_source:
                 data["remote_source_origin_source_count"] += 1
+            elif item.data_source == PrefixMetadataDataSource.remote_source_content_unchanged:
+                data["remote_source_content_unchanged_count"] += 1
             elif item.data_source == PrefixMetadataDataSource.unknown_source_status:
                 data["unknown_source_status_count"] += 1
 
@@ -0,0 +1,7 @@
+from enum import Enum
+
+
+class StorageBackend(str, Enum):
+    files = "files"  # one data file per prefix in <hash-type>/xx/yy/ directories
+    pack = "pack"  # append-only pack files with an index, in <hash-type>/pack/
+    s3 = "s3"  # one object per prefix in an S3-compatible object store, at --storage-url
@@ -2,7 +2,10 @@ from dataclasses import asdict, dataclass
 from pathlib import Path
 from typing import Any
 
+from .data_format import DataFormat
+from .durability_mode import DurabilityMode
 from .hash_type import HashType
+from .storage_backend import StorageBackend
 
 
 @dataclass()
@@ -17,9 +20,14 @@ class WorkerArgs:
     http_proxy: str
     http_certificates: str
     http_debug: bool
+    api_url: str
 
     ignore_etag: bool
     local_cache_ttl: int
+    durability: DurabilityMode = DurabilityMode.none
+    storage: StorageBackend = StorageBackend.files
+    storage_url: str = ""
+    data_format: DataFormat = DataFormat.gzip
     worker_index: int | None = None
 
     def as_dict(self) -> dict[str, Any]:
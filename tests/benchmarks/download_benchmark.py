@@ -0,0 +1,134 @@
+"""
+Download throughput benchmark against the local mock range server (tests/helpers/mock_range_server.py).
+
+Each scenario runs the `hibp-downloader download` command as a child process over a fixed prefix range and reports
+requests/s, response MB/s, CPU time (user+sys) per request and the peak RSS of the largest process.  The mock serves
+from this process, so its own CPU use is not counted against the downloader.
+
+Scenarios, run in order over the same data path:
+  cold       empty data path; every prefix is a 200 response that is verified and written
+  etag       re-run with --local-cache-ttl 0; every prefix is an If-None-Match request answered with 304
+  unchanged  new ETags for the same content; every prefix is a 200 response with an unchanged content checksum
+
+Run with: python -m tests.benchmarks.download_benchmark --prefixes 4096 --latency 0.02 --schedule largest
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+
+from ..helpers.mock_range_server import MockRangeServer
+
+BENCHMARK_SCENARIOS = ("cold", "etag", "unchanged")
+
+
+@dataclass
+class BenchmarkResult:
+    scenario: str
+    returncode: int
+    elapsed: float
+    requests: int
+    bytes_received: int
+    cpu_time: float
+    maxrss_kb: int
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes_received / self.elapsed / 1024**2 if self.elapsed else 0.0
+
+    @property
+    def cpu_ms_per_request(self) -> float:
+        return self.cpu_time * 1000 / self.requests if self.requests else 0.0
+
+
+def run_download(mock: MockRangeServer, scenario: str, data_path: str, args: argparse.Namespace) -> BenchmarkResult:
+    # fmt: off
+    command = [
+        "hibp-downloader",
+        "--data-path", data_path,
+        "download",
+        "--api-url", mock.url,
+        "--first-hash", "00000",
+        "--last-hash", f"{args.prefixes - 1:05x}",
+        "--hash-type", args.hash_type,
+        "--processes", str(args.processes),
+        "--schedule", args.schedule,
+    ]
+    # fmt: on
+    if scenario != "cold":
+        command += ["--local-cache-ttl", "0"]
+    if scenario == "unchanged":
+        mock.etag_generation += 1
+
+    mock.reset_stats()
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # the worker processes are children of the command process; their usage is included once they are reaped
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+
+    stats = mock.reset_stats()
+    return BenchmarkResult(
+        scenario=scenario,
+        returncode=os.waitstatus_to_exitcode(status),
+        elapsed=elapsed,
+        requests=stats["requests"],
+        bytes_received=stats["bytes_sent"],
+        cpu_time=usage.ru_utime + usage.ru_stime,
+        maxrss_kb=usage.ru_maxrss,
+    )
+
+
+def report(results: list[BenchmarkResult]) -> None:
+    print(
+        f"{'scenario':<10} {'rc':>3} {'seconds':>8} {'requests':>9} {'req/s':>8} {'MB/s':>7} "
+        f"{'cpu-ms/req':>11} {'peak-rss-MB':>12}"
+    )
+    for result in results:
+        print(
+            f"{result.scenario:<10} {result.returncode:>3} {result.elapsed:>8.2f} {result.requests:>9} "
+            f"{result.requests_per_second:>8.1f} {result.megabytes_per_second:>7.2f} "
+            f"{result.cpu_ms_per_request:>11.3f} {result.maxrss_kb / 1024:>12.1f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="hibp-downloader download throughput benchmark")
+    parser.add_argument("--prefixes", type=int, default=1024, help="number of prefixes from 00000 (max 1048576)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hash-type", default="sha1", choices=["sha1", "ntlm"])
+    parser.add_argument("--latency", type=float, default=0.02, help="mock server seconds added to each request")
+    parser.add_argument("--latency-jitter", type=float, default=0.005)
+    parser.add_argument("--schedule", default="sequential", choices=["sequential", "stalest", "largest"])
+    parser.add_argument("--scenarios", nargs="+", default=list(BENCHMARK_SCENARIOS), choices=BENCHMARK_SCENARIOS)
+    parser.add_argument("--data-path", default="", help="default is a temporary path that is removed afterwards")
+    args = parser.parse_args()
+    args.prefixes = min(max(1, args.prefixes), 16**5)
+
+    data_path = args.data_path or tempfile.mkdtemp(prefix="hibp-benchmark-")
+    results = []
+    try:
+        with MockRangeServer(latency=args.latency, latency_jitter=args.latency_jitter) as mock:
+            for scenario in args.scenarios:
+                results.append(run_download(mock, scenario, data_path, args))
+    finally:
+        if not args.data_path:
+            shutil.rmtree(data_path, ignore_errors=True)
+
+    print(
+        f"prefixes={args.prefixes} processes={args.processes} hash-type={args.hash_type} latency={args.latency}s "
+        f"schedule={args.schedule}"
+    )
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Resilience benchmark: download through the fault proxy (tests/helpers/fault_proxy.py) in front of the local mock
+range server, one fault scenario at a time, and report how throughput and failures hold up.
+
+For each scenario a fresh data path is downloaded and the report shows requests/s (as seen by the proxy), the
+faults injected, the failed-prefix count reported by the downloader and a check of the data files left on disk:
+every requested prefix should either have a valid data file or be reported as failed, never an invalid file.
+
+Run with: python -m tests.benchmarks.fault_benchmark --prefixes 512 --http-max-retries 3 --http-timeout 5
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from hibp_downloader.lib.filedata import BinaryEncodingVerifier, generate_filepath
+
+from ..helpers.fault_proxy import FaultProfile, FaultProxy
+from ..helpers.mock_range_server import MockRangeServer
+
+FAULT_SCENARIOS = {
+    "baseline": FaultProfile(),
+    "latency": FaultProfile(latency=0.05, latency_distribution="lognormal"),
+    "bandwidth": FaultProfile(latency=0.01, bandwidth=256 * 1024),
+    "reset": FaultProfile(reset_rate=0.05),
+    "goaway": FaultProfile(goaway_rate=0.1),
+    "throttle-429": FaultProfile(throttle_rate=0.05, throttle_status=429, retry_after=1),
+    "throttle-503": FaultProfile(throttle_rate=0.05, throttle_status=503, retry_after=1),
+    "truncate": FaultProfile(truncate_rate=0.05),
+    "corrupt-gzip": FaultProfile(corrupt_rate=0.02),
+    "degraded": FaultProfile(
+        latency=0.05,
+        latency_distribution="exponential",
+        reset_rate=0.02,
+        goaway_rate=0.02,
+        throttle_rate=0.02,
+        truncate_rate=0.02,
+        corrupt_rate=0.01,
+    ),
+}
+FAULT_STATS_KEYS = ("reset", "goaway_closed", "throttle_429", "throttle_503", "truncate", "corrupt")
+FAILED_PREFIXES_PATTERN = re.compile(r"Download completed with (\d+) failed prefixes")
+
+
+@dataclass
+class FaultBenchmarkResult:
+    scenario: str
+    returncode: int
+    elapsed: float
+    requests: int
+    faults: int
+    failed_prefixes: int
+    datafiles_valid: int
+    datafiles_invalid: int
+    datafiles_missing: int
+
+    @property
+    def requests_per_second(self) -> float:
+        return self.requests / self.elapsed if self.elapsed else 0.0
+
+
+def check_datafiles(data_path: str, hash_type: str, prefixes: int) -> tuple[int, int, int]:
+    """Return the (valid, invalid, missing) count of the data files for the prefix range on disk."""
+    valid = invalid = missing = 0
+    for index in range(prefixes):
+        filepath = generate_filepath(Path(data_path), hash_type, f"{index:05x}", "gz")
+        if not os.path.isfile(filepath):
+            missing += 1
+            continue
+        verifier = BinaryEncodingVerifier("gzip", check_lines=True)
+        with open(filepath, "rb") as f:
+            verifier.update(f.read())
+        if verifier.verified:
+            valid += 1
+        else:
+            invalid += 1
+    return valid, invalid, missing
+
+
+def run_scenario(
+    mock: MockRangeServer, scenario: str, profile: FaultProfile, args: argparse.Namespace
+) -> FaultBenchmarkResult:
+    data_path = tempfile.mkdtemp(prefix=f"hibp-fault-{scenario}-")
+    # fmt: off
+    command = [
+        "hibp-downloader",
+        "--data-path", data_path,
+        "download",
+        "--first-hash", "00000",
+        "--last-hash", f"{args.prefixes - 1:05x}",
+        "--hash-type", args.hash_type,
+        "--processes", str(args.processes),
+        "--http-max-retries", str(args.http_max_retries),
+        "--http-timeout", str(args.http_timeout),
+    ]
+    # fmt: on
+    try:
+        with FaultProxy(mock.url, profile) as proxy:
+            start = time.perf_counter()
+            process = subprocess.run(
+                [*command, "--api-url", proxy.url], capture_output=True, text=True, timeout=args.timeout, check=False
+            )
+            elapsed = time.perf_counter() - start
+            stats = proxy.reset_stats()
+        failed = FAILED_PREFIXES_PATTERN.search(process.stderr)
+        valid, invalid, missing = check_datafiles(data_path, args.hash_type, args.prefixes)
+    finally:
+        shutil.rmtree(data_path, ignore_errors=True)
+
+    return FaultBenchmarkResult(
+        scenario=scenario,
+        returncode=process.returncode,
+        elapsed=elapsed,
+        requests=stats["requests"],
+        faults=sum(stats[key] for key in FAULT_STATS_KEYS),
+        failed_prefixes=int(failed.group(1)) if failed else 0,
+        datafiles_valid=valid,
+        datafiles_invalid=invalid,
+        datafiles_missing=missing,
+    )
+
+
+def report(results: list[FaultBenchmarkResult]) -> None:
+    print(
+        f"{'scenario':<13} {'rc':>3} {'seconds':>8} {'requests':>9} {'req/s':>8} {'faults':>7} {'failed':>7} "
+        f"{'valid':>7} {'invalid':>8} {'missing':>8}"
+    )
+    for result in results:
+        print(
+            f"{result.scenario:<13} {result.returncode:>3} {result.elapsed:>8.2f} {result.requests:>9} "
+            f"{result.requests_per_second:>8.1f} {result.faults:>7} {result.failed_prefixes:>7} "
+            f"{result.datafiles_valid:>7} {result.datafiles_invalid:>8} {result.datafiles_missing:>8}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="hibp-downloader download resilience benchmark")
+    parser.add_argument("--prefixes", type=int, default=256, help="number of prefixes from 00000 (max 1048576)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hash-type", default="sha1", choices=["sha1", "ntlm"])
+    parser.add_argument("--http-max-retries", type=int, default=5)
+    parser.add_argument("--http-timeout", type=int, default=10)
+    parser.add_argument("--timeout", type=int, default=600, help="seconds allowed for each scenario download")
+    parser.add_argument("--scenarios", nargs="+", default=list(FAULT_SCENARIOS), choices=FAULT_SCENARIOS)
+    args = parser.parse_args()
+    args.prefixes = min(max(1, args.prefixes), 16**5)
+
+    results = []
+    with MockRangeServer(latency=0.01) as mock:
+        for scenario in args.scenarios:
+            results.append(run_scenario(mock, scenario, FAULT_SCENARIOS[scenario], args))
+
+    print(
+        f"prefixes={args.prefixes} processes={args.processes} hash-type={args.hash_type} "
+        f"http-max-retries={args.http_max_retries} http-timeout={args.http_timeout}"
+    )
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Storage backend benchmark: write, read and scan throughput of each `--storage` backend on the same synthetic dataset.
+
+The dataset is the gzip content the mock range server (tests/helpers/mock_range_server.py) serves for a fixed prefix
+range, built once in memory; each backend is then driven through its Datastore directly, as the download writer
+thread and the query, generate and validate commands do, so the numbers are those of the storage layout alone.
+
+Phases, run in order per backend:
+  write  write_many in batches of --batch-size (the download writer batch), into an empty store
+  read   read of every prefix in random order (eg query), on a newly opened store
+  scan   exists and read of every prefix in prefix order (eg validate and generate), on a newly opened store
+
+The files and pack backends use the --data-path (a temporary path by default, whose reads are mostly served from the
+page cache).  The s3 backend uses --s3-url with the endpoint and credentials of the AWS_* environment variables, eg
+a MinIO server, or else a local moto server (a dev dependency); moto runs in this process and is GIL-bound, so it
+shows the per-request overhead of the backend rather than the throughput of a real object store.
+
+Run with: python -m tests.benchmarks.storage_benchmark --prefixes 4096 --backends files pack s3
+"""
+
+import argparse
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import time
+from contextlib import ExitStack
+from dataclasses import dataclass
+
+from hibp_downloader.lib.datastore import datastore_open
+from hibp_downloader.lib.filedata import DatastoreItem
+from hibp_downloader.models import StorageBackend
+
+from ..helpers.mock_range_server import MockRangeServer
+
+
+@dataclass
+class BenchmarkResult:
+    backend: str
+    phase: str
+    elapsed: float
+    prefixes: int
+    bytes_total: int
+    errors: int
+
+    @property
+    def prefixes_per_second(self) -> float:
+        return self.prefixes / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def megabytes_per_second(self) -> float:
+        return self.bytes_total / self.elapsed / 1024**2 if self.elapsed else 0.0
+
+
+def synthetic_dataset(prefix_count: int, hash_type: str) -> dict[str, bytes]:
+    with MockRangeServer() as mock:
+        return {
+            prefix: gzip.compress(mock.range_body(prefix, ntlm=hash_type == "ntlm"), mtime=0)
+            for prefix in (f"{value:05X}" for value in range(prefix_count))
+        }
+
+
+def run_backend(
+    backend: StorageBackend, dataset: dict[str, bytes], data_path: str, storage_url: str, args: argparse.Namespace
+) -> list[BenchmarkResult]:
+    prefixes = list(dataset)
+    bytes_total = sum(len(content) for content in dataset.values())
+
+    def open_datastore():
+        return datastore_open(backend, data_path, args.hash_type, storage_url=storage_url)
+
+    results = []
+    with open_datastore() as datastore:
+        errors = 0
+        start = time.perf_counter()
+        for index in range(0, len(prefixes), args.batch_size):
+            batch = [DatastoreItem(prefix, dataset[prefix]) for prefix in prefixes[index : index + args.batch_size]]
+            errors += len(datastore.write_many(batch))
+        results.append(
+            BenchmarkResult(backend.value, "write", time.perf_counter() - start, len(prefixes), bytes_total, errors)
+        )
+
+    with open_datastore() as datastore:
+        shuffled = random.Random(args.hash_type).sample(prefixes, len(prefixes))
+        errors = 0
+        start = time.perf_counter()
+        for prefix in shuffled:
+            if datastore.read(prefix) != dataset[prefix]:
+                errors += 1
+        results.append(
+            BenchmarkResult(backend.value, "read", time.perf_counter() - start, len(prefixes), bytes_total, errors)
+        )
+
+    with open_datastore() as datastore:
+        errors = 0
+        start = time.perf_counter()
+        for prefix in prefixes:
+            if not datastore.exists(prefix) or datastore.read(prefix) != dataset[prefix]:
+                errors += 1
+        results.append(
+            BenchmarkResult(backend.value, "scan", time.perf_counter() - start, len(prefixes), bytes_total, errors)
+        )
+
+    return results
+
+
+def report(results: list[BenchmarkResult]) -> None:
+    print(f"{'backend':<8} {'phase':<6} {'seconds':>8} {'prefixes':>9} {'prefix/s':>9} {'MB/s':>8} {'errors':>7}")
+    for result in results:
+        print(
+            f"{result.backend:<8} {result.phase:<6} {result.elapsed:>8.2f} {result.prefixes:>9} "
+            f"{result.prefixes_per_second:>9.1f} {result.megabytes_per_second:>8.2f} {result.errors:>7}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="hibp-downloader storage backend benchmark")
+    parser.add_argument("--prefixes", type=int, default=4096, help="number of prefixes from 00000 (max 1048576)")
+    parser.add_argument("--hash-type", default="sha1", choices=["sha1", "ntlm"])
+    parser.add_argument("--batch-size", type=int, default=32, help="prefixes per write_many, as the download writer")
+    parser.add_argument(
+        "--backends", nargs="+", default=[backend.value for backend in StorageBackend], choices=list(StorageBackend)
+    )
+    parser.add_argument("--data-path", default="", help="default is a temporary path that is removed afterwards")
+    parser.add_argument("--s3-url", default="", help="eg s3://bucket/path; default is a local moto server")
+    args = parser.parse_args()
+    args.prefixes = min(max(1, args.prefixes), 16**5)
+    args.batch_size = max(1, args.batch_size)
+
+    dataset = synthetic_dataset(args.prefixes, args.hash_type)
+    results = []
+    with ExitStack() as stack:
+        for backend in map(StorageBackend, args.backends):
+            data_path = args.data_path or tempfile.mkdtemp(prefix="hibp-benchmark-")
+            if not args.data_path:
+                stack.callback(shutil.rmtree, data_path, ignore_errors=True)
+
+            storage_url = args.s3_url
+            if backend == StorageBackend.s3 and not storage_url:
+                from ..helpers.mock_object_store import MockObjectStore
+
+                store = stack.enter_context(MockObjectStore())
+                os.environ.update(store.env)
+                storage_url = f"{store.url}/benchmark"
+
+            results.extend(run_backend(backend, dataset, data_path, storage_url, args))
+
+    print(
+        f"prefixes={args.prefixes} hash-type={args.hash_type} batch-size={args.batch_size} "
+        f"dataset={sum(len(content) for content in dataset.values()) / 1024**2:.1f}MB"
+    )
+    report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Fault and latency injecting reverse proxy for the pwnedpasswords range API, for resilience tests and benchmarks.
+
+Point the downloader at the proxy with `--api-url`; requests are forwarded to the upstream (eg the mock range server
+in this package) and faults are injected per request according to a FaultProfile:
+
+  latency     added per request, constant or drawn from a uniform, exponential or lognormal distribution
+  bandwidth   response bodies are written at no more than this many bytes per second
+  reset       the connection is reset (TCP RST) before any response is sent
+  goaway      the connection is drained; it answers this request and then closes on the next one without a
+              response, the HTTP/1.1 equivalent of an HTTP/2 GOAWAY received with requests in flight
+  throttle    a 429 or 503 response with a `Retry-After` header, the upstream is not asked
+  truncate    the full Content-Length is announced but the connection closes half way through the body
+  corrupt     one byte in the middle of the response body is changed, the gzip CRC32 (or deflate stream) is broken
+
+Run standalone with: python -m tests.helpers.fault_proxy --upstream http://127.0.0.1:8765 --reset-rate 0.05
+"""
+
+import argparse
+import http.client
+import math
+import random
+import socket
+import struct
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+FAULT_PROXY_FORWARD_HEADERS = ("Accept-Encoding", "If-None-Match", "User-Agent")
+FAULT_PROXY_WRITE_SIZE = 16 * 1024
+FAULT_LATENCY_DISTRIBUTIONS = ("constant", "uniform", "exponential", "lognormal")
+
+
+@dataclass
+class FaultProfile:
+    """Per-request fault settings; rates are probabilities from 0 to 1, and faults are drawn independently."""
+
+    latency: float = 0.0
+    latency_distribution: str = "constant"
+    bandwidth: int = 0
+    reset_rate: float = 0.0
+    goaway_rate: float = 0.0
+    throttle_rate: float = 0.0
+    throttle_status: int = 429
+    retry_after: int | None = 1
+    truncate_rate: float = 0.0
+    corrupt_rate: float = 0.0
+
+
+class FaultProxy:
+    """Threaded HTTP/1.1 reverse proxy injecting the faults of a FaultProfile; the profile may be changed live.
+
+    Injected faults are counted in `stats` alongside `requests` and the upstream `status_<code>` of each response.
+    """
+
+    def __init__(
+        self,
+        upstream_url: str,
+        profile: FaultProfile | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: str = "hibp-downloader",
+    ):
+        self.upstream = urlsplit(upstream_url)
+        self.profile = profile or FaultProfile()
+        self.stats: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _FaultProxyRequestHandler)
+        self._server.daemon_threads = True
+        self._server.proxy = self  # type: ignore[attr-defined]
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "Self":
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[0:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fault-proxy", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def count(self, **values: int) -> None:
+        with self._lock:
+            self.stats.update(values)
+
+    def reset_stats(self) -> Counter[str]:
+        with self._lock:
+            stats, self.stats = self.stats, Counter()
+        return stats
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def request_latency(self) -> float:
+        mean, distribution = self.profile.latency, self.profile.latency_distribution
+        if mean <= 0 or distribution == "constant":
+            return max(0.0, mean)
+        with self._lock:
+            if distribution == "uniform":
+                return self._random.uniform(0, 2 * mean)
+            if distribution == "exponential":
+                return self._random.expovariate(1 / mean)
+            if distribution == "lognormal":
+                # sigma 1, with mu chosen so that the distribution mean is the configured latency
+                return self._random.lognormvariate(math.log(mean) - 0.5, 1.0)
+        raise ValueError(f"Unknown latency distribution {distribution!r}")
+
+
+class _FaultProxyRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Any
+
+    def setup(self) -> None:
+        super().setup()
+        self.draining = False
+        self.upstream_connection: http.client.HTTPConnection | None = None
+
+    def finish(self) -> None:
+        if self.upstream_connection:
+            self.upstream_connection.close()
+        super().finish()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        proxy: FaultProxy = self.server.proxy
+        profile = proxy.profile
+        proxy.count(requests=1)
+
+        if self.draining:
+            proxy.count(goaway_closed=1)
+            self.close_connection = True
+            return
+
+        latency = proxy.request_latency()
+        if latency:
+            time.sleep(latency)
+
+        if proxy.chance(profile.reset_rate):
+            proxy.count(reset=1)
+            self._reset_connection()
+            return
+
+        if proxy.chance(profile.throttle_rate):
+            proxy.count(**{f"throttle_{profile.throttle_status}": 1})
+            headers = {"Retry-After": str(profile.retry_after)} if profile.retry_after is not None else {}
+            self._send(profile.throttle_status, b"Too many requests, slow down", headers)
+            return
+
+        status, headers, body = self._forward()
+        proxy.count(**{f"status_{status}": 1})
+
+        if body and proxy.chance(profile.corrupt_rate):
+            proxy.count(corrupt=1)
+            middle = len(body) // 2
+            body = body[:middle] + bytes([body[middle] ^ 0xFF]) + body[middle + 1 :]
+
+        if body and proxy.chance(profile.truncate_rate):
+            proxy.count(truncate=1)
+            self._send(status, body, headers, body_limit=len(body) // 2)
+            self.close_connection = True
+            return
+
+        self._send(status, body, headers)
+        if proxy.chance(profile.goaway_rate):
+            proxy.count(goaway=1)
+            self.draining = True
+
+    def _forward(self) -> tuple[int, dict[str, str], bytes]:
+        proxy: FaultProxy = self.server.proxy
+        request_headers = {name: self.headers[name] for name in FAULT_PROXY_FORWARD_HEADERS if name in self.headers}
+        for _ in range(2):
+            if self.upstream_connection is None:
+                self.upstream_connection = http.client.HTTPConnection(
+                    proxy.upstream.hostname or "127.0.0.1", proxy.upstream.port, timeout=60
+                )
+            try:
+                self.upstream_connection.request(
+                    "GET", f"{proxy.upstream.path.rstrip('/')}{self.path}", None, request_headers
+                )
+                response = self.upstream_connection.getresponse()
+                body = response.read()
+            except (OSError, http.client.HTTPException):
+                # an idle upstream keep-alive connection may have been closed; reconnect once
+                self.upstream_connection.close()
+                self.upstream_connection = None
+                continue
+            headers = {
+                name: value
+                for name, value in response.getheaders()
+                if name.lower()
+                not in ("content-length", "connection", "keep-alive", "transfer-encoding", "server", "date")
+            }
+            return response.status, headers, body
+        return 502, {}, b"Upstream request failed"
+
+    def _send(self, status: int, body: bytes, headers: dict[str, str], body_limit: int | None = None) -> None:
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        body = body[:body_limit] if body_limit is not None else body
+        bandwidth = self.server.proxy.profile.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+        for offset in range(0, len(body), FAULT_PROXY_WRITE_SIZE):
+            part = body[offset : offset + FAULT_PROXY_WRITE_SIZE]
+            self.wfile.write(part)
+            time.sleep(len(part) / bandwidth)
+
+    def _reset_connection(self) -> None:
+        # SO_LINGER with a zero timeout makes close() send a TCP RST rather than a FIN
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        self.connection.close()
+        self.close_connection = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fault and latency injecting proxy for the pwnedpasswords range API")
+    parser.add_argument("--upstream", default="http://127.0.0.1:8765", help="eg the mock range server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8770)
+    for field in fields(FaultProfile):
+        option = f"--{field.name.replace('_', '-')}"
+        if field.name == "latency_distribution":
+            parser.add_argument(option, default=field.default, choices=FAULT_LATENCY_DISTRIBUTIONS)
+        elif field.name == "retry_after":
+            parser.add_argument(option, type=int, default=field.default)
+        else:
+            parser.add_argument(option, type=type(field.default), default=field.default)
+    args = parser.parse_args()
+
+    profile = FaultProfile(**{field.name: getattr(args, field.name) for field in fields(FaultProfile)})
+    proxy = FaultProxy(args.upstream, profile, host=args.host, port=args.port)
+    print(f"Serving fault proxy for {args.upstream} on {proxy.url} with {profile}")
+    proxy.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Local S3-compatible object store for offline tests and benchmarks of the s3 storage backend: the moto server (a dev
+dependency) on a free local port, with one bucket created.
+
+The `env` property holds the AWS_* environment variables that point boto3 (and so `hibp-downloader --storage s3`) at
+the store, eg exec_command(..., env=store.env).
+"""
+
+import logging
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+MOCK_OBJECT_STORE_ENV = {
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_DEFAULT_REGION": "us-east-1",
+}
+
+
+class MockObjectStore:
+    """Threaded moto server holding the `bucket`; use as a context manager or via start() and stop()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, bucket: str = "hibp-downloader"):
+        from moto.server import ThreadedMotoServer
+
+        self.bucket = bucket
+        self._server = ThreadedMotoServer(ip_address=host, port=port, verbose=False)
+
+    def __enter__(self) -> "Self":
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    @property
+    def endpoint_url(self) -> str:
+        host, port = self._server.get_host_and_port()
+        return f"http://{host}:{port}"
+
+    @property
+    def url(self) -> str:
+        return f"s3://{self.bucket}"
+
+    @property
+    def env(self) -> dict[str, str]:
+        return {**MOCK_OBJECT_STORE_ENV, "AWS_ENDPOINT_URL": self.endpoint_url}
+
+    def start(self) -> None:
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)  # the request log of the moto server
+        self._server.start()
+        self.client().create_bucket(Bucket=self.bucket)
+
+    def stop(self) -> None:
+        self._server.stop()
+
+    def client(self) -> Any:
+        import boto3
+
+        return boto3.client(
+            "s3",
+            endpoint_url=self.endpoint_url,
+            aws_access_key_id=MOCK_OBJECT_STORE_ENV["AWS_ACCESS_KEY_ID"],
+            aws_secret_access_key=MOCK_OBJECT_STORE_ENV["AWS_SECRET_ACCESS_KEY"],
+            region_name=MOCK_OBJECT_STORE_ENV["AWS_DEFAULT_REGION"],
+        )
+
+    def keys(self, prefix: str = "") -> list[str]:
+        paginator = self.client().get_paginator("list_objects_v2")
+        return [
+            item["Key"]
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix)
+            for item in page.get("Contents", [])
+        ]
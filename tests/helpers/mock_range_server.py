@@ -0,0 +1,212 @@
+"""
+Local mock of the pwnedpasswords `/range/{prefix}` API for offline tests and benchmarks.
+
+Bodies are synthetic but deterministic per (seed, hash-mode, prefix, content-generation) and follow the shape of the
+real API: uppercase hex hash-suffixes with a count, CRLF separated, about 900 lines per prefix, gzip or identity
+encoded according to the request Accept-Encoding.  ETag/If-None-Match (304), Last-Modified, `cf-cache-status` and
+`?mode=ntlm` are supported, with configurable per-request latency.
+
+Run standalone with: python -m tests.helpers.mock_range_server --port 8765 --latency 0.02
+"""
+
+import argparse
+import functools
+import gzip
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from typing_extensions import Self
+
+RANGE_PATH_PATTERN = re.compile(r"^/range/([0-9A-Fa-f]{5})$")
+RANGE_LAST_MODIFIED = 1700000000  # fixed, so that content-unchanged responses are byte-identical
+RANGE_BODY_CACHE_SIZE = 4096
+
+
+class MockRangeServer:
+    """Threaded HTTP/1.1 server emulating `/range/{prefix}`; use as a context manager or via start() and stop().
+
+    Set `etag_generation` to hand out new ETags for the same content, or `content_generation` to change content;
+    `header_overrides` replaces (or adds) response headers per prefix, eg to send a malformed `Last-Modified`.
+    The server runs in a thread of the calling process and is GIL-bound, so it tops out at a few thousand requests
+    per second; that is well above what a single test or benchmark process needs.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        latency_jitter: float = 0.0,
+        cache_hit_ratio: float = 0.9,
+        lines_mean: int = 900,
+        seed: str = "hibp-downloader",
+    ):
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.cache_hit_ratio = cache_hit_ratio
+        self.lines_mean = lines_mean
+        self.seed = seed
+        self.etag_generation = 0
+        self.content_generation = 0
+        self.header_overrides: dict[str, dict[str, str]] = {}
+
+        self.stats: Counter[str] = Counter()
+        self._stats_lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _MockRangeRequestHandler)
+        self._server.daemon_threads = True
+        self._server.mock = self  # type: ignore[attr-defined]
+        self._thread: threading.Thread | None = None
+
+    def __enter__(self) -> "Self":
+        self.start()
+        return self
+
+    def __exit__(self, *_: object) -> None:
+        self.stop()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[0:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-range-server", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def count(self, **values: int) -> None:
+        with self._stats_lock:
+            self.stats.update(values)
+
+    def reset_stats(self) -> Counter[str]:
+        with self._stats_lock:
+            stats, self.stats = self.stats, Counter()
+        return stats
+
+    def range_body(self, prefix: str, ntlm: bool = False) -> bytes:
+        return _range_body(self.seed, prefix.upper(), ntlm, self.content_generation, self.lines_mean)
+
+    def range_etag(self, prefix: str, ntlm: bool = False) -> str:
+        content_hash = hashlib.md5(self.range_body(prefix, ntlm), usedforsecurity=False).hexdigest()
+        digest = hashlib.md5(f"{self.etag_generation}:{content_hash}".encode(), usedforsecurity=False).hexdigest()
+        return f'W/"0x{digest[0:15].upper()}"'
+
+    def cache_status(self, prefix: str) -> str:
+        return "HIT" if random.Random(f"{self.seed}:cache:{prefix}").random() < self.cache_hit_ratio else "MISS"
+
+    def request_latency(self) -> float:
+        if self.latency_jitter:
+            return max(0.0, self.latency + random.uniform(-self.latency_jitter, self.latency_jitter))
+        return self.latency
+
+
+@functools.lru_cache(maxsize=RANGE_BODY_CACHE_SIZE)
+def _range_body(seed: str, prefix: str, ntlm: bool, content_generation: int, lines_mean: int) -> bytes:
+    rand = random.Random(f"{seed}:{'ntlm' if ntlm else 'sha1'}:{prefix}:{content_generation}")
+    suffix_length = 27 if ntlm else 35
+    line_count = max(1, int(rand.gauss(lines_mean, lines_mean**0.5)))
+
+    suffixes = sorted({f"{rand.getrandbits(suffix_length * 4):0{suffix_length}X}" for _ in range(line_count)})
+    # counts are heavy-tailed; most hashes are seen a few times and a few are seen very many times
+    return "\r\n".join(f"{suffix}:{min(int(rand.paretovariate(1.1)), 50000000)}" for suffix in suffixes).encode()
+
+
+@functools.lru_cache(maxsize=RANGE_BODY_CACHE_SIZE)
+def _gzip_body(body: bytes) -> bytes:
+    return gzip.compress(body, mtime=0)
+
+
+class _MockRangeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: Any
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        mock: MockRangeServer = self.server.mock
+        path, _, query = self.path.partition("?")
+        match = RANGE_PATH_PATTERN.match(path)
+        if not match:
+            self._send(400, b"The hash prefix was not in a valid format")
+            mock.count(requests=1, status_400=1)
+            return
+
+        latency = mock.request_latency()
+        if latency:
+            time.sleep(latency)
+
+        prefix = match.group(1).upper()
+        ntlm = "mode=ntlm" in query
+        etag = mock.range_etag(prefix, ntlm)
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(RANGE_LAST_MODIFIED, usegmt=True),
+            "Cache-Control": "public, max-age=2678400",
+            "cf-cache-status": mock.cache_status(prefix),
+            **mock.header_overrides.get(prefix, {}),
+        }
+
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, b"", headers)
+            mock.count(requests=1, status_304=1)
+            return
+
+        body = mock.range_body(prefix, ntlm)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = _gzip_body(body)
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, headers)
+        mock.count(requests=1, status_200=1, bytes_sent=len(body))
+
+    def _send(self, status: int, body: bytes, headers: dict[str, str] | None = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local mock of the pwnedpasswords /range/{prefix} API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to each request")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="uniform +/- seconds around --latency")
+    parser.add_argument("--cache-hit-ratio", type=float, default=0.9, help="share of cf-cache-status HIT responses")
+    parser.add_argument("--etag-generation", type=int, default=0, help="change to issue new ETags for same content")
+    args = parser.parse_args()
+
+    mock = MockRangeServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        cache_hit_ratio=args.cache_hit_ratio,
+    )
+    mock.etag_generation = args.etag_generation
+    print(f"Serving mock pwnedpasswords range API on {mock.url}")
+    mock.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
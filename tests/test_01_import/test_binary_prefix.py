@@ -0,0 +1,115 @@
+import gzip
+import random
+
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.binary_prefix import (
+    BINARY_PREFIX_HEADER,
+    BinaryPrefix,
+    binary_prefix_encode,
+    binary_prefix_transcode,
+    binary_prefix_verify,
+    is_binary_prefix,
+)
+from hibp_downloader.lib.filedata import datafile_content_checksum, datafile_decode, verify_binary_encoding
+from hibp_downloader.lib.hashing import hashed_sha256
+
+
+def _range_lines(suffix_length: int, line_count: int = 300) -> bytes:
+    rand = random.Random(suffix_length)
+    suffixes = sorted({f"{rand.getrandbits(suffix_length * 4):0{suffix_length}X}" for _ in range(line_count)})
+    counts = [1, 127, 128, 16383, 16384, 50000000]
+    return "\r\n".join(f"{suffix}:{counts[index % len(counts)]}" for index, suffix in enumerate(suffixes)).encode()
+
+
+def test_binary_prefix_transcode():
+    for suffix_length in (35, 27):  # sha1, ntlm
+        lines = _range_lines(suffix_length)
+        content = gzip.compress(lines, mtime=0)
+        data = binary_prefix_transcode("0a0b0", content, hashed_sha256(content))
+
+        assert is_binary_prefix(data)
+        assert binary_prefix_verify(data)
+        assert len(data) < len(content)
+
+        binary_prefix = BinaryPrefix(data)
+        assert binary_prefix.suffix_length == suffix_length
+        assert binary_prefix.record_count == len(lines.split())
+        assert binary_prefix.content_checksum == hashed_sha256(content)
+        assert binary_prefix.lines() == lines.decode().split()
+        assert binary_prefix.lines("0a0b0")[0] == f"0A0B0{lines.decode().split()[0]}"
+
+        # identity content transcodes to the same records
+        assert (
+            BinaryPrefix(binary_prefix_transcode("0a0b0", lines, hashed_sha256(lines))).lines() == binary_prefix.lines()
+        )
+
+
+def test_binary_prefix_count():
+    lines = _range_lines(35).decode().split()
+    binary_prefix = BinaryPrefix(binary_prefix_encode("\n".join(lines).encode(), "00" * 32))
+
+    for line in lines:
+        suffix, _, count = line.partition(":")
+        assert binary_prefix.count(suffix.lower()) == int(count)
+    assert binary_prefix.find(lines[0].partition(":")[0]) == 0
+    assert binary_prefix.count("0" * 35) is None
+    assert binary_prefix.count("F" * 35) is None
+    assert binary_prefix.count("ABC") is None
+
+    empty = BinaryPrefix(binary_prefix_encode(b"", "00" * 32))
+    assert empty.record_count == 0
+    assert empty.count("0" * 35) is None
+    assert binary_prefix_verify(empty.data)
+
+
+def test_binary_prefix_invalid():
+    lines = _range_lines(35)
+    content = gzip.compress(lines, mtime=0)
+    data = binary_prefix_transcode("0a0b0", content, hashed_sha256(content))
+
+    for invalid in (
+        data[:-1],
+        data[: BINARY_PREFIX_HEADER.size - 1],
+        b"HPB2" + data[4:],
+        data[:-1] + b"\x80",
+    ):
+        assert not binary_prefix_verify(invalid)
+    assert not verify_binary_encoding(data[:-1], "binary")
+    assert verify_binary_encoding(data, "binary")
+
+    # suffixes out of order
+    swapped = bytearray(data)
+    first = BINARY_PREFIX_HEADER.size
+    swapped[first : first + 8] = b"\xff" * 8
+    assert not binary_prefix_verify(swapped)
+
+    try:
+        binary_prefix_transcode("0a0b0", content, hashed_sha256(lines))
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+
+    try:
+        binary_prefix_transcode("0a0b0", b"ABC:1\r\nAB:2", hashed_sha256(b"ABC:1\r\nAB:2"))
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+
+    try:
+        BinaryPrefix(content)
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+
+
+def test_binary_prefix_datafile():
+    lines = _range_lines(35)
+    content = gzip.compress(lines, mtime=0)
+    data = binary_prefix_transcode("0a0b0", content, hashed_sha256(content))
+
+    assert datafile_decode(data, "0a0b0", decompression_type="gzip") == lines.decode()
+    assert datafile_decode(data, "0a0b0", prepend_prefix=True) == datafile_decode(
+        content, "0a0b0", decompression_type="gzip", prepend_prefix=True
+    )
+    assert datafile_content_checksum(data) == hashed_sha256(content)
+    assert datafile_content_checksum(content) == hashed_sha256(content)
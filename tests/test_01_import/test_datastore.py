@@ -0,0 +1,228 @@
+import asyncio
+import gzip
+import os
+
+import pytest
+
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.datastore import (
+    PACK_DIRNAME,
+    Datastore,
+    FilesDatastore,
+    PackDatastore,
+    S3Datastore,
+    datastore_open,
+)
+from hibp_downloader.lib.filedata import DatafileWriter, DatastoreItem, datafile_decode
+from hibp_downloader.models import StorageBackend
+
+
+def _content(prefix: str, count: int = 1) -> bytes:
+    return gzip.compress(f"{prefix.upper()}{'0' * 30}:{count}\r\n".encode() * 100, mtime=0)
+
+
+def test_datastore_open(tmp_path):
+    with datastore_open(StorageBackend.files, tmp_path, "sha1") as datastore:
+        assert isinstance(datastore, FilesDatastore)
+    with datastore_open(StorageBackend.pack, tmp_path, "sha1") as datastore:
+        assert isinstance(datastore, PackDatastore)
+
+    try:
+        datastore_open(StorageBackend.s3, tmp_path, "sha1", storage_url=str(tmp_path))
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+
+    # a storage backend that does not implement the whole interface fails when it is created
+    class IncompleteDatastore(Datastore):
+        def location(self, prefix: str) -> str:
+            return prefix
+
+    try:
+        IncompleteDatastore("sha1")  # type: ignore[abstract]
+        raise AssertionError("TypeError not raised")
+    except TypeError:
+        pass
+
+
+def test_datastore_temp_files(tmp_path):
+    # content streamed to the temporary file of a prefix is moved (files) or copied (pack) into place, and removed
+    for storage in (StorageBackend.files, StorageBackend.pack):
+        with datastore_open(storage, tmp_path, "sha1") as datastore:
+            items = []
+            for prefix in ("00000", "0a0b0"):
+                temp_filepath = datastore.temp_filepath(prefix)
+                os.makedirs(temp_filepath.parent, exist_ok=True)
+                temp_filepath.write_bytes(_content(prefix))
+                items.append(DatastoreItem(prefix, filepath=temp_filepath))
+            items.append(DatastoreItem("00001", filepath=tmp_path / "missing.tmp"))
+
+            assert list(datastore.write_many(items, sync=True)) == [2]
+            assert datastore.read("00000") == _content("00000")
+            assert datastore.read("0a0b0") == _content("0a0b0")
+            assert not datastore.exists("00001")
+            assert not any(item.filepath.exists() for item in items)
+
+
+def test_pack_datastore(tmp_path):
+    prefixes = ["00000", "00001", "0a0b0", "fffff"]
+
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        assert not datastore.exists("00000")
+        assert datastore.write_many([DatastoreItem(prefix, _content(prefix)) for prefix in prefixes], sync=True) == {}
+        assert all(datastore.exists(prefix) for prefix in prefixes)
+        assert not datastore.exists("00002")
+        assert datastore.read("0a0b0") == _content("0a0b0")
+        assert datafile_decode(datastore.read("fffff"), "fffff", decompression_type="gzip").startswith("FFFFF0")
+
+        try:
+            datastore.read("00002")
+            raise AssertionError("HibpDownloaderException not raised")
+        except HibpDownloaderException:
+            pass
+
+    # a second writer (eg the next run) appends to a pack file of its own
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        assert datastore.read("00001") == _content("00001")
+        assert datastore.write_many([DatastoreItem("00001", _content("00001", count=2))]) == {}
+        assert datastore.read("00001") == _content("00001", count=2)
+        assert datastore.delete("00000")
+        assert not datastore.delete("00000")
+        assert len(datastore.pack_numbers()) == 2
+
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        assert not datastore.exists("00000")
+        assert datastore.read("00001") == _content("00001", count=2)
+        assert sorted(os.listdir(tmp_path / "sha1" / PACK_DIRNAME)) == ["000001.pack", "000002.pack", "index", "lock"]
+
+
+def test_pack_datastore_compact(tmp_path):
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        for count in range(1, 4):
+            items = [DatastoreItem(f"{value:05x}", _content(f"{value:05x}", count)) for value in range(32)]
+            assert datastore.write_many(items) == {}
+        datastore.delete("0001f")
+
+    datastore = PackDatastore(tmp_path, "sha1")
+    try:
+        stats = datastore.compact()
+    finally:
+        datastore.close()
+    assert stats.prefix_count == 31
+    assert stats.pack_count_before == 1
+    assert stats.pack_count_after == 1
+    assert stats.bytes_after < stats.bytes_before / 3
+
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        assert all(datastore.read(f"{value:05x}") == _content(f"{value:05x}", 3) for value in range(31))
+        assert not datastore.exists("0001f")
+        assert datastore.pack_numbers() == [2]
+
+        # a compact is refused while a writer holds the store
+        datastore.write_many([DatastoreItem("0001f", _content("0001f"))])
+        compacting = PackDatastore(tmp_path, "sha1")
+        try:
+            compacting.compact()
+            raise AssertionError("HibpDownloaderException not raised")
+        except HibpDownloaderException:
+            pass
+        finally:
+            compacting.close()
+
+
+def test_pack_datastore_damaged_record(tmp_path):
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        datastore.write_many([DatastoreItem("00000", _content("00000")), DatastoreItem("00001", _content("00001"))])
+        pack_filepath = datastore.pack_filepath(1)
+
+    # the record header of the first prefix is overwritten
+    with open(pack_filepath, "r+b") as f:
+        f.write(b"\0" * 8)
+
+    with PackDatastore(tmp_path, "sha1") as datastore:
+        assert datastore.read("00001") == _content("00001")
+        try:
+            datastore.read("00000")
+            raise AssertionError("HibpDownloaderException not raised")
+        except HibpDownloaderException:
+            pass
+
+
+def test_s3_datastore(monkeypatch):
+    moto = pytest.importorskip("moto")
+    import boto3
+
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+
+    with moto.mock_aws():
+        boto3.client("s3").create_bucket(Bucket="hibp")
+        prefixes = [f"{value:05x}" for value in range(32)] + ["0a0b0"]
+
+        with datastore_open(StorageBackend.s3, "", "sha1", storage_url="s3://hibp/store/") as datastore:
+            assert isinstance(datastore, S3Datastore)
+            assert datastore.location("0A0B0") == "s3://hibp/store/sha1/0a/0b/0a0b0.gz"
+            assert not datastore.exists("00000")
+            assert datastore.write_many([DatastoreItem(prefix, _content(prefix)) for prefix in prefixes]) == {}
+            assert all(datastore.exists(prefix) for prefix in prefixes)
+            assert not datastore.exists("00021")
+            assert datastore.read("0a0b0") == _content("0a0b0")
+
+            temp_filepath = datastore.temp_filepath("00020")
+            os.makedirs(temp_filepath.parent, exist_ok=True)
+            temp_filepath.write_bytes(_content("00020"))
+            assert datastore.write_many([DatastoreItem("00020", filepath=temp_filepath)]) == {}
+            assert datastore.read("00020") == _content("00020")
+            assert not temp_filepath.exists()
+
+            assert datastore.delete("00001")
+            assert not datastore.delete("00001")
+
+            try:
+                datastore.read("00001")
+                raise AssertionError("HibpDownloaderException not raised")
+            except HibpDownloaderException:
+                pass
+
+        # the objects are keyed as the files layout
+        keys = boto3.client("s3").list_objects_v2(Bucket="hibp", Prefix="store/sha1/00/00/")["Contents"]
+        assert len(keys) == 15
+        assert keys[0]["Key"] == "store/sha1/00/00/00000.gz"
+
+        # a write to a missing bucket completes with an error for each item
+        with S3Datastore("s3://missing", "sha1") as datastore:
+            errors = datastore.write_many([DatastoreItem("00000", _content("00000"))])
+            assert list(errors) == [0]
+
+        # any other error from the client propagates, after the temporary files are removed; the datafile writer
+        # fails the write of the prefix with it rather than ending its thread
+        def put_object(**_):
+            raise RuntimeError("unexpected")
+
+        with S3Datastore("s3://hibp/store/", "sha1") as datastore:
+            monkeypatch.setattr(datastore._client, "put_object", put_object)
+            temp_filepath = datastore.temp_filepath("00021")
+            temp_filepath.write_bytes(_content("00021"))
+            try:
+                datastore.write_many([DatastoreItem("00021", filepath=temp_filepath)])
+                raise AssertionError("RuntimeError not raised")
+            except RuntimeError:
+                pass
+            assert not temp_filepath.exists()
+
+            async def write() -> None:
+                datafile_writer = DatafileWriter(datastore)
+                datafile_writer.start()
+                try:
+                    await asyncio.wait_for(await datafile_writer.submit("00021", _content("00021")), timeout=10)
+                finally:
+                    datafile_writer.close()
+
+            try:
+                asyncio.run(write())
+                raise AssertionError("HibpDownloaderException not raised")
+            except HibpDownloaderException:
+                pass
+            assert not datastore.exists("00021")
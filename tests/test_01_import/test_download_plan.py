@@ -0,0 +1,158 @@
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from hibp_downloader.commands.hibp_download import pending_metadata_resolve, plan_worker_tasks, prefixes_file_read
+from hibp_downloader.lib.filedata import generate_filepath
+from hibp_downloader.lib.hashing import hashed_sha256
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import (
+    DownloadSchedule,
+    HashType,
+    PrefixMetadata,
+    PrefixMetadataDataSource,
+    PrefixWorkItem,
+    WorkerArgs,
+)
+
+
+def _worker_args(tmp_path: Path, local_cache_ttl: int = 3600, ignore_etag: bool = False) -> WorkerArgs:
+    return WorkerArgs(
+        hash_type=HashType.sha1,
+        data_path=tmp_path,
+        metadata_path=tmp_path,
+        encoding_type="gzip",
+        http_timeout=30,
+        http_max_retries=5,
+        http_proxy="",
+        http_certificates="",
+        http_debug=False,
+        api_url="https://api.pwnedpasswords.com",
+        ignore_etag=ignore_etag,
+        local_cache_ttl=local_cache_ttl,
+    )
+
+
+def _save_prefix(
+    metadata_store: MetadataStore, tmp_path: Path, prefix: str, age: int, datafile: bool = True, size: int = 0
+) -> None:
+    metadata_store.save_many(
+        [
+            PrefixMetadata(
+                prefix=prefix,
+                bytes=size,
+                etag=f"etag-{prefix}",
+                content_checksum=f"checksum-{prefix}",
+                server_timestamp=datetime.now().astimezone() - timedelta(seconds=age),
+                data_source=PrefixMetadataDataSource.remote_source_remote_cache,
+            )
+        ]
+    )
+    if datafile:
+        filepath = generate_filepath(tmp_path, "sha1", prefix, "gz")
+        os.makedirs(filepath.parent, exist_ok=True)
+        filepath.write_bytes(b"data")
+
+
+def test_plan_worker_tasks(tmp_path: Path):
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        _save_prefix(metadata_store, tmp_path, "00000", age=60)  # within ttl
+        _save_prefix(metadata_store, tmp_path, "00001", age=7200)  # expired ttl
+        _save_prefix(metadata_store, tmp_path, "00002", age=60, datafile=False)  # data file missing
+
+        work_items, local_cache_count = plan_worker_tasks(metadata_store, _worker_args(tmp_path), "00000", "00003")
+        assert local_cache_count == 1
+        assert work_items == [
+            PrefixWorkItem(prefix="00001", etag="etag-00001", content_checksum="checksum-00001"),
+            PrefixWorkItem(prefix="00002"),
+            PrefixWorkItem(prefix="00003"),
+        ]
+
+        work_items, local_cache_count = plan_worker_tasks(
+            metadata_store, _worker_args(tmp_path, local_cache_ttl=0, ignore_etag=True), "00000", "00003"
+        )
+        assert local_cache_count == 0
+        assert [x.etag for x in work_items] == [None, None, None, None]
+        assert [x.content_checksum for x in work_items] == [None, None, None, None]
+
+
+def test_plan_worker_tasks_prefixes(tmp_path: Path):
+    prefixes_file = tmp_path / "failed-prefixes.txt"
+    prefixes_file.write_text("# failed prefixes\n00fff\n\n00001\n00ABC  # comment\n00001\n")
+    prefixes = prefixes_file_read(prefixes_file)
+    assert prefixes == ["00001", "00abc", "00fff"]
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        _save_prefix(metadata_store, tmp_path, "00001", age=7200)  # expired ttl
+        _save_prefix(metadata_store, tmp_path, "00002", age=7200)  # not listed
+
+        work_items, local_cache_count = plan_worker_tasks(
+            metadata_store, _worker_args(tmp_path), "00000", "fffff", prefixes=prefixes
+        )
+        assert local_cache_count == 0
+        assert work_items == [
+            PrefixWorkItem(prefix="00001", etag="etag-00001", content_checksum="checksum-00001"),
+            PrefixWorkItem(prefix="00abc"),
+            PrefixWorkItem(prefix="00fff"),
+        ]
+
+
+def test_plan_worker_tasks_stalest(tmp_path: Path):
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        _save_prefix(metadata_store, tmp_path, "00000", age=9000)
+        _save_prefix(metadata_store, tmp_path, "00001", age=60)  # within ttl
+        _save_prefix(metadata_store, tmp_path, "00002", age=8000)
+        _save_prefix(metadata_store, tmp_path, "00004", age=20000)
+        _save_prefix(metadata_store, tmp_path, "00005", age=7200, datafile=False)  # data file missing
+
+        work_items, local_cache_count = plan_worker_tasks(
+            metadata_store, _worker_args(tmp_path), "00000", "00005", schedule=DownloadSchedule.stalest
+        )
+        assert local_cache_count == 1
+        assert [x.prefix for x in work_items] == ["00003", "00005", "00004", "00000", "00002"]
+
+
+def test_plan_worker_tasks_largest(tmp_path: Path):
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        # without any sizes, the prefix order is kept
+        work_items, _ = plan_worker_tasks(
+            metadata_store, _worker_args(tmp_path), "00000", "00003", schedule=DownloadSchedule.largest
+        )
+        assert [x.prefix for x in work_items] == ["00000", "00001", "00002", "00003"]
+
+        _save_prefix(metadata_store, tmp_path, "00000", age=7200, size=100)
+        _save_prefix(metadata_store, tmp_path, "00001", age=7200, size=300)
+        _save_prefix(metadata_store, tmp_path, "00003", age=7200, size=200)
+
+        # largest first; 00002 is of unknown size, taken as the mean (200)
+        work_items, _ = plan_worker_tasks(
+            metadata_store, _worker_args(tmp_path), "00000", "00003", schedule=DownloadSchedule.largest
+        )
+        assert [x.prefix for x in work_items] == ["00001", "00002", "00003", "00000"]
+
+
+def test_pending_metadata_resolve(tmp_path: Path):
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        assert pending_metadata_resolve(metadata_store, _worker_args(tmp_path)) == 0
+
+        # data files with the earlier content, each described by its existing metadata
+        for prefix in ("00000", "00001", "00002"):
+            _save_prefix(metadata_store, tmp_path, prefix, age=7200)
+            metadata_store.save_many(
+                [PrefixMetadata(prefix=prefix, etag=f"etag-{prefix}", content_checksum=hashed_sha256(b"data"))]
+            )
+        metadata_store.save_pending(
+            PrefixMetadata(prefix=prefix, etag="etag-new", content_checksum=hashed_sha256(b"new data"))
+            for prefix in ("00000", "00001", "00002", "00003")
+        )
+
+        # 00000 was written; 00001 was not; 00002 was cut short; 00003 (a new prefix) was not
+        generate_filepath(tmp_path, "sha1", "00000", "gz").write_bytes(b"new data")
+        generate_filepath(tmp_path, "sha1", "00002", "gz").write_bytes(b"new")
+
+        assert pending_metadata_resolve(metadata_store, _worker_args(tmp_path)) == 3
+        assert metadata_store.load_pending() == []
+        metadata = metadata_store.load_many(["00000", "00001", "00002", "00003"])
+        assert sorted(metadata) == ["00000", "00001"]
+        assert metadata["00000"].etag == "etag-new"
+        assert metadata["00001"].etag == "etag-00001"
@@ -1,7 +1,20 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import formatdate
 from pathlib import Path
 from hibp_downloader.lib.hashing import hashed_sha1, hashed_ntlm, hashed_sha256
 from hibp_downloader.lib.generators import hex_sequence, iterable_chunker
 from hibp_downloader.lib.filedata import generate_filepath, encoding_type_file_suffix
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.circuit_breaker import CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, SharedCircuitBreaker
+from hibp_downloader.lib import concurrency as concurrency_module
+from hibp_downloader.lib.concurrency import AdaptiveConcurrencyLimit, EventLoopLagMonitor, RetryBackoff
+from hibp_downloader.lib.http import HTTP_RETRY_AFTER_MAX, parse_http_date, parse_retry_after
+from hibp_downloader.lib.rate_limit import SharedTokenBucket
+from hibp_downloader.lib.run_journal import RunJournal
+from hibp_downloader.lib.work_distributor import SharedWorkDistributor
+from hibp_downloader.models import PrefixMetadata, PrefixMetadataDataSource, QueueItemStats, QueueItemStatsCompute
 
 
 def test_hashing_sha1():
@@ -62,3 +75,253 @@ def test_encoding_type_file_suffix():
     assert encoding_type_file_suffix("identity") == "txt"
     assert encoding_type_file_suffix(None) == "txt"
     assert encoding_type_file_suffix("br") == "br"
+
+
+def test_shared_work_distributor():
+    work_distributor = SharedWorkDistributor(work_items=list(range(100)), worker_count=2)
+
+    # claims are bounded by max_size while plenty of work remains
+    assert work_distributor.claim(max_size=8) == list(range(8))
+
+    # claims shrink as the remaining work runs down, and every item is claimed exactly once
+    claimed = list(range(8))
+    while True:
+        items = work_distributor.claim(max_size=64)
+        if not items:
+            break
+        assert len(items) <= max(1, (100 - len(claimed)) // 4)
+        claimed.extend(items)
+
+    assert claimed == list(range(100))
+    assert work_distributor.claimed_count == 100
+
+    # once stopped, no more work is handed out
+    work_distributor = SharedWorkDistributor(work_items=list(range(100)), worker_count=2)
+    assert work_distributor.claim(max_size=8) == list(range(8))
+    work_distributor.stop()
+    assert work_distributor.stopped
+    assert work_distributor.claim(max_size=8) == []
+
+
+def test_queue_item_stats_record():
+    results = [
+        PrefixMetadata(prefix="0000a", bytes=100, data_source=PrefixMetadataDataSource.remote_source_remote_cache),
+        PrefixMetadata(prefix="0000b", data_source=PrefixMetadataDataSource.unknown_source_status),
+        PrefixMetadata(prefix="0000c", bytes=50, data_source=PrefixMetadataDataSource.local_source_etag_match),
+    ]
+    stats = QueueItemStatsCompute(results).stats
+
+    # stats survive the compact record encoding unchanged, and the prefixes are carried as failed or completed
+    unpacked, failed_prefixes, completed_prefixes = QueueItemStats.unpack(
+        stats.pack(failed_prefixes=["0000b"], completed_prefixes=["0000a", "0000c"])
+    )
+    assert unpacked == stats
+    assert failed_prefixes == ["0000b"]
+    assert completed_prefixes == ["0000a", "0000c"]
+    assert (unpacked.request_count, unpacked.bytes_received, unpacked.bytes_processed) == (3, 100, 150)
+
+
+def test_event_loop_lag_monitor():
+    async def blocked_loop() -> tuple[float, float, int]:
+        lag_monitor = EventLoopLagMonitor(interval=0.01)
+        lag_monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.2)  # noqa: ASYNC251 - deliberately blocks the event loop
+        await asyncio.sleep(0.05)
+        lag_monitor.stop()
+        return lag_monitor.take()
+
+    lag_max, lag_sum, lag_count = asyncio.run(blocked_loop())
+    assert lag_max >= 0.15
+    assert lag_sum >= lag_max
+    assert lag_count >= 2
+
+
+def test_parse_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("") is None
+    assert parse_retry_after("not-a-date") is None
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("86400") == HTTP_RETRY_AFTER_MAX
+
+    # HTTP-date form; a date in the past means no wait
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    retry_at = formatdate(time.time() + 30, usegmt=True)
+    assert 25 <= parse_retry_after(retry_at) <= 30
+
+
+def test_parse_http_date():
+    assert parse_http_date(None) is None
+    assert parse_http_date("") is None
+    assert parse_http_date("not-a-date") is None
+    assert parse_http_date("Wed, 21 Oct 2015 07:28:00 GMT") == datetime(2015, 10, 21, 7, 28, tzinfo=timezone.utc)
+
+
+def test_adaptive_concurrency_limit(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(concurrency_module.time, "monotonic", lambda: clock[0])
+    limit = AdaptiveConcurrencyLimit(initial=4, minimum=2, maximum=6)
+
+    # additive increase: one step for each full window of successes at a flat latency, up to the maximum
+    for _ in range(4):
+        limit.record_success(0.1)
+    assert limit.limit == 5
+    for _ in range(5 + 6 * 3):
+        limit.record_success(0.1)
+    assert limit.limit == 6
+
+    # hold: a window at an elevated latency does not grow the limit
+    limit = AdaptiveConcurrencyLimit(initial=4, minimum=2, maximum=6)
+    for _ in range(4):
+        limit.record_success(0.1)
+    for _ in range(5 * 3):
+        limit.record_success(1.0)
+    assert limit.limit == 5
+
+    # an isolated error holds the limit; errors in close succession cut it, once per latency period, and the limit
+    # then holds while the error rate stays above the threshold
+    limit = AdaptiveConcurrencyLimit(initial=6, minimum=2, maximum=6)
+    limit.record_error()
+    assert limit.limit == 6
+    limit.record_error()
+    assert limit.limit == 3
+    limit.record_error()
+    limit.record_error()
+    assert limit.limit == 3
+    for _ in range(3):
+        limit.record_success(0.1)
+    assert limit.limit == 3
+    assert limit.error_rate > limit.error_rate_threshold
+
+    # a throttled request cuts the limit whatever the error rate, down to the minimum
+    limit = AdaptiveConcurrencyLimit(initial=6, minimum=2, maximum=6)
+    limit.record_backoff()
+    limit.record_backoff()
+    assert limit.limit == 3
+    clock[0] += 0.5
+    limit.record_backoff()
+    assert limit.limit == 3
+    clock[0] += 1.0
+    limit.record_backoff()
+    assert limit.limit == 2
+
+    # the bounds also apply to the initial limit
+    assert AdaptiveConcurrencyLimit(initial=0, minimum=2).limit == 2
+    assert AdaptiveConcurrencyLimit(initial=100, maximum=8).limit == 8
+
+
+def test_retry_backoff():
+    backoff = RetryBackoff(base=0.5, maximum=4.0)
+
+    # full jitter, bounded by the exponential ceiling and the maximum
+    for attempt in range(1, 10):
+        ceiling = min(4.0, 0.5 * 2 ** (attempt - 1))
+        assert all(0 <= backoff.delay(attempt) <= ceiling for _ in range(50))
+    assert all(10 <= backoff.delay(1, retry_after=10) <= 10.5 for _ in range(50))
+
+    # a pause applies to every request sharing the backoff and reduces the concurrency limit
+    limit = AdaptiveConcurrencyLimit(initial=8)
+    backoff = RetryBackoff(base=0.01, concurrency_limit=limit)
+
+    async def paused_requests() -> float:
+        start = time.monotonic()
+        backoff.pause(0.2)
+        await asyncio.gather(*(backoff.wait() for _ in range(5)))
+        return time.monotonic() - start
+
+    assert asyncio.run(paused_requests()) >= 0.2
+    assert limit.limit == 4
+
+
+def test_shared_token_bucket():
+    bucket = SharedTokenBucket(rate=100, burst=5)
+    assert bucket.burst == 5
+    assert SharedTokenBucket(rate=2.5).burst == 3
+
+    # the burst is available at once, after that each token is reserved 1/rate seconds after the previous one
+    assert [bucket.reserve() for _ in range(5)] == [0.0] * 5
+    delays = [bucket.reserve() for _ in range(5)]
+    for index, delay in enumerate(delays):
+        assert (index + 1) / 100 - 0.005 <= delay <= (index + 1) / 100
+    assert bucket.acquired_count == 10
+
+    bucket = SharedTokenBucket(rate=200, burst=1)
+
+    async def acquire_many() -> float:
+        start = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(21)))
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire_many()) >= 0.09
+
+
+def test_shared_circuit_breaker():
+    breaker = SharedCircuitBreaker(failure_ratio=0.5, minimum_requests=4, cooldown=0.05, outage_deadline=0.5)
+
+    # trips only once the minimum number of requests in the window is reached
+    for available in (True, False, False):
+        breaker.record(available)
+    assert breaker.state == CIRCUIT_CLOSED
+    breaker.record(False)
+    assert breaker.state == CIRCUIT_OPEN
+
+    # after the cooldown one probe is let through; a failed probe re-opens the circuit, a successful one closes it
+    probe = asyncio.run(breaker.acquire())
+    assert probe > 0
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    breaker.record(False, probe=probe)
+    assert breaker.state == CIRCUIT_OPEN
+    probe = asyncio.run(breaker.acquire())
+    breaker.record(True, probe=probe)
+    assert breaker.state == CIRCUIT_CLOSED
+    assert asyncio.run(breaker.acquire()) == 0
+
+    # while half-open, only the probe's outcome counts, not that of a request sent before the circuit opened
+    for _ in range(4):
+        breaker.record(False)
+    stale_probe = probe
+    probe = asyncio.run(breaker.acquire())
+    breaker.record(True)
+    breaker.record(True, probe=stale_probe)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    breaker.record(False)
+    assert breaker.state == CIRCUIT_HALF_OPEN
+    breaker.record(True, probe=probe)
+    assert breaker.state == CIRCUIT_CLOSED
+
+    # an outage beyond the deadline aborts every request
+    for _ in range(4):
+        breaker.record(False)
+    time.sleep(0.6)
+    try:
+        asyncio.run(breaker.acquire())
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+    assert breaker.aborted
+
+
+def test_run_journal(tmp_path: Path):
+    journal = RunJournal(metadata_path=tmp_path, hash_type="sha1")
+    journal.start({"first_hash": "00000", "last_hash": "000ff"})
+    journal.record(["00003", "00001", "00002", "0000a"])
+    journal.record(["00004"])
+    journal.close()
+    assert (tmp_path / "sha1" / "download-journal.log").read_text().splitlines()[1:] == [
+        "done 00001-00003 0000a",
+        "done 00004",
+    ]
+
+    # an interrupted run resumes with its completed prefixes; a line cut short by a crash is dropped
+    with open(tmp_path / "sha1" / "download-journal.log", "a") as f:
+        f.write("done 000")
+    journal = RunJournal(metadata_path=tmp_path, hash_type="sha1")
+    assert journal.resume() == {"first_hash": "00000", "last_hash": "000ff"}
+    assert journal.completed_count == 5
+    assert [journal.completed(prefix) for prefix in ("00000", "00001", "00004", "0000a")] == [False, True, True, True]
+    journal.record(["00000"])
+    journal.finish()
+
+    # a finished run is not resumed
+    assert RunJournal(metadata_path=tmp_path, hash_type="sha1").resume() is None
+    assert RunJournal(metadata_path=tmp_path, hash_type="ntlm").resume() is None
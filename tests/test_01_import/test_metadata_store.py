@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from hibp_downloader.lib.filedata import generate_filepath
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import HashType, PrefixMetadata, PrefixMetadataDataSource
+
+
+def test_metadata_store_roundtrip(tmp_path: Path):
+    server_timestamp = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        metadata_store.save_many(
+            [
+                PrefixMetadata(
+                    prefix="0018a",
+                    etag='W/"0x8DB"',
+                    bytes=1234,
+                    server_timestamp=server_timestamp,
+                    data_source=PrefixMetadataDataSource.remote_source_remote_cache,
+                ),
+                PrefixMetadata(prefix="0018b", etag='W/"0x8DC"'),
+            ]
+        )
+
+    assert (tmp_path / "sha1" / "metadata.sqlite").is_file()
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        entries = metadata_store.load_many(["0018a", "0018b", "0018c"])
+        assert sorted(entries.keys()) == ["0018a", "0018b"]
+        assert entries["0018a"].etag == 'W/"0x8DB"'
+        assert entries["0018a"].bytes == 1234
+        assert entries["0018a"].server_timestamp == server_timestamp
+        assert entries["0018a"].hash_type == HashType.sha1
+        assert entries["0018a"].data_source == PrefixMetadataDataSource.remote_source_remote_cache
+
+        assert [x.prefix for x in metadata_store.scan("0018b", "fffff")] == ["0018b"]
+
+        assert metadata_store.delete_many(["0018a", "0018c"]) == 1
+        assert list(metadata_store.load_many(["0018a"]).keys()) == []
+
+
+def test_metadata_store_queue_save_flush(tmp_path: Path):
+    metadata_store = MetadataStore(metadata_path=tmp_path, hash_type="ntlm")
+    metadata_store.queue_save(PrefixMetadata(prefix="abcde", etag="etag"))
+    assert metadata_store.pending
+    metadata_store.close()
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="ntlm") as metadata_store:
+        assert metadata_store.load_many(["abcde"])["abcde"].etag == "etag"
+
+
+def test_metadata_store_save_checked(tmp_path: Path):
+    server_timestamp = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    checked_timestamp = datetime(2024, 2, 3, 4, 5, 6, tzinfo=timezone.utc)
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        metadata_store.save_many(
+            [PrefixMetadata(prefix="0018a", etag="etag", bytes=1234, server_timestamp=server_timestamp)]
+        )
+
+        # only the server timestamp of a prefix checked unchanged is updated; unknown prefixes are not added
+        metadata_store.queue_save_checked(
+            PrefixMetadata(prefix="0018a", etag="etag", bytes=0, server_timestamp=checked_timestamp)
+        )
+        metadata_store.queue_save_checked(PrefixMetadata(prefix="0018b", server_timestamp=checked_timestamp))
+        assert metadata_store.pending_checked
+        metadata_store.flush()
+
+        entries = metadata_store.load_many(["0018a", "0018b"])
+        assert list(entries.keys()) == ["0018a"]
+        assert entries["0018a"].server_timestamp == checked_timestamp
+        assert entries["0018a"].bytes == 1234
+
+        assert metadata_store.save_checked_many([PrefixMetadata(prefix="0018a", start_timestamp=server_timestamp)]) == 1
+        assert metadata_store.load_many(["0018a"])["0018a"].server_timestamp == server_timestamp
+
+
+def test_metadata_store_import_metafiles_once(tmp_path: Path):
+    metafile = generate_filepath(tmp_path, "sha1", "0018a", "meta")
+    os.makedirs(metafile.parent)
+    with open(metafile, "w") as f:
+        f.write(
+            json.dumps(
+                {
+                    "prefix": "0018a",
+                    "hash_type": "sha1",
+                    "etag": 'W/"0x8DB"',
+                    "bytes": 1234,
+                    "server_timestamp": "2024-01-02T03:04:05+00:00",
+                    "data_source": "remote_source_origin_source",
+                }
+            )
+        )
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        assert metadata_store.import_metafiles() == 1
+        assert metadata_store.import_metafiles() == 0
+        entry = metadata_store.load_many(["0018a"])["0018a"]
+        assert entry.etag == 'W/"0x8DB"'
+        assert entry.data_source == PrefixMetadataDataSource.remote_source_origin_source
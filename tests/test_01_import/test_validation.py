@@ -1,5 +1,23 @@
+import asyncio
 import gzip
-from hibp_downloader.lib.filedata import is_valid_gzip, is_valid_identity, verify_binary_encoding
+import os
+from datetime import datetime, timezone
+
+from hibp_downloader.commands.hibp_validate import ValidationStats, pwnedpasswords_validate_gather
+from hibp_downloader.exceptions import HibpDownloaderException
+from hibp_downloader.lib.datastore import FilesDatastore
+from hibp_downloader.lib.filedata import (
+    BinaryEncodingVerifier,
+    DatafileStream,
+    DatafileWriter,
+    DatastoreItem,
+    is_valid_gzip,
+    is_valid_identity,
+    verify_binary_encoding,
+)
+from hibp_downloader.lib.hashing import hashed_sha256
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import DurabilityMode, HashType, PrefixMetadata
 
 
 def test_is_valid_gzip():
@@ -55,3 +73,196 @@ def test_verify_binary_encoding():
 
     # Unknown encodings fall back to True
     assert verify_binary_encoding(b"anything", "deflate") is True
+
+
+def test_binary_encoding_verifier():
+    lines = b"\r\n".join(b"%035X:%d" % (i, i + 1) for i in range(500))
+    content = gzip.compress(lines)
+
+    def verify(data: bytes, chunk_size: int = 7) -> BinaryEncodingVerifier:
+        verifier = BinaryEncodingVerifier("gzip", check_lines=True)
+        for i in range(0, len(data), chunk_size):
+            verifier.update(data[i : i + chunk_size])
+        return verifier
+
+    # header, deflate stream, trailer and lines are checked as chunks arrive, in any chunk size
+    for chunk_size in (1, 7, 1000, len(content)):
+        verifier = verify(content, chunk_size)
+        assert verifier.verified is True
+        assert verifier.line_count == 500
+
+    corrupted_crc32 = bytearray(content)
+    corrupted_crc32[-6] ^= 0xFF
+    assert verify(bytes(corrupted_crc32)).failure == "gzip CRC32 mismatch"
+
+    corrupted_isize = bytearray(content)
+    corrupted_isize[-2] ^= 0xFF
+    assert verify(bytes(corrupted_isize)).failure == "gzip ISIZE mismatch"
+
+    assert verify(content[:-4]).failure == "truncated gzip trailer"
+    assert verify(content[:-20]).failure == "truncated deflate stream"
+    assert verify(b"\x1f\x8b\x07" + content[3:]).failure == "invalid gzip header"
+    assert verify(gzip.compress(b"<html>Service Unavailable</html>")).failure == "invalid range line format"
+
+    # without line checks any valid gzip content is accepted, as for is_valid_gzip
+    verifier = BinaryEncodingVerifier("gzip")
+    verifier.update(gzip.compress(b"some test password range data"))
+    assert verifier.verified is True
+
+
+def test_datafile_stream(tmp_path):
+    content = gzip.compress(b"00180800000000000000000000000000:3\r\n" * 1000)
+    filepath = tmp_path / "00" / "00" / "00000.gz"
+
+    async def stream(parts: list[bytes], commit: bool) -> DatafileStream:
+        datafile_stream = DatafileStream(filepath=filepath, encoding_type="gzip")
+        await datafile_stream.open()
+        for part in parts:
+            await datafile_stream.write(part)
+        await datafile_stream.close()
+        if commit:
+            await datafile_stream.commit()
+        await datafile_stream.discard()
+        return datafile_stream
+
+    # content received in chunks is checksummed and verified incrementally, then moved into place
+    datafile_stream = asyncio.run(stream([content[i : i + 100] for i in range(0, len(content), 100)], commit=True))
+    assert datafile_stream.verified is True
+    assert datafile_stream.checksum == hashed_sha256(content)
+    assert filepath.read_bytes() == content
+
+    # truncated content fails verification, and a discarded stream leaves the existing file untouched
+    datafile_stream = asyncio.run(stream([content[:-10]], commit=False))
+    assert datafile_stream.verified is False
+    assert filepath.read_bytes() == content
+    assert list(filepath.parent.iterdir()) == [filepath]
+
+
+def test_datafile_writer(tmp_path):
+    content = gzip.compress(b"00180800000000000000000000000000:3\r\n" * 1000)
+    timestamp = datetime(2023, 11, 12, tzinfo=timezone.utc)
+    (tmp_path / "ntlm").write_bytes(b"not a directory")
+
+    async def write(prefixes: list[str]) -> list[DatafileStream]:
+        datafile_writer = DatafileWriter(FilesDatastore(tmp_path, "sha1"), queue_size=2, batch_size=2)
+        datafile_writer.start()
+        streams, written = [], []
+        for prefix in prefixes:
+            datafile_stream = DatafileStream(encoding_type="gzip", writer=datafile_writer, prefix=prefix)
+            await datafile_stream.open()
+            await datafile_stream.write(content)
+            await datafile_stream.close()
+
+            # the content is streamed to the temporary file of the datastore, which is handed to the writer thread
+            assert datafile_stream.temp_filepath == datafile_writer.datastore.temp_filepath(prefix)
+            assert datafile_stream.temp_filepath.read_bytes() == content
+            written.append(await datafile_stream.commit_queued(timestamp=timestamp))
+            await datafile_stream.discard()
+            streams.append(datafile_stream)
+
+        await asyncio.gather(*written)
+        datafile_writer.close()
+        return streams
+
+    streams = asyncio.run(write(["00000", "00001", "00002", "0a000"]))
+    assert all(datafile_stream.verified for datafile_stream in streams)
+    for prefix in ("00000", "00001", "00002", "0a000"):
+        filepath = tmp_path / "sha1" / prefix[0:2] / prefix[2:4] / f"{prefix}.gz"
+        assert filepath.read_bytes() == content
+        assert os.stat(filepath).st_mtime == timestamp.timestamp()
+    assert sorted(os.listdir(tmp_path / "sha1" / "00" / "00")) == ["00000.gz", "00001.gz", "00002.gz"]
+
+    # a write that fails (here the hash type directory is a file) completes with an exception
+    async def write_failed() -> None:
+        datafile_writer = DatafileWriter(FilesDatastore(tmp_path, "ntlm"))
+        datafile_writer.start()
+        try:
+            await (await datafile_writer.submit("00000", content))
+        finally:
+            datafile_writer.close()
+
+    try:
+        asyncio.run(write_failed())
+        raise AssertionError("HibpDownloaderException not raised")
+    except HibpDownloaderException:
+        pass
+
+
+def test_datafile_writer_unexpected_error(tmp_path):
+    class FailingDatastore(FilesDatastore):
+        def write_many(self, items, sync=False):
+            raise RuntimeError("unexpected")
+
+    # an unexpected datastore error fails each write of the batch; the writer thread carries on, so that neither the
+    # written futures nor the queue slots are left waiting
+    async def write() -> list:
+        datafile_writer = DatafileWriter(FailingDatastore(tmp_path, "sha1"), queue_size=1)
+        datafile_writer.start()
+        results = []
+        for prefix in ("00000", "00001", "00002"):
+            written = await asyncio.wait_for(datafile_writer.submit(prefix, b"content"), timeout=10)
+            results.extend(await asyncio.wait_for(asyncio.gather(written, return_exceptions=True), timeout=10))
+        datafile_writer.close()
+        return results
+
+    results = asyncio.run(write())
+    assert len(results) == 3
+    assert all(isinstance(result, HibpDownloaderException) for result in results)
+    assert "unexpected" in str(results[0])
+
+
+def test_datafile_writer_durability(tmp_path):
+    content = gzip.compress(b"00180800000000000000000000000000:3\r\n" * 1000)
+    (tmp_path / "sha1" / "ff").mkdir(parents=True)
+    (tmp_path / "sha1" / "ff" / "ff").write_bytes(b"not a directory")
+
+    async def write(metadata_store: MetadataStore, durability: DurabilityMode, prefixes: list[str]) -> list:
+        datafile_writer = DatafileWriter(
+            FilesDatastore(tmp_path, "sha1"), durability=durability, metadata_store=metadata_store, batch_interval=0.1
+        )
+        datafile_writer.start()
+        written = []
+        for prefix in prefixes:
+            metadata = PrefixMetadata(prefix=prefix, etag=f"etag-{prefix}", content_checksum=f"checksum-{prefix}")
+            written.append(await datafile_writer.submit(prefix, content, metadata=metadata))
+        results = await asyncio.gather(*written, return_exceptions=True)
+        datafile_writer.close()
+        return results
+
+    for durability, prefixes in ((DurabilityMode.batched, ["00000", "00001"]), (DurabilityMode.strict, ["00002"])):
+        with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+            results = asyncio.run(write(metadata_store, durability, [*prefixes, "fffff"]))
+
+            # the metadata is saved with each data file written; that of a failed write is dropped
+            assert results[:-1] == [None] * len(prefixes)
+            assert isinstance(results[-1], HibpDownloaderException)
+            assert sorted(metadata_store.load_many([*prefixes, "fffff"])) == prefixes
+            assert metadata_store.load_pending() == []
+            for prefix in prefixes:
+                assert (tmp_path / "sha1" / prefix[0:2] / prefix[2:4] / f"{prefix}.gz").read_bytes() == content
+                assert metadata_store.load_many([prefix])[prefix].etag == f"etag-{prefix}"
+
+
+def test_validate_metadata_deleted_once(tmp_path, monkeypatch):
+    content = gzip.compress(b"00180800000000000000000000000000:3\r\n" * 1000)
+    datastore = FilesDatastore(tmp_path, "sha1")
+    datastore.write_many([DatastoreItem("00000", content), DatastoreItem("00001", b"corrupted")])
+
+    with MetadataStore(metadata_path=tmp_path, hash_type="sha1") as metadata_store:
+        metadata_store.save_many(PrefixMetadata(prefix=prefix, etag="etag") for prefix in ("00000", "00001", "00002"))
+        delete_calls = []
+        store_delete_many = metadata_store.delete_many
+
+        def delete_many(prefixes):
+            delete_calls.append(sorted(prefixes))
+            return store_delete_many(prefixes)
+
+        monkeypatch.setattr(metadata_store, "delete_many", delete_many)
+
+        # the metadata of the corrupted (00001) and missing (00002, 00003) data files is deleted in one transaction
+        stats = ValidationStats()
+        asyncio.run(pwnedpasswords_validate_gather(stats, HashType.sha1, metadata_store, "00000", "00003", datastore))
+        assert (stats.checked, stats.valid, stats.corrupted, stats.missing_data) == (4, 1, 1, 2)
+        assert delete_calls == [["00001", "00002", "00003"]]
+        assert sorted(metadata_store.load_many(["00000", "00001", "00002", "00003"])) == ["00000"]
+        assert not datastore.exists("00001")
@@ -3,8 +3,8 @@ Regression tests for cache correctness: local TTL, ETag (304 Not Modified), and
 
 These tests guard against the bugs fixed in:
   - http.py:    ETag not passed per-request when using a shared httpx.AsyncClient
-  - filedata.py: load_metadata() not checking whether the data file actually exists on disk
-  - hibp_download.py: metadata file overwritten even on 304 (resetting server_timestamp / TTL clock)
+  - hibp_download.py: plan_worker_tasks() not checking whether the data file actually exists on disk
+  - hibp_download.py: metadata overwritten even on 304 (losing the size and checksum of the data file)
 
 Each test downloads a small prefix range, then performs a second operation and inspects the
 debug log output and filesystem state for the expected cache-source behaviour:
@@ -19,8 +19,12 @@ so these tests use per-prefix debug messages and file-system state instead of th
 """
 
 import os
+from dataclasses import replace
 from uuid import uuid4
 
+from hibp_downloader.lib.metadata_store import MetadataStore
+from hibp_downloader.models import PrefixMetadata
+
 from ..helpers.content_inspect import is_match_error_warn
 from ..helpers.exec_helpers import exec_command
 
@@ -67,15 +71,16 @@ def _data_file_path(data_path: str, hash_type: str, prefix: str) -> str:
     )
 
 
-def _meta_file_path(data_path: str, hash_type: str, prefix: str) -> str:
-    """Reconstruct the on-disk path for a prefix metadata file."""
-    return os.path.join(
-        data_path,
-        hash_type.lower(),
-        prefix[0:2].lower(),
-        prefix[2:4].lower(),
-        f"{prefix}.meta".lower(),
-    )
+def _server_timestamps(data_path: str, hash_type: str, prefixes: list[str]) -> dict[str, float]:
+    """Return a {prefix: server_timestamp} dict for all given prefixes that exist in the metadata store."""
+    with MetadataStore(metadata_path=data_path, hash_type=hash_type) as metadata_store:
+        return {k: v.server_timestamp.timestamp() for k, v in metadata_store.load_many(prefixes).items()}  # type: ignore[union-attr]
+
+
+def _metadata(data_path: str, hash_type: str, prefixes: list[str]) -> dict[str, PrefixMetadata]:
+    """Return a {prefix: PrefixMetadata} dict for all given prefixes that exist in the metadata store."""
+    with MetadataStore(metadata_path=data_path, hash_type=hash_type) as metadata_store:
+        return metadata_store.load_many(prefixes)
 
 
 def _mtimes(paths: list[str]) -> dict[str, float]:
@@ -102,7 +107,7 @@ def test_exec_download_etag_respected():
     data_path = f"/tmp/hibp-test/{prefix}"
     test_prefixes = [f"{prefix}{s}" for s in ("0", "1", "2", "3")]
 
-    # First download — populates data files and .meta files
+    # First download — populates data files and metadata
     _, stderr, rc = _run(_base_args(prefix, data_path))
     assert rc == 0
     _assert_clean_run(stderr.decode())
@@ -193,18 +198,20 @@ def test_exec_download_local_ttl_skips_api():
 
 
 # ---------------------------------------------------------------------------
-# Test: metadata file NOT overwritten on 304 (TTL clock preserved)
+# Test: metadata NOT overwritten on 304 (only the check time is updated)
 # ---------------------------------------------------------------------------
 
 
 def test_exec_download_metadata_not_overwritten_on_etag_match():
     """
-    When a 304 Not Modified is received, the .meta file must NOT be rewritten.
-    Overwriting it would reset server_timestamp, which defeats the TTL cache on
-    the next run.  Confirms Bug 2 fix: etag-match excluded from metadata save.
+    When a 304 Not Modified is received, the metadata entry must NOT be rewritten;
+    only its server_timestamp moves on to the time of the check, so that the
+    stalest schedule and the TTL cache treat the prefix as current.  Confirms
+    Bug 2 fix: etag-match excluded from the full metadata save.
 
     Observable evidence:
-    - .meta file mtime is unchanged after a TTL=0 second run (304 path)
+    - metadata other than server_timestamp is unchanged after a TTL=0 second run (304 path)
+    - server_timestamp is not earlier than before
     - A third run within default TTL correctly serves from the local TTL cache
     """
     prefix = str(uuid4().hex)[0:4]
@@ -216,11 +223,11 @@ def test_exec_download_metadata_not_overwritten_on_etag_match():
     assert rc == 0
     _assert_clean_run(stderr.decode())
 
-    # Collect .meta mtimes and verify they exist
-    meta_paths = [_meta_file_path(data_path, "sha1", p) for p in test_prefixes]
-    for path in meta_paths:
-        assert os.path.isfile(path), f"Expected metadata file to exist after first download: {path}"
-    meta_mtimes_before = _mtimes(meta_paths)
+    # Collect metadata server_timestamps and verify they exist
+    timestamps_before = _server_timestamps(data_path, "sha1", test_prefixes)
+    for p in test_prefixes:
+        assert p in timestamps_before, f"Expected metadata to exist after first download: {p}"
+    metadata_before = _metadata(data_path, "sha1", test_prefixes)
 
     # Second download with TTL=0 — should trigger ETag requests → 304 responses
     args = _base_args(prefix, data_path) + ["--local-cache-ttl", "0"]
@@ -228,12 +235,18 @@ def test_exec_download_metadata_not_overwritten_on_etag_match():
     assert rc2 == 0
     _assert_clean_run(stderr2.decode(), allow_creating=False)
 
-    # .meta files must NOT have been rewritten on 304
-    meta_mtimes_after = _mtimes(meta_paths)
-    for path in meta_paths:
-        assert meta_mtimes_after[path] == meta_mtimes_before[path], (
-            f"Metadata file {path} was rewritten after a 304 ETag match. "
-            f"This resets server_timestamp and breaks the TTL cache on subsequent runs."
+    # metadata must NOT have been rewritten on 304; only the time of the check is updated
+    timestamps_after = _server_timestamps(data_path, "sha1", test_prefixes)
+    metadata_after = _metadata(data_path, "sha1", test_prefixes)
+    for p in test_prefixes:
+        assert timestamps_after[p] >= timestamps_before[p], (
+            f"server_timestamp of {p} moved back after a 304 ETag match."
+        )
+        assert replace(metadata_after[p], server_timestamp=None) == replace(
+            metadata_before[p], server_timestamp=None
+        ), (
+            f"Metadata for {p} was rewritten after a 304 ETag match. "
+            f"This loses the size and checksum of the data file that is still current."
         )
 
     # Third download — must be served from TTL cache (server_timestamp was preserved)
@@ -245,7 +258,7 @@ def test_exec_download_metadata_not_overwritten_on_etag_match():
     for p in test_prefixes:
         assert f"Skipping {p}; local-cache has" in stderr3_str, (
             f"Prefix {p} was NOT served from TTL cache on the third run. "
-            f"This suggests the .meta file's server_timestamp was reset by the 304 response "
+            f"This suggests the metadata server_timestamp was reset by the 304 response "
             f"on the second run, causing the TTL clock to restart."
         )
 
@@ -258,8 +271,8 @@ def test_exec_download_metadata_not_overwritten_on_etag_match():
 def test_exec_download_missing_datafile_triggers_redownload():
     """
     If a .gz data file is deleted, the next download must re-fetch it even if
-    the corresponding .meta file still exists (and is within TTL).
-    Confirms Bug 3 fix: load_metadata() returns empty PrefixMetadata when
+    the corresponding metadata still exists (and is within TTL).
+    Confirms Bug 3 fix: plan_worker_tasks() ignores the existing metadata when
     the data file is absent, forcing a full re-download without using cached ETags.
 
     Observable evidence:
@@ -296,7 +309,7 @@ def test_exec_download_missing_datafile_triggers_redownload():
     for p in deleted_prefixes:
         assert f"Skipping {p}; local-cache has" not in stderr2_str, (
             f"Prefix {p} was incorrectly served from the local TTL cache despite its data file "
-            f"being deleted. The missing-file detection in load_metadata() is not working."
+            f"being deleted. The missing-file detection in plan_worker_tasks() is not working."
         )
 
     # Intact prefixes MUST be served from TTL cache (files are present and TTL is valid)
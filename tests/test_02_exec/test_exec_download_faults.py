@@ -0,0 +1,116 @@
+"""
+Download tests through the fault proxy (tests/helpers/fault_proxy.py) in front of the mock range server: transport
+faults are retried, and content that fails verification is never written to the data path.
+"""
+
+import os
+import tempfile
+
+from ..helpers.exec_helpers import exec_command
+from ..helpers.fault_proxy import FaultProfile, FaultProxy
+from ..helpers.mock_range_server import MockRangeServer
+
+
+def _download(proxy: FaultProxy, data_path: str, *extra_args: str) -> tuple[str, int]:
+    # fmt: off
+    args = [
+        "--debug",
+        "--data-path", data_path,
+        "download",
+        "--api-url", proxy.url,
+        "--first-hash", "00000",
+        "--last-hash", "0001f",
+        "--http-max-retries", "10",
+        *extra_args,
+    ]
+    # fmt: on
+    _, stderr, rc = exec_command("hibp-downloader", args=args, timeout=60)
+    return stderr.decode(), rc
+
+
+def _datafiles(data_path: str) -> list[str]:
+    return [filename for _, _, filenames in os.walk(data_path) for filename in filenames if filename.endswith(".gz")]
+
+
+def test_exec_download_faults_retried():
+    profile = FaultProfile(reset_rate=0.1, goaway_rate=0.1, truncate_rate=0.1)
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock, FaultProxy(mock.url, profile) as proxy:
+        output, rc = _download(proxy, data_path)
+        stats = proxy.reset_stats()
+
+        assert stats["reset"] + stats["truncate"] > 0
+        assert stats["requests"] > 32
+        assert "failed prefixes" not in output
+        assert "hibp-downloader | Done" in output
+        assert rc == 0
+        assert len(_datafiles(data_path)) == 32
+
+
+def test_exec_download_faults_throttled():
+    profile = FaultProfile(throttle_rate=0.1, throttle_status=429, retry_after=1)
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock, FaultProxy(mock.url, profile) as proxy:
+        output, rc = _download(proxy, data_path)
+
+        assert proxy.reset_stats()["throttle_429"] > 0
+        assert "returned status 429; retrying in" in output
+        assert "failed prefixes" not in output
+        assert rc == 0
+        assert len(_datafiles(data_path)) == 32
+
+
+def test_exec_download_faults_corrupt_gzip():
+    with (
+        tempfile.TemporaryDirectory() as data_path,
+        MockRangeServer() as mock,
+        FaultProxy(mock.url, FaultProfile(corrupt_rate=1.0)) as proxy,
+    ):
+        output, rc = _download(proxy, data_path)
+
+        assert proxy.reset_stats()["corrupt"] == 32 * 2  # the main pass and the retry pass
+        assert "Invalid binary received" in output
+        assert "Retrying 32 failed prefixes" in output
+        assert "Retry pass recovered 0 of 32 failed prefixes" in output
+        assert "Download completed with 32 failed prefixes" in output
+        assert not _datafiles(data_path)
+        assert rc != 0
+
+
+def test_exec_download_faults_retry_pass():
+    with (
+        tempfile.TemporaryDirectory() as data_path,
+        MockRangeServer() as mock,
+        FaultProxy(mock.url, FaultProfile(corrupt_rate=1.0)) as proxy,
+    ):
+        # without the retry pass, every prefix fails and is listed in the failed-prefixes file
+        output, rc = _download(proxy, data_path, "--no-retry-pass")
+        failed_prefixes_file = os.path.join(data_path, "sha1", "failed-prefixes.txt")
+        assert "Retrying" not in output
+        assert "Download completed with 32 failed prefixes" in output
+        assert rc != 0
+        with open(failed_prefixes_file) as f:
+            assert len(f.read().split()) == 32
+
+        # requesting just the listed prefixes recovers them, and the file is then removed
+        proxy.profile = FaultProfile()
+        output, rc = _download(proxy, data_path, "--prefixes-file", failed_prefixes_file)
+        assert f"Requesting 32 prefixes listed in {failed_prefixes_file!r}" in output
+        assert "hibp-downloader | Done" in output
+        assert rc == 0
+        assert len(_datafiles(data_path)) == 32
+        assert not os.path.exists(failed_prefixes_file)
+
+
+def test_exec_download_faults_outage_abort():
+    with (
+        tempfile.TemporaryDirectory() as data_path,
+        MockRangeServer() as mock,
+        FaultProxy(mock.url, FaultProfile(reset_rate=1.0)) as proxy,
+    ):
+        output, rc = _download(proxy, data_path, "--outage-deadline", "2")
+
+        assert "pausing requests from all workers" in output
+        assert "Upstream unavailable for more than 2s; aborting requests" in output
+        assert "Download aborted after an upstream outage" in output
+        assert proxy.reset_stats()["requests"] < 32 * 10
+        assert not _datafiles(data_path)
+        assert rc != 0
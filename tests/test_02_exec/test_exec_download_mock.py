@@ -0,0 +1,404 @@
+"""
+Download tests against the in-process mock range server (tests/helpers/mock_range_server.py); these run offline
+and are deterministic, so they also check the cache-source accounting of a re-run.
+"""
+
+import os
+import re
+import signal
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+import pytest
+
+from hibp_downloader.lib.filedata import generate_filepath
+from hibp_downloader.lib.metadata_store import MetadataStore
+
+from ..helpers.content_inspect import is_match_error_warn
+from ..helpers.exec_helpers import exec_command
+from ..helpers.mock_range_server import MockRangeServer
+
+
+def _download(
+    mock: MockRangeServer,
+    data_path: str,
+    *extra_args: str,
+    global_args: tuple[str, ...] = (),
+    env: dict[str, str] | None = None,
+) -> str:
+    # fmt: off
+    args = [
+        "--debug",
+        "--data-path", data_path,
+        *global_args,
+        "download",
+        "--api-url", mock.url,
+        "--first-hash", "00000",
+        "--last-hash", "0001f",
+        *extra_args,
+    ]
+    # fmt: on
+    _, stderr, _ = exec_command("hibp-downloader", args=args, timeout=60, env=env)
+    output = stderr.decode()
+
+    if is_match_error_warn(content=output, match_excludes=["does not exist, creating it now"]):
+        raise AssertionError(f"Unexpected ERROR/WARN in output:\n{output}")
+    assert "hibp-downloader | Done" in output
+    return output
+
+
+def test_exec_download_mock():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        _download(mock, data_path)
+        assert mock.reset_stats()["status_200"] == 32
+
+        datafiles = [filename for _, _, filenames in os.walk(data_path) for filename in filenames]
+        assert len([filename for filename in datafiles if filename.endswith(".gz")]) == 32
+        assert not [filename for filename in datafiles if filename.endswith(".tmp")]
+
+        with MetadataStore(data_path, "sha1") as metadata_store:
+            metadata = metadata_store.load_many(["00000"])["00000"]
+        assert metadata.etag == mock.range_etag("00000")
+
+        # a re-run with no local-cache TTL sends If-None-Match for every prefix and receives only 304 responses
+        _download(mock, data_path, "--local-cache-ttl", "0")
+        stats = mock.reset_stats()
+        assert stats["status_304"] == 32
+        assert stats["status_200"] == 0
+
+
+def test_exec_download_mock_invalid_header():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        mock.header_overrides["00003"] = {"Last-Modified": "not-a-date"}
+        # fmt: off
+        args = [
+            "--data-path", data_path,
+            "download",
+            "--api-url", mock.url,
+            "--first-hash", "00000",
+            "--last-hash", "0001f",
+        ]
+        # fmt: on
+        _, stderr, rc = exec_command("hibp-downloader", args=args, timeout=60)
+        output = stderr.decode()
+
+        # the malformed header is ignored; the prefix is stored like any other
+        assert "Prefix 00003: Invalid 'last-modified' header 'not-a-date' ignored" in output
+        assert "Unexpected error" not in output
+        assert "hibp-downloader | Done" in output
+        assert rc == 0
+        assert mock.reset_stats()["status_200"] == 32
+        assert os.path.isfile(generate_filepath(Path(data_path), "sha1", "00003", "gz"))
+
+        with MetadataStore(data_path, "sha1") as metadata_store:
+            metadata = metadata_store.load_many(["00003"])["00003"]
+        assert metadata.last_modified is None
+        assert metadata.etag == mock.range_etag("00003")
+
+
+def test_exec_download_mock_durability():
+    for durability in ("batched", "strict"):
+        with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+            _download(mock, data_path, "--durability", durability)
+            assert mock.reset_stats()["status_200"] == 32
+
+            with MetadataStore(data_path, "sha1") as metadata_store:
+                prefixes = [f"{i:05x}" for i in range(32)]
+                metadata = metadata_store.load_many(prefixes)
+                assert metadata_store.load_pending() == []
+            assert sorted(metadata) == prefixes
+            assert all(os.path.isfile(generate_filepath(Path(data_path), "sha1", prefix, "gz")) for prefix in prefixes)
+
+
+def test_exec_download_mock_ntlm():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        _download(mock, data_path, "--hash-type", "ntlm")
+        assert mock.reset_stats()["status_200"] == 32
+        assert os.path.isfile(generate_filepath(Path(data_path), "ntlm", "00000", "gz"))
+
+
+def test_exec_download_mock_rate_limit():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        start = time.monotonic()
+        output = _download(
+            mock, data_path, "--processes", "2", "--max-requests-per-second", "20", "--max-requests-burst", "2"
+        )
+        assert "API requests limited to 20req/s (burst 2) across all processes" in output
+        assert mock.reset_stats()["requests"] == 32
+        assert time.monotonic() - start >= (32 - 2) / 20
+
+
+def test_exec_download_mock_bandwidth_limit():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        start = time.monotonic()
+        output = _download(mock, data_path, "--processes", "2", "--max-bandwidth", "0.25")
+        elapsed = time.monotonic() - start
+
+        # the bucket starts with one second of bytes; the remainder is received at the limit
+        assert "API response data limited to 0.25MB/s across all processes" in output
+        bytes_sent = mock.reset_stats()["bytes_sent"]
+        assert elapsed >= (bytes_sent - 0.25 * 1024 * 1024) / (0.25 * 1024 * 1024)
+
+
+def test_exec_download_mock_sigterm_resume():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer(latency=0.1) as mock:
+        # fmt: off
+        args = [
+            "hibp-downloader",
+            "--data-path", data_path,
+            "download",
+            "--api-url", mock.url,
+            "--first-hash", "00000",
+            "--last-hash", "0001f",
+            "--processes", "1",
+            "--chunk-size", "1",
+            "--max-chunk-size", "1",
+        ]
+        # fmt: on
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + 30
+        while mock.stats["requests"] < 8 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        process.send_signal(signal.SIGTERM)
+        _, stderr = process.communicate(timeout=30)
+        output = stderr.decode()
+
+        # the in-flight request is completed and stored, nothing further is requested
+        requested = mock.reset_stats()["requests"]
+        assert "Received SIGTERM; stopping after the in-flight requests have finished" in output
+        assert f"Download stopped with {32 - requested} prefixes not requested" in output
+        assert process.returncode != 0
+        datafiles = [filename for _, _, filenames in os.walk(data_path) for filename in filenames]
+        assert len([filename for filename in datafiles if filename.endswith(".gz")]) == requested
+
+        # --resume requests only the remainder of the range, even with --force
+        output = _download(mock, data_path, "--resume", "--force", "--first-hash", "00010")
+        assert f"Resuming the interrupted download; {requested} prefixes were completed" in output
+        assert mock.reset_stats()["requests"] == 32 - requested
+
+        # the resumed download finished, so there is nothing left to resume
+        _, stderr, rc = exec_command("hibp-downloader", args=args[1:] + ["--resume"], timeout=60)
+        assert "No interrupted download to resume; starting a new download" in stderr.decode()
+        assert rc == 0
+
+
+def test_exec_download_mock_worker_killed():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer(latency=0.1) as mock:
+        # fmt: off
+        args = [
+            "hibp-downloader",
+            "--data-path", data_path,
+            "download",
+            "--api-url", mock.url,
+            "--first-hash", "00000",
+            "--last-hash", "0001f",
+            "--processes", "2",
+            "--chunk-size", "1",
+            "--max-chunk-size", "1",
+        ]
+        # fmt: on
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + 30
+        while mock.stats["requests"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        # the worker processes are forked, so they share the command line of the download process
+        with open(f"/proc/{process.pid}/cmdline", "rb") as f:
+            cmdline = f.read()
+        with open(f"/proc/{process.pid}/task/{process.pid}/children") as f:
+            children = [int(pid) for pid in f.read().split()]
+        workers = []
+        for pid in children:
+            with open(f"/proc/{pid}/cmdline", "rb") as f:
+                if f.read() == cmdline:
+                    workers.append(pid)
+        os.kill(workers[0], signal.SIGKILL)
+        _, stderr = process.communicate(timeout=60)
+        output = stderr.decode()
+
+        # the prefixes the worker had not reported are retried, but the download is not marked complete
+        assert f"Worker process {workers[0]} ended unexpectedly (exit code -9)" in output
+        assert "Retrying" in output
+        assert "Download incomplete; 1 worker processes ended unexpectedly" in output
+        assert "hibp-downloader | Done" not in output
+        assert process.returncode != 0
+
+        output = _download(mock, data_path, "--resume")
+        assert "Resuming the interrupted download" in output
+
+
+def _journal_prefixes(data_path: str) -> list[str]:
+    prefixes = []
+    with open(os.path.join(data_path, "sha1", "download-journal.log")) as f:
+        for line in f:
+            if line.startswith("done "):
+                for value in line.split()[1:]:
+                    first, _, last = value.partition("-")
+                    prefixes.extend(f"{i:05x}" for i in range(int(first, 16), int(last or first, 16) + 1))
+    return sorted(prefixes)
+
+
+def test_exec_download_mock_stalest_budget():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        _download(mock, data_path, "--last-hash", "0000f")
+        mock.reset_stats()
+
+        # never downloaded prefixes first, in prefix order, then those downloaded longest ago (to the second)
+        for expected in (range(0x10, 0x18), range(0x18, 0x20), range(0x10)):
+            output = _download(mock, data_path, "--force", "--schedule", "stalest", "--max-requests", "8")
+            assert "Requesting the first 8 prefixes by --schedule stalest" in output
+            assert mock.reset_stats()["requests"] == 8
+            requested = _journal_prefixes(data_path)
+            assert len(requested) == 8
+            assert set(requested) <= {f"{i:05x}" for i in expected}
+
+
+def test_exec_download_mock_stalest_unchanged():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        _download(mock, data_path, "--last-hash", "00007")
+        mock.reset_stats()
+
+        # prefixes checked unchanged (ETag matches) become the freshest, so that each run moves on to the others;
+        # the check time is that of the Date header, to the second
+        # fmt: off
+        stalest_args = (
+            "--last-hash", "00007",
+            "--local-cache-ttl", "0",
+            "--schedule", "stalest",
+            "--max-requests", "4",
+        )
+        # fmt: on
+        for expected in (range(0x4), range(0x4, 0x8), range(0x4)):
+            time.sleep(1)
+            _download(mock, data_path, *stalest_args)
+            assert mock.reset_stats()["status_304"] == 4
+            assert _journal_prefixes(data_path) == [f"{i:05x}" for i in expected]
+
+
+def test_exec_download_mock_max_runtime():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer(latency=0.2) as mock:
+        output = _download(
+            mock, data_path, "--processes", "1", "--chunk-size", "1", "--max-chunk-size", "1", "--max-runtime", "2"
+        )
+        requested = mock.reset_stats()["requests"]
+        assert 0 < requested < 32
+        assert f"Run-time budget of 2s used with {32 - requested} prefixes not requested" in output
+
+
+def test_exec_download_mock_storage_pack():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        _download(mock, data_path, "--local-cache-ttl", "0", global_args=("--storage", "pack"))
+        assert mock.reset_stats()["status_200"] == 32
+        assert not os.path.exists(generate_filepath(Path(data_path), "sha1", "00000", "gz"))
+        assert os.path.isfile(os.path.join(data_path, "sha1", "pack", "index"))
+
+        # a re-run gets ETag matches from the pack store, as it would from data files
+        _download(mock, data_path, "--local-cache-ttl", "0", global_args=("--storage", "pack"))
+        assert mock.reset_stats()["status_304"] == 32
+
+        _download(mock, data_path, "--force", global_args=("--storage", "pack"))
+        assert mock.reset_stats()["status_200"] == 32
+
+        _, stderr, rc = exec_command("hibp-downloader", args=["--data-path", data_path, "--storage", "pack", "compact"])
+        assert re.search(r"Compacted 32 prefixes from \d+ pack files \(.*\) into 1 pack files", stderr.decode())
+        assert rc == 0
+
+        _, stderr, rc = exec_command(
+            "hibp-downloader",
+            args=[
+                "--data-path",
+                data_path,
+                "--storage",
+                "pack",
+                "validate",
+                "--first-hash",
+                "00000",
+                "--last-hash",
+                "0001f",
+            ],
+        )
+        assert "Valid datafiles:    32" in stderr.decode()
+        assert rc == 0
+
+
+def test_exec_download_mock_storage_s3():
+    pytest.importorskip("moto")
+    from ..helpers.mock_object_store import MockObjectStore
+
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock, MockObjectStore() as store:
+        storage_args = ("--storage", "s3", "--storage-url", f"{store.url}/hibp")
+        _download(mock, data_path, "--local-cache-ttl", "0", global_args=storage_args, env=store.env)
+        assert mock.reset_stats()["status_200"] == 32
+        assert len(store.keys("hibp/sha1/")) == 32
+        assert not os.path.exists(os.path.join(data_path, "sha1", "00"))
+
+        # a re-run gets ETag matches from the object store, as it would from data files
+        _download(mock, data_path, "--local-cache-ttl", "0", global_args=storage_args, env=store.env)
+        assert mock.reset_stats()["status_304"] == 32
+
+        _, stderr, rc = exec_command(
+            "hibp-downloader",
+            args=["--data-path", data_path, *storage_args, "validate", "--first-hash", "00000", "--last-hash", "0001f"],
+            env=store.env,
+        )
+        assert "Valid datafiles:    32" in stderr.decode()
+        assert rc == 0
+
+
+def test_exec_download_mock_data_format_binary():
+    with tempfile.TemporaryDirectory() as data_path, MockRangeServer() as mock:
+        binary_path, gzip_path = os.path.join(data_path, "binary"), os.path.join(data_path, "gzip")
+        _download(mock, binary_path, "--local-cache-ttl", "0", global_args=("--data-format", "binary"))
+        assert mock.reset_stats()["status_200"] == 32
+        assert os.path.isfile(generate_filepath(Path(binary_path), "sha1", "00000", "bin"))
+        assert not os.path.exists(generate_filepath(Path(binary_path), "sha1", "00000", "gz"))
+
+        # the content checksum of a binary prefix is that of the content it was transcoded from
+        _download(mock, binary_path, "--local-cache-ttl", "0", global_args=("--data-format", "binary"))
+        assert mock.reset_stats()["status_304"] == 32
+
+        _, stderr, rc = exec_command(
+            "hibp-downloader",
+            args=[
+                "--data-path",
+                binary_path,
+                "--data-format",
+                "binary",
+                "validate",
+                "--first-hash",
+                "00000",
+                "--last-hash",
+                "0001f",
+            ],
+        )
+        assert "Valid datafiles:    32" in stderr.decode()
+        assert rc == 0
+
+        # generate renders the same lines from either data format
+        _download(mock, gzip_path)
+        generated = []
+        for path, data_format in ((binary_path, "binary"), (gzip_path, "gzip")):
+            filename = os.path.join(data_path, f"generate-{data_format}.txt")
+            _, _, rc = exec_command(
+                "hibp-downloader",
+                args=[
+                    "--data-path",
+                    path,
+                    "--data-format",
+                    data_format,
+                    "generate",
+                    "--filename",
+                    filename,
+                    "--first-hash",
+                    "00000",
+                    "--last-hash",
+                    "0001f",
+                ],
+            )
+            assert rc == 0
+            with open(filename) as f:
+                generated.append(f.read())
+        assert generated[0] == generated[1]
+        assert len(generated[0].split()) > 32
@@ -3,6 +3,8 @@ import shutil
 from pathlib import Path
 from uuid import uuid4
 
+from hibp_downloader.lib.metadata_store import MetadataStore
+
 from ..helpers.content_inspect import is_match_error_warn
 from ..helpers.exec_helpers import exec_command
 
@@ -34,9 +36,10 @@ def test_exec_validate():
     assert hash_dir.is_dir()
 
     datafiles = list(hash_dir.glob(f"{prefix}*.gz"))
-    metafiles = list(hash_dir.glob(f"{prefix}*.meta"))
+    with MetadataStore(metadata_path=data_path, hash_type="sha1") as metadata_store:
+        metadata_entries = list(metadata_store.scan(f"{prefix}0", f"{prefix}5"))
     assert len(datafiles) == 6
-    assert len(metafiles) == 6
+    assert len(metadata_entries) == 6
 
     # 2. Run validate command on the valid data
     # fmt: off
@@ -58,9 +61,7 @@ def test_exec_validate():
     # 3. Corrupt one datafile manually
     corrupt_prefix = f"{prefix}2"
     corrupt_data_path = hash_dir / f"{corrupt_prefix}.gz"
-    corrupt_meta_path = hash_dir / f"{corrupt_prefix}.meta"
     assert corrupt_data_path.exists()
-    assert corrupt_meta_path.exists()
 
     with open(corrupt_data_path, "wb") as f:
         f.write(b"NOT A VALID GZIP FILE CONTENT")
@@ -68,9 +69,7 @@ def test_exec_validate():
     # 4. Make an orphaned metadata file manually by deleting its datafile
     orphan_prefix = f"{prefix}4"
     orphan_data_path = hash_dir / f"{orphan_prefix}.gz"
-    orphan_meta_path = hash_dir / f"{orphan_prefix}.meta"
     assert orphan_data_path.exists()
-    assert orphan_meta_path.exists()
     orphan_data_path.unlink()  # delete datafile only
 
     # 5. Run validate command to detect and clean up
@@ -85,8 +84,10 @@ def test_exec_validate():
 
     # Check that cleanup actually occurred
     assert not corrupt_data_path.exists()
-    assert not corrupt_meta_path.exists()
-    assert not orphan_meta_path.exists()
+    with MetadataStore(metadata_path=data_path, hash_type="sha1") as metadata_store:
+        metadata_entries = metadata_store.load_many([corrupt_prefix, orphan_prefix])
+    assert corrupt_prefix not in metadata_entries
+    assert orphan_prefix not in metadata_entries
 
     # 6. Run validate command again - should now report 4 valid, 2 missing, 0 corrupted
     stdout_val3, stderr_val3, rc_val3 = exec_command("hibp-downloader", args=args_validate_1)